@@ -0,0 +1,59 @@
+# benchmarks/common.py
+"""Result files shared by the benchmark scripts."""
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+
+def git_revision() -> str:
+    try:
+        sha = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+        dirty = subprocess.call(["git", "diff", "--quiet"], cwd=ROOT) != 0
+        return f"{sha}-dirty" if dirty else sha
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    """p50/p95/p99, mean and max of `values` (nearest-rank)."""
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def rank(p):
+        return ordered[min(len(ordered) - 1, max(0, int(round(p * len(ordered))) - 1))]
+
+    return {
+        "p50": rank(0.50),
+        "p95": rank(0.95),
+        "p99": rank(0.99),
+        "mean": sum(ordered) / len(ordered),
+        "max": ordered[-1],
+    }
+
+
+def save_results(kind: str, results: Dict, out: str = None) -> str:
+    """Write `results` with run metadata as JSON; return the file path."""
+    revision = git_revision()
+    payload = {
+        "kind": kind,
+        "revision": revision,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "results": results,
+    }
+    if out is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        out = os.path.join(RESULTS_DIR, f"{kind}_{stamp}_{revision}.json")
+    with open(out, "w") as f:
+        json.dump(payload, f, indent=2)
+    return out
@@ -0,0 +1,73 @@
+# benchmarks/compare.py
+"""Compare two benchmark result files (from loadgen.py, micro.py or filtering.py).
+
+    python benchmarks/compare.py benchmarks/results/load_A.json benchmarks/results/load_B.json
+
+Prints the relative change of every timing and exits with status 1 when any
+of them got slower by more than --threshold percent.
+"""
+import argparse
+import json
+import sys
+from typing import Dict, Iterator, Tuple
+
+
+def _metrics(payload: Dict) -> Iterator[Tuple[str, float, bool]]:
+    """(name, value, higher_is_better) for every comparable number in a result file."""
+    results = payload["results"]
+    if payload["kind"] == "load":
+        for scenario, values in results["scenarios"].items():
+            for p in ("p50", "p95", "p99"):
+                if p in values["latency_s"]:
+                    yield f"{scenario} {p}", values["latency_s"][p], False
+            if values.get("throughput_rps") is not None:
+                yield f"{scenario} req/s", values["throughput_rps"], True
+            if values.get("peak_rss_mb") is not None:
+                yield f"{scenario} peak RSS MB", values["peak_rss_mb"], False
+    elif payload["kind"] == "micro":
+        for rows, stages in results["stages"].items():
+            for stage, values in stages.items():
+                yield f"{rows} rows {stage}", values["median"], False
+    elif payload["kind"] == "filtering":
+        for side in ("server", "client"):
+            for p in ("p50", "p95"):
+                yield f"{side} {p}", results[side]["latency_s"][p], False
+            yield f"{side} bytes", results[side]["mean_bytes"], False
+        yield "server first page p50", results["server"]["first_page_s"]["p50"], False
+    else:
+        raise ValueError(f"Unknown result kind: {payload['kind']}")
+
+
+def compare(base: Dict, head: Dict, threshold: float) -> bool:
+    if base["kind"] != head["kind"]:
+        raise ValueError(f"Cannot compare {base['kind']} results with {head['kind']} results")
+
+    print(f"base {base['revision']} ({base['timestamp']})  ->  head {head['revision']} ({head['timestamp']})")
+    before = {name: (value, higher) for name, value, higher in _metrics(base)}
+    regressed = False
+    for name, value, higher_is_better in _metrics(head):
+        if name not in before or not before[name][0]:
+            continue
+        change = (value - before[name][0]) / before[name][0] * 100
+        worse = -change if higher_is_better else change
+        flag = ""
+        if worse > threshold:
+            flag, regressed = "  REGRESSION", True
+        elif worse < -threshold:
+            flag = "  improved"
+        print(f"{name:<32} {before[name][0]:>12.4f} {value:>12.4f} {change:>+8.1f}%{flag}")
+    return regressed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--threshold", type=float, default=10.0, help="regression threshold in percent")
+    args = parser.parse_args()
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.head) as f:
+        head = json.load(f)
+    sys.exit(1 if compare(base, head, args.threshold) else 0)
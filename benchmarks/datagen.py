@@ -0,0 +1,198 @@
+# benchmarks/datagen.py
+"""Synthetic property/relationship/contact data for the local SQLite stand-in.
+
+    python benchmarks/datagen.py --scale 10k
+    python benchmarks/datagen.py --scale 1m --out /tmp/properties_1m.sqlite
+
+Point the API at the result with DB_BACKEND=sqlite LOCAL_DB_PATH=<file>.
+Column names and types follow the Fabric tables the routes query; contact
+fan-out is skewed so that a few contacts own many properties, as in the
+real data.
+"""
+import argparse
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+SCALES = {"10k": 10_000, "1m": 1_000_000, "5m": 5_000_000}
+CHUNK = 50_000
+CONTACTS_PER_PROPERTY = 0.6  # distinct contacts relative to the property count
+
+# Contacts linked to a property: value -> probability
+FAN_OUT = {0: 0.12, 1: 0.38, 2: 0.24, 3: 0.13, 4: 0.07, 5: 0.04, 8: 0.02}
+
+LOCATIONS = [
+    # (city, state, county, market, zip prefix)
+    ("Dallas", "TX", "Dallas", "Dallas-Fort Worth", "752"),
+    ("Fort Worth", "TX", "Tarrant", "Dallas-Fort Worth", "761"),
+    ("Houston", "TX", "Harris", "Houston", "770"),
+    ("Austin", "TX", "Travis", "Austin", "787"),
+    ("San Antonio", "TX", "Bexar", "San Antonio", "782"),
+    ("Oklahoma City", "OK", "Oklahoma", "Oklahoma City", "731"),
+    ("Tulsa", "OK", "Tulsa", "Tulsa", "741"),
+    ("Denver", "CO", "Denver", "Denver", "802"),
+    ("Phoenix", "AZ", "Maricopa", "Phoenix", "850"),
+    ("Atlanta", "GA", "Fulton", "Atlanta", "303"),
+    ("Miami", "FL", "Miami-Dade", "South Florida", "331"),
+    ("Orlando", "FL", "Orange", "Orlando", "328"),
+    ("Chicago", "IL", "Cook", "Chicago", "606"),
+    ("Nashville", "TN", "Davidson", "Nashville", "372"),
+    ("Charlotte", "NC", "Mecklenburg", "Charlotte", "282"),
+    ("Los Angeles", "CA", "Los Angeles", "Los Angeles", "900"),
+]
+LOCATION_WEIGHTS = np.array([9, 5, 9, 6, 5, 4, 3, 6, 7, 7, 6, 4, 8, 4, 4, 13], dtype=float)
+
+PROPERTY_TYPES = ["Office", "Industrial", "Retail", "Multi-Family", "Land", "Hospitality", "Flex", "Health Care"]
+TYPE_WEIGHTS = np.array([22, 24, 20, 16, 8, 4, 4, 2], dtype=float)
+BUILDING_CLASSES = ["A", "B", "C", None]
+CONSTR_STATUS = ["Existing", "Existing", "Existing", "Under Construction", "Proposed"]
+MATERIALS = ["Masonry", "Steel", "Wood Frame", "Reinforced Concrete", "Metal", None]
+OPERATION_TYPES = ["Owner User", "Investment", "Net Lease", None]
+SEGMENTS = ["Investment", "Owner/User", "Value-Add", "Core"]
+
+SCHEMA = """
+CREATE TABLE property (
+    PropertyID INTEGER PRIMARY KEY,
+    Property_Address TEXT, Property_Name TEXT, PropertyType TEXT, Building_Class TEXT,
+    Secondary_Type TEXT, Market_Name TEXT, Submarket_Name TEXT, City TEXT, State TEXT,
+    Zip TEXT, County_Name TEXT, Last_Sale_Date TEXT, Last_Sale_Price REAL,
+    Percent_Leased REAL, Year_Built INTEGER, Anchor_Tenants TEXT, Architect_Name TEXT,
+    [Avg_Asking/SF] REAL, [Avg_Effective/SF] REAL, Building_Operating_Expenses REAL,
+    Cap_Rate REAL, Ceiling_Ht TEXT, Constr_Status TEXT, Construction_Material TEXT,
+    Developer_Name TEXT, Flood_Risk_Area TEXT, Land_Area__AC_ REAL, Land_Area__SF_ REAL,
+    Latitude REAL, Longitude REAL, Market_Segment TEXT, Max_Building_Contiguous_Space REAL,
+    Number_Of_Stories INTEGER, Operation_Type TEXT, Property_Location TEXT,
+    Taxes_Total REAL, Total_Buildings INTEGER, Zoning TEXT
+);
+CREATE TABLE contact (contact_id INTEGER PRIMARY KEY, name TEXT, phone TEXT, email TEXT);
+CREATE TABLE relationship (PropertyID INTEGER NOT NULL, contact_id INTEGER NOT NULL);
+"""
+
+INDEXES = """
+CREATE INDEX ix_property_state ON property (State);
+CREATE INDEX ix_property_city ON property (City);
+CREATE INDEX ix_property_county ON property (County_Name);
+CREATE INDEX ix_property_zip ON property (Zip);
+CREATE INDEX ix_property_type ON property (PropertyType);
+CREATE INDEX ix_relationship_property ON relationship (PropertyID);
+CREATE INDEX ix_relationship_contact ON relationship (contact_id);
+"""
+
+
+def _pick(rng, values, size, weights=None):
+    p = None if weights is None else weights / weights.sum()
+    index = rng.choice(len(values), size=size, p=p)
+    return [values[i] for i in index]
+
+
+def property_rows(rng: np.random.Generator, start: int, count: int):
+    """Generate `count` property rows with ids starting at `start`."""
+    ids = np.arange(start, start + count)
+    loc = rng.choice(len(LOCATIONS), size=count, p=LOCATION_WEIGHTS / LOCATION_WEIGHTS.sum())
+    types = _pick(rng, PROPERTY_TYPES, count, TYPE_WEIGHTS)
+    year_built = rng.integers(1950, 2025, size=count)
+    sale_days = rng.integers(0, 35 * 365, size=count)
+    sale_dates = (np.datetime64("1990-01-01") + sale_days.astype("timedelta64[D]")).astype(str)
+    has_sale = rng.random(count) < 0.8
+    price = np.round(rng.lognormal(15.2, 1.1, size=count), -3)
+    cap_rate = np.round(rng.normal(0.065, 0.012, size=count).clip(0.03, 0.12), 4)
+    leased = np.round(rng.beta(6, 1.5, size=count), 3)
+    land_ac = np.round(rng.lognormal(0.3, 1.0, size=count), 2)
+    stories = rng.integers(1, 40, size=count)
+    buildings = rng.integers(1, 6, size=count)
+    asking = np.round(rng.normal(28, 9, size=count).clip(5, 90), 2)
+    zips = rng.integers(0, 100, size=count)
+    lat = rng.normal(33, 4, size=count)
+    lon = rng.normal(-97, 8, size=count)
+
+    rows = []
+    for i in range(count):
+        city, state, county, market, zip_prefix = LOCATIONS[loc[i]]
+        pid = int(ids[i])
+        rows.append((
+            pid, f"{100 + pid % 9900} {('Main', 'Oak', 'Elm', 'Commerce', 'Park')[pid % 5]} St",
+            f"{city} {types[i]} {pid}", types[i], BUILDING_CLASSES[pid % 4],
+            None if pid % 3 else f"{types[i]} Secondary", market, f"{market} Submarket {pid % 7}",
+            city, state, f"{zip_prefix}{zips[i]:02d}", county,
+            sale_dates[i] if has_sale[i] else None, float(price[i]) if has_sale[i] else None,
+            float(leased[i]), int(year_built[i]), None if pid % 4 else "Anchor Tenant Co",
+            None if pid % 5 else f"Architect {pid % 300}", float(asking[i]), float(asking[i] * 0.9),
+            float(round(asking[i] * 0.3, 2)), float(cap_rate[i]), f"{10 + pid % 30}'",
+            CONSTR_STATUS[pid % 5], MATERIALS[pid % 6], None if pid % 6 else f"Developer {pid % 500}",
+            "Minimal" if pid % 9 else "High", float(land_ac[i]), float(round(land_ac[i] * 43560)),
+            float(lat[i]), float(lon[i]), SEGMENTS[pid % 4], float(round(land_ac[i] * 8000)),
+            int(stories[i]), OPERATION_TYPES[pid % 4], f"{city}, {state}",
+            float(round(price[i] * 0.018, 2)), int(buildings[i]), f"Z-{pid % 12}",
+        ))
+    return rows
+
+
+def relationship_rows(rng: np.random.Generator, start: int, count: int, contacts: int):
+    """Contacts per property follow FAN_OUT; a skewed pick makes some contacts very common."""
+    fan_values = np.array(list(FAN_OUT.keys()))
+    fan_p = np.array(list(FAN_OUT.values()))
+    fan = rng.choice(fan_values, size=count, p=fan_p / fan_p.sum())
+    property_ids = np.repeat(np.arange(start, start + count), fan)
+    contact_ids = 1 + (contacts * rng.random(len(property_ids)) ** 2).astype(np.int64)
+    return list(zip(property_ids.tolist(), contact_ids.tolist()))
+
+
+def contact_rows(rng: np.random.Generator, start: int, count: int):
+    rows = []
+    for cid in range(start, start + count):
+        rows.append((cid, f"Contact {cid}", f"({200 + cid % 800}) 555-{cid % 10000:04d}",
+                     f"contact{cid}@example.com" if cid % 7 else None))
+    return rows
+
+
+def generate(path: str, rows: int, seed: int = 42) -> dict:
+    """Write a fresh database with `rows` properties to `path`; return row counts."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if os.path.exists(path):
+        os.remove(path)
+    rng = np.random.default_rng(seed)
+    contacts = max(1, int(rows * CONTACTS_PER_PROPERTY))
+
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.executescript(SCHEMA)
+
+    property_placeholders = ",".join("?" * 39)
+    relationships = 0
+    for start in range(1, rows + 1, CHUNK):
+        count = min(CHUNK, rows + 1 - start)
+        conn.executemany(f"INSERT INTO property VALUES ({property_placeholders})", property_rows(rng, start, count))
+        links = relationship_rows(rng, start, count, contacts)
+        conn.executemany("INSERT INTO relationship VALUES (?, ?)", links)
+        relationships += len(links)
+    for start in range(1, contacts + 1, CHUNK):
+        conn.executemany("INSERT INTO contact VALUES (?, ?, ?, ?)",
+                         contact_rows(rng, start, min(CHUNK, contacts + 1 - start)))
+    conn.commit()
+    conn.executescript(INDEXES)
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+    return {"property": rows, "contact": contacts, "relationship": relationships}
+
+
+def default_path(scale: str) -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", f"properties_{scale}.sqlite")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic property database")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="10k")
+    parser.add_argument("--rows", type=int, help="exact property count (overrides --scale)")
+    parser.add_argument("--out", help="output file (default: benchmarks/data/properties_<scale>.sqlite)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rows = args.rows or SCALES[args.scale]
+    out = args.out or default_path(args.scale if not args.rows else f"{rows}")
+    started = time.perf_counter()
+    counts = generate(out, rows, args.seed)
+    print(f"Wrote {out} in {time.perf_counter() - started:.1f}s: {counts}")
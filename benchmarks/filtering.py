@@ -0,0 +1,161 @@
+# benchmarks/filtering.py
+"""Server-side filter spec vs. filtering in the client.
+
+    python benchmarks/datagen.py --scale 10k
+    python benchmarks/filtering.py --scale 10k --queries 20
+
+For each random multi-value + range filter (e.g. "TX or OK, Office or
+Industrial, Cap_Rate 5-7%, built after 2000") this fetches the full result
+two ways against the local stand-in:
+
+- server: POST /api/properties/search with the spec, paging until done
+- client: what the grid had to do before, i.e. page through /api/properties
+  once per state (the only multi-valued field being one request per value)
+  and apply the remaining conditions in Python
+
+and reports latency, bytes transferred and rows received for both, plus the
+latency of the first server-side page. Prefetch and the shared cache are
+disabled on the server so every request reaches the database.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from typing import Dict, List
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import percentiles, save_results  # noqa: E402
+from datagen import LOCATIONS, PROPERTY_TYPES, default_path  # noqa: E402
+from loadgen import start_server, wait_until_healthy  # noqa: E402
+
+PAGE_SIZE = 100
+
+
+def random_spec(rng: random.Random) -> Dict:
+    states = sorted({location[1] for location in LOCATIONS})
+    low = round(rng.uniform(0.04, 0.07), 3)
+    return {
+        "states": rng.sample(states, 2),
+        "property_types": rng.sample(PROPERTY_TYPES, 2),
+        "cap_rate": {"min": low, "max": round(low + 0.02, 3)},
+        "year_built": {"min": rng.choice([1980, 1990, 2000, 2010])},
+    }
+
+
+def matches(row: Dict, spec: Dict) -> bool:
+    cap_rate, year_built = row["Cap_Rate"], row["Year_Built"]
+    return (
+        row["PropertyType"] in spec["property_types"]
+        and cap_rate is not None and spec["cap_rate"]["min"] <= cap_rate <= spec["cap_rate"]["max"]
+        and year_built is not None and year_built >= spec["year_built"]["min"]
+    )
+
+
+async def fetch_all(client: httpx.AsyncClient, method: str, path: str, **kwargs) -> Dict:
+    """Page through an endpoint; return rows, bytes, requests and first-page latency."""
+    rows: List[Dict] = []
+    total_bytes, requests, first_page = 0, 0, None
+    page = 1
+    while True:
+        started = time.perf_counter()
+        if method == "POST":
+            response = await client.post(path, json={**kwargs["json"], "page": page, "page_size": PAGE_SIZE})
+        else:
+            response = await client.get(path, params={**kwargs["params"], "page": page, "page_size": PAGE_SIZE})
+        response.raise_for_status()
+        body = response.json()
+        if first_page is None:
+            first_page = time.perf_counter() - started
+        total_bytes += len(response.content)
+        requests += 1
+        rows.extend(body["data"])
+        if page >= body["total_pages"]:
+            break
+        page += 1
+    return {"rows": rows, "bytes": total_bytes, "requests": requests, "first_page": first_page}
+
+
+async def run_query(client: httpx.AsyncClient, spec: Dict) -> Dict:
+    started = time.perf_counter()
+    server = await fetch_all(client, "POST", "/api/properties/search", json=spec)
+    server_latency = time.perf_counter() - started
+
+    started = time.perf_counter()
+    client_rows, client_bytes, client_requests = [], 0, 0
+    for state in spec["states"]:
+        fetched = await fetch_all(client, "GET", "/api/properties", params={"state": state})
+        client_rows.extend(row for row in fetched["rows"] if matches(row, spec))
+        client_bytes += fetched["bytes"]
+        client_requests += fetched["requests"]
+    client_latency = time.perf_counter() - started
+
+    return {
+        "server": {"latency": server_latency, "first_page": server["first_page"], "bytes": server["bytes"],
+                   "requests": server["requests"], "rows": len(server["rows"])},
+        "client": {"latency": client_latency, "bytes": client_bytes, "requests": client_requests,
+                   "rows": len(client_rows)},
+    }
+
+
+async def main(args) -> Dict:
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        os.environ.update({"PREFETCH_DEPTH": "0", "SHARED_CACHE_ENABLED": "false"})
+        server = start_server(args.db, args.port)
+        base_url = f"http://127.0.0.1:{args.port}"
+
+    rng = random.Random(args.seed)
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout) as client:
+            await wait_until_healthy(client, server)
+            await run_query(client, random_spec(random.Random(0)))  # warm-up
+            runs = [await run_query(client, random_spec(rng)) for _ in range(args.queries)]
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    results = {}
+    for side in ("server", "client"):
+        results[side] = {
+            "latency_s": percentiles([run[side]["latency"] for run in runs]),
+            "mean_bytes": round(sum(run[side]["bytes"] for run in runs) / len(runs)),
+            "mean_requests": round(sum(run[side]["requests"] for run in runs) / len(runs), 1),
+            "mean_rows": round(sum(run[side]["rows"] for run in runs) / len(runs), 1),
+        }
+    results["server"]["first_page_s"] = percentiles([run["server"]["first_page"] for run in runs])
+
+    for side, values in results.items():
+        lat = values["latency_s"]
+        print(f"{side:>6}: p50 {lat['p50'] * 1000:8.1f}ms  p95 {lat['p95'] * 1000:8.1f}ms  "
+              f"{values['mean_bytes'] / 1024:9.1f} KiB  {values['mean_requests']:6.1f} requests  "
+              f"{values['mean_rows']:8.1f} rows")
+    print(f"first server page p50 {results['server']['first_page_s']['p50'] * 1000:.1f}ms; "
+          f"bytes reduced {1 - results['server']['mean_bytes'] / max(1, results['client']['mean_bytes']):.1%}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Server-side vs client-side filtering")
+    parser.add_argument("--scale", default="10k", help="dataset generated by datagen.py (10k, 1m, 5m)")
+    parser.add_argument("--db", help="database file (default: benchmarks/data/properties_<scale>.sqlite)")
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--base-url", help="use an already running server instead of starting one")
+    parser.add_argument("--out", help="result file (default: benchmarks/results/filtering_<time>_<rev>.json)")
+    args = parser.parse_args()
+    args.db = args.db or default_path(args.scale)
+
+    if args.base_url is None and not os.path.exists(args.db):
+        sys.exit(f"{args.db} not found; run benchmarks/datagen.py --scale {args.scale} first")
+
+    results = asyncio.run(main(args))
+    print(f"Saved {save_results('filtering', {'db': os.path.basename(args.db), **results}, args.out)}")
@@ -0,0 +1,251 @@
+# benchmarks/loadgen.py
+"""Async load generator for the property API against the local SQLite stand-in.
+
+    python benchmarks/datagen.py --scale 10k
+    python benchmarks/loadgen.py --scale 10k --concurrency 8 --requests 200
+
+Starts `uvicorn server:app` with DB_BACKEND=sqlite (unless --base-url points
+at a running server), drives each scenario with a fixed number of requests
+and reports p50/p95/p99 latency, throughput and the server's peak RSS per
+scenario. Results are written to benchmarks/results/ as JSON.
+
+A started server keeps its shared cache, dataset changelog and relationship
+index in a temporary directory that is removed afterwards, so no state from
+an earlier run or scale carries into the measurement.
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import ROOT, percentiles, save_results  # noqa: E402
+from datagen import LOCATIONS, PROPERTY_TYPES, default_path  # noqa: E402
+
+
+def _random_filters(rng: random.Random) -> Dict[str, str]:
+    city, state, county, _, _ = rng.choice(LOCATIONS)
+    choice = rng.random()
+    if choice < 0.4:
+        return {"state": state}
+    if choice < 0.7:
+        return {"state": state, "property_type": rng.choice(PROPERTY_TYPES)}
+    if choice < 0.9:
+        return {"city": city}
+    return {"county": county, "property_type": rng.choice(PROPERTY_TYPES)}
+
+
+def properties_request(rng: random.Random):
+    return "/api/properties", {**_random_filters(rng), "page": rng.randint(1, 20), "page_size": 50}
+
+
+def filters_request(rng: random.Random):
+    return "/api/filters", {}
+
+
+def export_request(fmt: str) -> Callable:
+    def build(rng: random.Random):
+        # Narrow filters keep a single export to a realistic size
+        city, _, _, _, _ = rng.choice(LOCATIONS)
+        return "/api/properties/export", {"format": fmt, "city": city, "property_type": rng.choice(PROPERTY_TYPES)}
+    return build
+
+
+SCENARIOS = {
+    "properties": properties_request,
+    "filters": filters_request,
+    "export_csv": export_request("csv"),
+    "export_excel": export_request("excel"),
+}
+
+
+class RssSampler:
+    """Tracks the peak resident set size of a process from /proc (Linux)."""
+
+    def __init__(self, pid: Optional[int], interval: float = 0.05):
+        self.pid = pid
+        self.interval = interval
+        self.peak_kb = 0
+        self._task = None
+
+    def _read_kb(self) -> int:
+        try:
+            with open(f"/proc/{self.pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1])
+        except OSError:
+            pass
+        return 0
+
+    async def _run(self):
+        while True:
+            self.peak_kb = max(self.peak_kb, self._read_kb())
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self.pid:
+            self.peak_kb = self._read_kb()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> Optional[float]:
+        if self._task is None:
+            return None
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        return round(self.peak_kb / 1024, 1)
+
+
+async def run_scenario(client: httpx.AsyncClient, name: str, requests: int, concurrency: int,
+                       pid: Optional[int], seed: int) -> Dict:
+    rng = random.Random(seed)
+    build = SCENARIOS[name]
+    queue: asyncio.Queue = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(build(rng))
+
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    errors: List[str] = []
+    total_bytes = 0
+
+    async def worker():
+        nonlocal total_bytes
+        while True:
+            try:
+                path, params = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            started = time.perf_counter()
+            try:
+                response = await client.get(path, params=params)
+                body = response.content
+                latencies.append(time.perf_counter() - started)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                total_bytes += len(body)
+            except httpx.HTTPError as e:
+                errors.append(str(e))
+
+    sampler = RssSampler(pid)
+    sampler.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    peak_rss_mb = await sampler.stop()
+
+    failed = len(errors) + sum(count for status, count in statuses.items() if status >= 500)
+    result = {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": failed,
+        "statuses": {str(k): v for k, v in sorted(statuses.items())},
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "latency_s": percentiles(latencies),
+        "mean_bytes": round(total_bytes / len(latencies)) if latencies else 0,
+        "peak_rss_mb": peak_rss_mb,
+    }
+    lat = result["latency_s"]
+    print(f"{name:>14}: p50 {lat.get('p50', 0) * 1000:8.1f}ms  p95 {lat.get('p95', 0) * 1000:8.1f}ms  "
+          f"p99 {lat.get('p99', 0) * 1000:8.1f}ms  {result['throughput_rps']} req/s  "
+          f"errors {failed}  peak RSS {peak_rss_mb} MB")
+    return result
+
+
+def start_server(db_path: str, port: int, state_dir: str) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        "DB_BACKEND": "sqlite",
+        "LOCAL_DB_PATH": os.path.abspath(db_path),
+        "SHARED_CACHE_DIR": os.path.join(state_dir, "shared_cache"),
+        "DATASET_CHANGELOG_PATH": os.path.join(state_dir, "dataset_changelog.sqlite"),
+        "RELATIONSHIP_INDEX_DIR": os.path.join(state_dir, "relationship_index"),
+    })
+    # The server imports the agent graph, which needs a key to construct (never used here)
+    env.setdefault("OPENAI_API_KEY", "benchmark")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env,
+    )
+
+
+async def wait_until_healthy(client: httpx.AsyncClient, server: Optional[subprocess.Popen], timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server is not None and server.poll() is not None:
+            raise RuntimeError(f"Server exited with code {server.returncode}")
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.25)
+    raise RuntimeError("Server did not become healthy in time")
+
+
+async def main(args) -> Dict:
+    server = None
+    state_dir = None
+    pid = args.server_pid
+    base_url = args.base_url
+    if base_url is None:
+        state_dir = tempfile.TemporaryDirectory(prefix="loadgen-")
+        server = start_server(args.db, args.port, state_dir.name)
+        pid = server.pid
+        base_url = f"http://127.0.0.1:{args.port}"
+
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout,
+                                     limits=httpx.Limits(max_connections=args.concurrency)) as client:
+            await wait_until_healthy(client, server)
+            # One untimed request per scenario warms imports, caches and the page cache
+            for name in args.scenarios:
+                path, params = SCENARIOS[name](random.Random(0))
+                await client.get(path, params=params)
+
+            results = {}
+            for name in args.scenarios:
+                requests = args.export_requests if name.startswith("export") else args.requests
+                results[name] = await run_scenario(client, name, requests, args.concurrency, pid, args.seed)
+            return results
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+        if state_dir is not None:
+            state_dir.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the property API")
+    parser.add_argument("--scale", default="10k", help="dataset generated by datagen.py (10k, 1m, 5m)")
+    parser.add_argument("--db", help="database file (default: benchmarks/data/properties_<scale>.sqlite)")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--export-requests", type=int, default=20, help="requests per export scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--base-url", help="use an already running server instead of starting one")
+    parser.add_argument("--server-pid", type=int, help="pid of that server, for peak RSS")
+    parser.add_argument("--out", help="result file (default: benchmarks/results/load_<time>_<rev>.json)")
+    args = parser.parse_args()
+    args.db = args.db or default_path(args.scale)
+
+    if args.base_url is None and not os.path.exists(args.db):
+        sys.exit(f"{args.db} not found; run benchmarks/datagen.py --scale {args.scale} first")
+
+    results = asyncio.run(main(args))
+    meta = {"db": os.path.basename(args.db), "concurrency": args.concurrency, "scenarios": results}
+    print(f"Saved {save_results('load', meta, args.out)}")
@@ -0,0 +1,111 @@
+# benchmarks/micro.py
+"""Micro-benchmarks for the export pipeline (no HTTP, no Fabric).
+
+    python benchmarks/micro.py --db benchmarks/data/properties_10k.sqlite --rows 1000 10000
+
+Times each stage the export route runs after the query: building row dicts,
+prepare_export_dataframe, CSV serialization and Excel serialization with
+formatting. Results are written to benchmarks/results/ as JSON.
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import time
+from io import BytesIO
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import save_results  # noqa: E402
+from datagen import default_path  # noqa: E402
+from export_utils import add_export_info_sheet, format_excel_worksheet, prepare_export_dataframe  # noqa: E402
+
+EXPORT_QUERY = """
+    SELECT p.*, c.name AS contact_name, c.phone, c.email
+    FROM property p
+    LEFT JOIN relationship r ON p.PropertyID = r.PropertyID
+    LEFT JOIN contact c ON r.contact_id = c.contact_id
+    ORDER BY p.PropertyID
+    LIMIT ?
+"""
+
+
+def fetch_rows(db_path: str, rows: int):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.execute(EXPORT_QUERY, (rows,))
+    columns = [column[0] for column in cursor.description]
+    raw = cursor.fetchall()
+    conn.close()
+    return columns, raw
+
+
+def to_csv(df):
+    output = BytesIO()
+    df.to_csv(output, index=False, encoding='utf-8-sig')
+    return output.getbuffer().nbytes
+
+
+def to_excel(df):
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+        df.to_excel(writer, sheet_name='Properties', index=False)
+        format_excel_worksheet(df, writer)
+        add_export_info_sheet(writer, {"Benchmark": "micro"}, len(df))
+    return output.getbuffer().nbytes
+
+
+def timed(fn, repeat: int):
+    """Run fn `repeat` times; return (timings, last result)."""
+    timings, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return timings, result
+
+
+def summarize(timings):
+    return {"min": min(timings), "median": statistics.median(timings), "max": max(timings)}
+
+
+def run(db_path: str, sizes, repeat: int, excel_limit: int):
+    results = {}
+    for size in sizes:
+        columns, raw = fetch_rows(db_path, size)
+        stage = {}
+
+        timings, records = timed(lambda: [dict(zip(columns, row)) for row in raw], repeat)
+        stage["build_dicts"] = summarize(timings)
+
+        timings, df = timed(lambda: prepare_export_dataframe(records), repeat)
+        stage["prepare_dataframe"] = summarize(timings)
+
+        timings, csv_bytes = timed(lambda: to_csv(df), repeat)
+        stage["csv"] = {**summarize(timings), "bytes": csv_bytes}
+
+        if size <= excel_limit:
+            timings, xlsx_bytes = timed(lambda: to_excel(df), repeat)
+            stage["excel"] = {**summarize(timings), "bytes": xlsx_bytes}
+
+        results[str(len(raw))] = stage
+        print(f"{len(raw):>8} rows: " + "  ".join(
+            f"{name} {values['median'] * 1000:.1f}ms" for name, values in stage.items()
+        ))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export pipeline micro-benchmarks")
+    parser.add_argument("--db", default=default_path("10k"))
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 10_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--excel-limit", type=int, default=50_000, help="skip Excel above this many rows")
+    parser.add_argument("--out", help="result file (default: benchmarks/results/micro_<time>_<rev>.json)")
+    args = parser.parse_args()
+
+    results = run(args.db, args.rows, args.repeat, args.excel_limit)
+    print(f"Saved {save_results('micro', {'db': os.path.basename(args.db), 'stages': results}, args.out)}")
@@ -1,46 +1,131 @@
-#import config
-import random
-import os
-#from .workflow import DatabaseAnalysisGraph
-#from workflow import DatabaseAnalysisGraph
 import asyncio
-
-from openai import OpenAI
-
+import logging
+import os
 import sys
-
-#client = OpenAI(api_key = config.OPENAI_API_KEY)
-
+import threading
+import time
+from typing import AsyncIterator, Dict, Iterable, List, Optional
 
 # Add the parent directory to sys.path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
+import config
 from workflow import DatabaseAnalysisGraph
-import asyncio
-#import config
+
+logger = logging.getLogger(__name__)
+
+_graph: Optional[DatabaseAnalysisGraph] = None
+_graph_lock = threading.Lock()
+
+# Event loop used by the synchronous call_model shim, kept alive across calls
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def get_graph() -> DatabaseAnalysisGraph:
+    """Shared, lazily built graph; its toolkit holds the SQL connection pool."""
+    global _graph
+    if _graph is None:
+        with _graph_lock:
+            if _graph is None:
+                _graph = DatabaseAnalysisGraph()
+    return _graph
+
+
+def _answer(result) -> str:
+    # Extract the last message content
+    if result and "messages" in result and result["messages"]:
+        return result["messages"][-1].content
+    return "No response generated"
+
+
+async def acall_model(
+    question: str,
+    timeout: Optional[float] = None,
+    graph: Optional[DatabaseAnalysisGraph] = None,
+    callbacks: Optional[list] = None,
+) -> str:
+    """Ask the SQL database agent a question.
+
+    Raises asyncio.TimeoutError if no answer arrives within `timeout` seconds
+    (defaults to CALL_MODEL_TIMEOUT_SECONDS; 0 disables the limit).
+    """
+    graph = graph or get_graph()
+    timeout = config.CALL_MODEL_TIMEOUT_SECONDS if timeout is None else timeout
+    result = await asyncio.wait_for(graph.run(question, callbacks=callbacks), timeout or None)
+    return _answer(result)
+
+
+async def call_model_batch(
+    questions: Iterable[str],
+    concurrency: int = None,
+    timeout: Optional[float] = None,
+    graph: Optional[DatabaseAnalysisGraph] = None,
+) -> AsyncIterator[Dict]:
+    """Answer many questions concurrently over the shared graph.
+
+    Yields one result per question in completion order:
+    {"index", "question", "answer", "error", "latency_s"}. A failing or timed
+    out question only sets its own "error"; the rest of the batch continues.
+    """
+    graph = graph or get_graph()
+    semaphore = asyncio.Semaphore(concurrency or config.CALL_MODEL_CONCURRENCY)
+
+    async def answer_one(index: int, question: str) -> Dict:
+        async with semaphore:
+            started = time.perf_counter()
+            answer, error = None, None
+            try:
+                answer = await acall_model(question, timeout=timeout, graph=graph)
+            except asyncio.TimeoutError:
+                error = "Timed out"
+            except Exception as e:
+                error = str(e)
+            return {
+                "index": index,
+                "question": question,
+                "answer": answer,
+                "error": error,
+                "latency_s": round(time.perf_counter() - started, 3),
+            }
+
+    tasks = [asyncio.ensure_future(answer_one(i, q)) for i, q in enumerate(questions)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # The consumer stopped early; don't leave questions running
+        for task in tasks:
+            task.cancel()
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="call-model-loop", daemon=True).start()
+    return _loop
+
 
 def call_model(question: str) -> str:
-    """Synchronous function to call the SQL database agent"""
-    # Create event loop and run async function
-    async def run_query():
-        graph = DatabaseAnalysisGraph()
-        result = await graph.run(question)
-        # Extract the last message content
-        if result and "messages" in result and result["messages"]:
-            return result["messages"][-1].content
-        return "No response generated"
-
-    # Run the async function in the event loop
+    """Synchronous function to call the SQL database agent.
+
+    Thin shim over acall_model that runs on a dedicated background loop, so it
+    also works when called from code that already has a running event loop.
+    """
     try:
-        # Get or create event loop
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-        response = loop.run_until_complete(run_query())
-        return response
+        future = asyncio.run_coroutine_threadsafe(acall_model(question), _get_loop())
+        return future.result()
     except Exception as e:
-        print(f"Error in call_model: {str(e)}")
-        return f"Error processing query: {str(e)}"
\ No newline at end of file
+        logger.error("Error in call_model: %s", e)
+        return f"Error processing query: {str(e)}"
+
+
+def call_model_many(questions: List[str], concurrency: int = None, timeout: Optional[float] = None) -> List[Dict]:
+    """Synchronous batch helper; returns call_model_batch results in input order."""
+    async def collect():
+        return [r async for r in call_model_batch(questions, concurrency=concurrency, timeout=timeout)]
+
+    results = asyncio.run_coroutine_threadsafe(collect(), _get_loop()).result()
+    return sorted(results, key=lambda r: r["index"])
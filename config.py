@@ -12,25 +12,95 @@ FABRIC_SERVER=os.getenv('FABRIC_SERVER')
 FABRIC_DATABASE=os.getenv('FABRIC_DATABASE')
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
+# Database backend: the Fabric warehouse, or a local SQLite stand-in (see benchmarks/)
+DB_BACKEND = os.getenv('DB_BACKEND', 'fabric')  # fabric | sqlite
+LOCAL_DB_PATH = os.getenv('LOCAL_DB_PATH', 'benchmarks/data/properties_10k.sqlite')
+
+# Conversation memory
+MEMORY_MAX_TOKENS = int(os.getenv('MEMORY_MAX_TOKENS', '6000'))  # history budget sent to the agent
+MEMORY_SUMMARIZE = os.getenv('MEMORY_SUMMARIZE', 'true').lower() == 'true'
+MEMORY_DEDUPE_SIZE = int(os.getenv('MEMORY_DEDUPE_SIZE', '256'))
+CHECKPOINTER_BACKEND = os.getenv('CHECKPOINTER_BACKEND', 'memory')  # memory | sqlite
+CHECKPOINT_DB_PATH = os.getenv('CHECKPOINT_DB_PATH', 'checkpoints.sqlite')
+THREAD_TTL_SECONDS = int(os.getenv('THREAD_TTL_SECONDS', '3600'))
+MAX_THREADS = int(os.getenv('MAX_THREADS', '1000'))
+
+# Guardrails for the agent's sql_db_query tool
+SQL_GUARD_MAX_ROWS = int(os.getenv('SQL_GUARD_MAX_ROWS', '200'))  # TOP cap injected into every query
+SQL_GUARD_TIMEOUT_SECONDS = int(os.getenv('SQL_GUARD_TIMEOUT_SECONDS', '30'))
+SQL_GUARD_MAX_COST = float(os.getenv('SQL_GUARD_MAX_COST', '100'))  # estimated plan cost, 0 disables the check
+SQL_GUARD_SUMMARY_ROWS = int(os.getenv('SQL_GUARD_SUMMARY_ROWS', '25'))  # rows shown to the agent
+SQL_GUARD_MAX_CELL_CHARS = int(os.getenv('SQL_GUARD_MAX_CELL_CHARS', '200'))
+SQL_GUARD_MAX_RESULT_CHARS = int(os.getenv('SQL_GUARD_MAX_RESULT_CHARS', '6000'))
+
+# call_model entry points
+CALL_MODEL_CONCURRENCY = int(os.getenv('CALL_MODEL_CONCURRENCY', '5'))
+CALL_MODEL_TIMEOUT_SECONDS = float(os.getenv('CALL_MODEL_TIMEOUT_SECONDS', '180'))  # 0 disables the limit
+AGENT_DB_POOL_SIZE = int(os.getenv('AGENT_DB_POOL_SIZE', '5'))  # SQLAlchemy pool shared by agent runs
+AGENT_DB_MAX_OVERFLOW = int(os.getenv('AGENT_DB_MAX_OVERFLOW', '10'))
+
+# Observability
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+SQL_LOG_SAMPLE_RATE = float(os.getenv('SQL_LOG_SAMPLE_RATE', '0.01'))  # fraction of statements logged
+SQL_LOG_PARAMS = os.getenv('SQL_LOG_PARAMS', 'false').lower() == 'true'  # log parameter values (debug only)
+
+# Dataset versioning (ETag / Last-Modified and the /api/properties/changes feed)
+DATASET_VERSION_TTL = float(os.getenv('DATASET_VERSION_TTL', '60'))  # seconds a worker reuses the known version
+DATASET_PROBE_INTERVAL = float(os.getenv('DATASET_PROBE_INTERVAL', '300'))  # seconds between warehouse probes per node
+# Cheap change signal per table: "property=Update_Date,contact=Update_Date" probes COUNT_BIG + MAX(column);
+# tables not listed are probed with CHECKSUM_AGG(BINARY_CHECKSUM(*)), a full scan
+DATASET_CHANGE_COLUMNS = dict(
+    item.split('=', 1) for item in os.getenv('DATASET_CHANGE_COLUMNS', '').replace(' ', '').split(',') if '=' in item
+)
+DATASET_CHANGELOG_PATH = os.getenv('DATASET_CHANGELOG_PATH', 'dataset_changelog.sqlite')
+DATASET_CHANGELOG_RETAIN = int(os.getenv('DATASET_CHANGELOG_RETAIN', '100'))  # versions kept for the feed
+
+# Property grid paging
+PREFETCH_DEPTH = int(os.getenv('PREFETCH_DEPTH', '1'))  # pages prefetched after each page served, 0 disables
+PREFETCH_MAX_PAGES = int(os.getenv('PREFETCH_MAX_PAGES', '256'))
+PREFETCH_TTL_SECONDS = float(os.getenv('PREFETCH_TTL_SECONDS', '60'))
+PREFETCH_WORKERS = int(os.getenv('PREFETCH_WORKERS', '2'))
+BATCH_MAX_PAGES = int(os.getenv('BATCH_MAX_PAGES', '20'))  # pages per /api/properties/batch request
+
+# Node-local cache shared by all uvicorn workers (filter options, counts, agent schema info)
+SHARED_CACHE_ENABLED = os.getenv('SHARED_CACHE_ENABLED', 'true').lower() == 'true'
+SHARED_CACHE_DIR = os.getenv('SHARED_CACHE_DIR', 'shared_cache')
+SHARED_CACHE_MAX_BYTES = int(os.getenv('SHARED_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+SHARED_CACHE_BLOB_BYTES = int(os.getenv('SHARED_CACHE_BLOB_BYTES', str(64 * 1024)))  # larger values go to mmap'd files
+SHARED_CACHE_TOUCH_SECONDS = float(os.getenv('SHARED_CACHE_TOUCH_SECONDS', '10'))
+# Filter options and counts are invalidated on every new dataset version; this TTL only bounds
+# their staleness when version probes keep failing
+SHARED_CACHE_DATA_TTL_SECONDS = float(os.getenv('SHARED_CACHE_DATA_TTL_SECONDS', str(3 * DATASET_PROBE_INTERVAL)))
+SCHEMA_CACHE_TTL_SECONDS = float(os.getenv('SCHEMA_CACHE_TTL_SECONDS', '3600'))  # agent table info
+
+# Property <-> contact relationship index (memory-mapped, shared by the node's workers)
+RELATIONSHIP_INDEX_DIR = os.getenv('RELATIONSHIP_INDEX_DIR', os.path.join(SHARED_CACHE_DIR, 'relationship_index'))
+RELATIONSHIP_BATCH_MAX = int(os.getenv('RELATIONSHIP_BATCH_MAX', '10000'))  # ids per batch lookup
+
 
 
 # Validate essential configuration
-if not TENANT_ID:
-    raise ValueError("TENANT_ID is not set in the environment variables")
+if DB_BACKEND not in ('fabric', 'sqlite'):
+    raise ValueError(f"DB_BACKEND must be 'fabric' or 'sqlite', got {DB_BACKEND!r}")
+
+if DB_BACKEND == 'fabric':
+    if not TENANT_ID:
+        raise ValueError("TENANT_ID is not set in the environment variables")
 
-if not CLIENT_ID:
-    raise ValueError("CLIENT_ID is not set in the environment variables")
+    if not CLIENT_ID:
+        raise ValueError("CLIENT_ID is not set in the environment variables")
 
 
-if not CLIENT_SECRET:
-    raise ValueError("CLIENT_SECRET is not set in the environment variables")
+    if not CLIENT_SECRET:
+        raise ValueError("CLIENT_SECRET is not set in the environment variables")
 
 
-if not FABRIC_SERVER:
-    raise ValueError("FABRIC_SERVER is not set in the environment variables")
+    if not FABRIC_SERVER:
+        raise ValueError("FABRIC_SERVER is not set in the environment variables")
 
-if not FABRIC_DATABASE:
-    raise ValueError("FABRIC_DATABASE is not set in the environment variables")
+    if not FABRIC_DATABASE:
+        raise ValueError("FABRIC_DATABASE is not set in the environment variables")
 
 if not OPENAI_API_KEY:
     raise ValueError("OPENAI_API_KEY is not set in the environment variables")
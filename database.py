@@ -1,7 +1,18 @@
+import logging
+import re
+import sqlite3
+import zlib
+from functools import lru_cache
+
 import pyodbc
 import config
 
+logger = logging.getLogger(__name__)
+
 def get_db_connection():
+    if config.DB_BACKEND == 'sqlite':
+        return get_local_connection()
+
     # Create service principal ID using config variables
     service_principal_id = f"{config.CLIENT_ID}@{config.TENANT_ID}"
 
@@ -22,6 +33,96 @@ def get_db_connection():
 
     return pyodbc.connect(conn_str)
 
+
+# ---------------------------------------------------------------------------
+# Local SQLite stand-in for the Fabric warehouse (DB_BACKEND=sqlite)
+# ---------------------------------------------------------------------------
+
+_OFFSET_FETCH = re.compile(
+    r"OFFSET\s+(\?|\d+)\s+ROWS\s+FETCH\s+NEXT\s+(\?|\d+)\s+ROWS\s+ONLY", re.IGNORECASE
+)
+_SELECT_TOP = re.compile(r"^(\s*SELECT\s+(?:DISTINCT\s+)?)TOP\s*\(?\s*(\d+)\s*\)?", re.IGNORECASE)
+
+
+@lru_cache(maxsize=512)
+def tsql_to_sqlite(query: str) -> str:
+    """Rewrite the T-SQL constructs the routes use into SQLite syntax.
+
+    [dbo].[table] works as-is because the data file is attached as schema
+    "dbo"; paging (OFFSET/FETCH), a leading TOP and COUNT_BIG are translated.
+    BINARY_CHECKSUM (with explicit columns) and CHECKSUM_AGG are registered
+    as functions on the connection instead.
+    Placeholders keep their positions, so parameters pass through unchanged.
+    """
+    # SQLite's "LIMIT offset, count" keeps the operands (and any ?) in T-SQL order
+    query = _OFFSET_FETCH.sub(r"LIMIT \1, \2", query)
+    top = _SELECT_TOP.match(query)
+    if top:
+        query = f"{top.group(1)}{query[top.end():]} LIMIT {top.group(2)}"
+    return re.sub(r"\bCOUNT_BIG\s*\(", "COUNT(", query, flags=re.IGNORECASE)
+
+
+def _binary_checksum(*values) -> int:
+    return zlib.crc32(repr(values).encode())
+
+
+class _ChecksumAgg:
+    """XOR of the checksums, like CHECKSUM_AGG; aggregated row by row in SQLite."""
+
+    def __init__(self):
+        self.value = 0
+
+    def step(self, checksum):
+        if checksum is not None:
+            self.value ^= checksum
+
+    def finalize(self):
+        return self.value
+
+
+class LocalCursor:
+    """sqlite3 cursor that accepts the routes' T-SQL."""
+
+    def __init__(self, cursor: sqlite3.Cursor):
+        self._cursor = cursor
+
+    def execute(self, query, params=()):
+        self._cursor.execute(tsql_to_sqlite(query), params)
+        return self
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class LocalConnection:
+    """Just enough of the pyodbc connection interface for the routes."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+
+    def cursor(self):
+        return LocalCursor(self._conn.cursor())
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def get_local_connection() -> LocalConnection:
+    conn = sqlite3.connect("file::memory:", uri=True, check_same_thread=False)
+    # Attached as "dbo" so [dbo].[property] resolves; unqualified names still do too
+    conn.execute("ATTACH DATABASE ? AS dbo", (f"file:{config.LOCAL_DB_PATH}?mode=ro",))
+    conn.create_function("BINARY_CHECKSUM", -1, _binary_checksum, deterministic=True)
+    conn.create_aggregate("CHECKSUM_AGG", 1, _ChecksumAgg)
+    return LocalConnection(conn)
+
+
 def execute_query(query):
     try:
         with get_db_connection() as conn:
@@ -31,7 +132,7 @@ def execute_query(query):
             results = cursor.fetchall()
             return [dict(zip(columns, row)) for row in results]
     except Exception as e:
-        print(f"Error executing query: {e}")
+        logger.error("Error executing query: %s", e)
         return None
 
 # Example usage
@@ -39,4 +140,4 @@ if __name__ == "__main__":
     query = "SELECT TOP 5 * FROM [dbo].[contact]"
     results = execute_query(query)
     if results:
-        print(results)
\ No newline at end of file
+        print(results)
@@ -0,0 +1,458 @@
+# dataset_version.py
+"""Dataset version tracking and change feed for the property data.
+
+The warehouse has no change tracking we can query, so changes are detected
+in two steps:
+
+- A cheap probe of each table (property, relationship, contact) tells us
+  whether anything changed. For a table listed in DATASET_CHANGE_COLUMNS it
+  reads COUNT_BIG(*) and MAX(<column>), e.g. an Update_Date maintained by the
+  load. Those read column metadata rather than every row. Other tables fall
+  back to CHECKSUM_AGG(BINARY_CHECKSUM(*)), which scans the table and can
+  miss a change on a checksum collision.
+- Only when the probe changes, a per-property snapshot (property row
+  checksum + checksum of its contacts) is diffed against the previous one.
+  Each real change bumps a monotonically increasing version and records
+  which PropertyIDs were inserted, updated or deleted. A probe change with an
+  empty diff, e.g. writes that landed while the previous snapshot was taken,
+  only updates the stored fingerprint.
+
+State lives in a local SQLite file (WAL), so every worker on the node sees
+the same version. One worker at a time holds the probe lease, and the
+warehouse is probed at most once per DATASET_PROBE_INTERVAL per node. The
+snapshot is staged and diffed in temp tables without holding the changelog's
+write lock, which is only taken to publish the result. Requests never wait
+for a probe: they get the last known version while a background thread
+refreshes it.
+"""
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, List, NamedTuple, Optional
+
+import config
+import shared_cache
+from database import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_BATCH = 10_000
+TABLES = ("property", "relationship", "contact")
+# The probe lease passes to another worker when its holder exits, or after this long
+LEASE_SECONDS = 1800
+
+PROPERTY_HASH_QUERY = "SELECT PropertyID, {checksum} FROM [dbo].[property]"
+CONTACT_HASH_QUERY = """
+    SELECT r.PropertyID, CHECKSUM_AGG(BINARY_CHECKSUM(c.contact_id, c.name, c.phone, c.email))
+    FROM [dbo].[relationship] r
+    JOIN [dbo].[contact] c ON r.contact_id = c.contact_id
+    GROUP BY r.PropertyID
+"""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS versions (
+    version INTEGER PRIMARY KEY, fingerprint TEXT NOT NULL, detected_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value);
+CREATE TABLE IF NOT EXISTS row_hashes (PropertyID PRIMARY KEY, row_hash INTEGER, contact_hash INTEGER);
+CREATE TABLE IF NOT EXISTS changes (version INTEGER NOT NULL, PropertyID NOT NULL, op TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS ix_changes_version ON changes (version);
+"""
+
+
+class DatasetVersion(NamedTuple):
+    version: int
+    last_modified: datetime  # when this version was first detected
+    fingerprint: str = ""  # probe result for this version's data; versions restart with a new changelog
+
+    @property
+    def http_date(self) -> str:
+        return format_datetime(self.last_modified, usegmt=True)
+
+
+class VersionGone(Exception):
+    """The requested `since` version is older than the retained change history."""
+
+
+# ---------------------------------------------------------------------------
+# Changelog storage
+# ---------------------------------------------------------------------------
+
+def _changelog() -> sqlite3.Connection:
+    conn = sqlite3.connect(config.DATASET_CHANGELOG_PATH, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _latest(conn: sqlite3.Connection) -> Optional[DatasetVersion]:
+    row = conn.execute(
+        "SELECT version, detected_at, fingerprint FROM versions ORDER BY version DESC LIMIT 1"
+    ).fetchone()
+    if row is None:
+        return None
+    return DatasetVersion(row[0], datetime.fromtimestamp(row[1], tz=timezone.utc).replace(microsecond=0), row[2])
+
+
+def _latest_fingerprint(conn: sqlite3.Connection) -> Optional[str]:
+    row = conn.execute("SELECT fingerprint FROM versions ORDER BY version DESC LIMIT 1").fetchone()
+    return row[0] if row else None
+
+
+def _meta(conn: sqlite3.Connection, key: str, default=None):
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else default
+
+
+def _set_meta(conn: sqlite3.Connection, key: str, value):
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+
+# ---------------------------------------------------------------------------
+# Warehouse snapshots
+# ---------------------------------------------------------------------------
+
+def _change_column(table: str) -> Optional[str]:
+    column = config.DATASET_CHANGE_COLUMNS.get(table)
+    if column is not None and not re.fullmatch(r"\w+", column):
+        raise ValueError(f"DATASET_CHANGE_COLUMNS: invalid column {column!r} for {table}")
+    return column
+
+
+def _row_checksum(cursor, table: str) -> str:
+    """BINARY_CHECKSUM(*) for `table`; the local stand-in needs the columns spelled out."""
+    if config.DB_BACKEND != 'sqlite':
+        return "BINARY_CHECKSUM(*)"
+    cursor.execute(f"SELECT * FROM [dbo].[{table}] WHERE 1 = 0")
+    return "BINARY_CHECKSUM({})".format(", ".join(f"[{column[0]}]" for column in cursor.description))
+
+
+def _fingerprint(cursor) -> str:
+    """Cheap change signal over the three tables (see the module docstring)."""
+    parts = []
+    for table in TABLES:
+        column = _change_column(table)
+        if column is not None:
+            cursor.execute(f"SELECT COUNT_BIG(*), MAX([{column}]) FROM [dbo].[{table}]")
+        else:
+            cursor.execute(f"SELECT COUNT_BIG(*), CHECKSUM_AGG({_row_checksum(cursor, table)}) FROM [dbo].[{table}]")
+        parts += list(cursor.fetchone())
+    return ":".join(str(p) for p in parts)
+
+
+def _stream_hashes(cursor, query: str):
+    """Yield (PropertyID, hash) batches from the warehouse."""
+    cursor.execute(query)
+    while True:
+        batch = cursor.fetchmany(SNAPSHOT_BATCH)
+        if not batch:
+            return
+        yield [tuple(row) for row in batch]
+
+
+def _stage_snapshot(log: sqlite3.Connection, cursor, baseline: bool):
+    """Snapshot the warehouse into temp tables and diff it against row_hashes.
+
+    Leaves temp.snap (the new hashes) and temp.snap_changes (PropertyID, op).
+    Temp tables are private to this connection and writing them takes no
+    lock on the changelog, so the other workers are not blocked while the
+    warehouse is read. row_hashes is only written by the lease holder, so
+    reading it here is consistent.
+    Streaming into SQLite keeps memory use flat regardless of table size.
+    """
+    for table in ("snap_property", "snap_contact", "snap", "snap_changes"):
+        log.execute(f"DROP TABLE IF EXISTS temp.{table}")
+    log.execute("CREATE TEMP TABLE snap_property (PropertyID PRIMARY KEY, row_hash INTEGER)")
+    log.execute("CREATE TEMP TABLE snap_contact (PropertyID PRIMARY KEY, contact_hash INTEGER)")
+    log.execute("CREATE TEMP TABLE snap_changes (PropertyID, op TEXT NOT NULL)")
+
+    log.execute("BEGIN")  # touches temp tables only
+    try:
+        property_query = PROPERTY_HASH_QUERY.format(checksum=_row_checksum(cursor, "property"))
+        for batch in _stream_hashes(cursor, property_query):
+            log.executemany("INSERT OR REPLACE INTO snap_property VALUES (?, ?)", batch)
+        for batch in _stream_hashes(cursor, CONTACT_HASH_QUERY):
+            log.executemany("INSERT OR REPLACE INTO snap_contact VALUES (?, ?)", batch)
+
+        log.execute("""
+            CREATE TEMP TABLE snap AS
+            SELECT p.PropertyID, p.row_hash, COALESCE(c.contact_hash, 0) AS contact_hash
+            FROM snap_property p LEFT JOIN snap_contact c ON p.PropertyID = c.PropertyID
+        """)
+        log.execute("CREATE INDEX temp.ix_snap ON snap (PropertyID)")
+        if not baseline:
+            log.execute("""
+                INSERT INTO snap_changes
+                SELECT s.PropertyID, 'insert' FROM snap s
+                LEFT JOIN main.row_hashes o ON o.PropertyID = s.PropertyID WHERE o.PropertyID IS NULL
+            """)
+            log.execute("""
+                INSERT INTO snap_changes
+                SELECT s.PropertyID, 'update' FROM snap s
+                JOIN main.row_hashes o ON o.PropertyID = s.PropertyID
+                WHERE o.row_hash IS NOT s.row_hash OR o.contact_hash IS NOT s.contact_hash
+            """)
+            log.execute("""
+                INSERT INTO snap_changes
+                SELECT o.PropertyID, 'delete' FROM main.row_hashes o
+                LEFT JOIN snap s ON o.PropertyID = s.PropertyID WHERE s.PropertyID IS NULL
+            """)
+        log.execute("DROP TABLE temp.snap_property")
+        log.execute("DROP TABLE temp.snap_contact")
+        log.execute("COMMIT")
+    except Exception:
+        log.execute("ROLLBACK")
+        raise
+
+
+def _publish_snapshot(log: sqlite3.Connection, fingerprint: str, baseline: bool) -> bool:
+    """Record the staged snapshot; runs inside the changelog's write transaction.
+
+    Returns True when a new version was created. A snapshot that changed
+    nothing only replaces the stored fingerprint.
+    """
+    previous = _latest(log)
+    if not baseline and previous is not None:
+        if log.execute("SELECT COUNT(*) FROM temp.snap_changes").fetchone()[0] == 0:
+            log.execute("UPDATE versions SET fingerprint = ? WHERE version = ?", (fingerprint, previous.version))
+            return False
+
+    version = (previous.version if previous else 0) + 1
+    if baseline:
+        # First snapshot is the baseline; there is nothing to diff against
+        log.execute("DELETE FROM row_hashes")
+        log.execute("INSERT INTO row_hashes SELECT PropertyID, row_hash, contact_hash FROM temp.snap")
+        _set_meta(log, "oldest_version", version)
+    else:
+        log.execute("INSERT INTO changes (version, PropertyID, op) SELECT ?, PropertyID, op FROM temp.snap_changes",
+                    (version,))
+        log.execute("""
+            DELETE FROM row_hashes
+            WHERE PropertyID IN (SELECT PropertyID FROM temp.snap_changes WHERE op = 'delete')
+        """)
+        log.execute("""
+            INSERT OR REPLACE INTO row_hashes
+            SELECT s.PropertyID, s.row_hash, s.contact_hash FROM temp.snap s
+            WHERE s.PropertyID IN (SELECT PropertyID FROM temp.snap_changes WHERE op != 'delete')
+        """)
+
+    log.execute("INSERT INTO versions (version, fingerprint, detected_at) VALUES (?, ?, ?)",
+                (version, fingerprint, time.time()))
+
+    # Bound the history; clients older than this have to reload fully
+    oldest = version - config.DATASET_CHANGELOG_RETAIN
+    if oldest > int(_meta(log, "oldest_version", 1)):
+        log.execute("DELETE FROM changes WHERE version <= ?", (oldest,))
+        log.execute("DELETE FROM versions WHERE version < ?", (oldest,))
+        _set_meta(log, "oldest_version", oldest)
+    return True
+
+
+def _alive(pid: int) -> bool:
+    """Whether the worker holding the lease still runs (the changelog is node-local)."""
+    if pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _claim_probe(log: sqlite3.Connection, force: bool) -> Optional[str]:
+    """Take the probe lease if a probe is due and no other worker holds it; return its token."""
+    log.execute("BEGIN IMMEDIATE")
+    try:
+        now = time.time()
+        due = force or now - float(_meta(log, "checked_at", 0)) >= config.DATASET_PROBE_INTERVAL
+        held = float(_meta(log, "probe_lease_until", 0)) > now and _alive(int(_meta(log, "probe_lease_pid", 0)))
+        if not due or held:
+            log.execute("COMMIT")
+            return None
+        token = uuid.uuid4().hex
+        _set_meta(log, "probe_lease", token)
+        _set_meta(log, "probe_lease_pid", os.getpid())
+        _set_meta(log, "probe_lease_until", now + LEASE_SECONDS)
+        log.execute("COMMIT")
+        return token
+    except Exception:
+        log.execute("ROLLBACK")
+        raise
+
+
+def _release_probe(log: sqlite3.Connection, token: str):
+    log.execute("UPDATE meta SET value = 0 WHERE key = 'probe_lease_until' "
+                "AND (SELECT value FROM meta WHERE key = 'probe_lease') = ?", (token,))
+
+
+def refresh(force: bool = False) -> Optional[DatasetVersion]:
+    """Probe the warehouse and record a new version if the data changed.
+
+    Only the worker holding the probe lease probes, at most once per
+    DATASET_PROBE_INTERVAL; the others read the result.
+    """
+    log = _changelog()
+    try:
+        token = _claim_probe(log, force)
+        if token is None:
+            return _latest(log)
+
+        # Temp tables staged below are dropped with the connection
+        changed = False
+        try:
+            fingerprint_before = _latest_fingerprint(log)
+            baseline = fingerprint_before is None
+            conn = get_db_connection()
+            try:
+                cursor = conn.cursor()
+                fingerprint = _fingerprint(cursor)
+                staged = baseline or fingerprint != fingerprint_before
+                if staged:
+                    started = time.perf_counter()
+                    _stage_snapshot(log, cursor, baseline)
+                    logger.info("dataset_version: snapshot_s=%.2f", time.perf_counter() - started)
+                cursor.close()
+            finally:
+                conn.close()
+
+            log.execute("BEGIN IMMEDIATE")
+            try:
+                if _meta(log, "probe_lease") != token:
+                    # Our lease expired and another worker took over; its result wins
+                    log.execute("ROLLBACK")
+                    return _latest(log)
+                if staged:
+                    # The baseline counts too: values cached before it existed may predate it
+                    changed = _publish_snapshot(log, fingerprint, baseline)
+                _set_meta(log, "checked_at", time.time())
+                _set_meta(log, "probe_lease_until", 0)
+                log.execute("COMMIT")
+            except Exception:
+                log.execute("ROLLBACK")
+                raise
+        except Exception:
+            _release_probe(log, token)
+            raise
+
+        latest = _latest(log)
+        if changed:
+            logger.info("dataset_version: new version=%s", latest.version)
+            # Drop cached filter options and counts in every worker at once
+            for namespace in shared_cache.DATA_NAMESPACES:
+                shared_cache.cache.bump(namespace)
+        return latest
+    finally:
+        log.close()
+
+
+# ---------------------------------------------------------------------------
+# Per-process cache
+# ---------------------------------------------------------------------------
+
+_state = {"version": None, "read_at": 0.0, "refreshing": False}
+_state_lock = threading.Lock()
+
+
+def _refresh_in_background():
+    try:
+        latest = refresh()
+        with _state_lock:
+            _state["version"], _state["read_at"] = latest, time.monotonic()
+    except Exception as e:
+        logger.warning("dataset_version: refresh failed: %s", e)
+    finally:
+        with _state_lock:
+            _state["refreshing"] = False
+
+
+def current() -> Optional[DatasetVersion]:
+    """The last known dataset version (None until the first probe has finished).
+
+    Never blocks on the warehouse: when the cached value is older than
+    DATASET_VERSION_TTL a background refresh is started and the cached value
+    is returned meanwhile.
+    """
+    with _state_lock:
+        version = _state["version"]
+        stale = time.monotonic() - _state["read_at"] >= config.DATASET_VERSION_TTL
+        if not stale or _state["refreshing"]:
+            return version
+        _state["refreshing"] = True
+    threading.Thread(target=_refresh_in_background, name="dataset-version", daemon=True).start()
+    return version
+
+
+def changes_since(since: int) -> Dict[str, object]:
+    """Net inserted/updated/deleted PropertyIDs between version `since` and now."""
+    log = _changelog()
+    try:
+        latest = _latest(log)
+        if latest is None:
+            raise VersionGone("No dataset version has been recorded yet")
+        if since > latest.version:
+            raise ValueError(f"Unknown version {since}; the latest version is {latest.version}")
+        if since < int(_meta(log, "oldest_version", 1)):
+            raise VersionGone(f"Version {since} is older than the retained change history")
+
+        first_op: Dict = {}
+        last_op: Dict = {}
+        for property_id, op in log.execute(
+            "SELECT PropertyID, op FROM changes WHERE version > ? ORDER BY version", (since,)
+        ):
+            first_op.setdefault(property_id, op)
+            last_op[property_id] = op
+    finally:
+        log.close()
+
+    inserted: List = []
+    updated: List = []
+    deleted: List = []
+    for property_id, last in last_op.items():
+        first = first_op[property_id]
+        if last == "delete":
+            if first != "insert":
+                deleted.append(property_id)  # inserted and deleted within the window: no-op
+        elif first == "insert":
+            inserted.append(property_id)
+        elif first == "delete":
+            updated.append(property_id)  # deleted then re-inserted
+        else:
+            updated.append(property_id)
+
+    return {"since": since, "version": latest.version, "inserted": inserted, "updated": updated, "deleted": deleted}
+
+
+# ---------------------------------------------------------------------------
+# Conditional requests
+# ---------------------------------------------------------------------------
+
+def make_etag(version: DatasetVersion, scope: str) -> str:
+    """Weak ETag for a representation of `scope` (e.g. path + query) at `version`."""
+    return f'W/"{version.version}-{zlib.crc32(scope.encode()):08x}"'
+
+
+def is_not_modified(headers, etag: str, version: DatasetVersion) -> bool:
+    """Evaluate If-None-Match / If-Modified-Since (RFC 9110 precedence)."""
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        candidates = {tag.strip() for tag in if_none_match.split(",")}
+        # Weak comparison: W/"x" matches "x"
+        normalized = {tag[2:] if tag.startswith("W/") else tag for tag in candidates}
+        return "*" in candidates or etag[2:] in normalized
+
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return version.last_modified <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
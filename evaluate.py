@@ -0,0 +1,371 @@
+# evaluate.py
+"""Consistency evaluation runner for the SQL database agent.
+
+Driven by config.yaml: generates pairs of questions that should get the same
+answer, runs every question through one shared, warm DatabaseAnalysisGraph
+(at most `max_concurrency` at a time), asks a judge model how similar the two
+answers are, and appends each result to `database_log` (JSON Lines) as soon
+as it is done. Pairs scoring at or below `max_similarity` are marked
+inconsistent.
+
+    python evaluate.py                # against Fabric and OpenAI
+    python evaluate.py --offline      # scripted fake LLM + local SQLite fixture
+"""
+import argparse
+import asyncio
+import difflib
+import json
+import os
+import re
+import sqlite3
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import yaml
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.yaml")
+OFFLINE_DB_PATH = "offline_fixture.sqlite"
+
+PAIRS_FORMAT_INSTRUCTIONS = (
+    "\n\nRespond with a JSON array only, where each element is an object with the "
+    'keys "question_1" and "question_2".'
+)
+JUDGE_FORMAT_INSTRUCTIONS = (
+    "\n\nExplain your reasoning briefly, then end your reply with a final line of the "
+    "form 'Score: <1-10>'."
+)
+
+
+# ---------------------------------------------------------------------------
+# Usage tracking
+# ---------------------------------------------------------------------------
+
+class UsageTracker(BaseCallbackHandler):
+    """Counts LLM calls, tool calls and tokens for one agent run."""
+
+    def __init__(self):
+        self.llm_calls = 0
+        self.tool_calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.llm_calls += 1
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.llm_calls += 1
+
+    def on_tool_start(self, serialized, input_str, **kwargs):
+        self.tool_calls += 1
+
+    def on_llm_end(self, response, **kwargs):
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        if usage:
+            self.prompt_tokens += usage.get("prompt_tokens", 0)
+            self.completion_tokens += usage.get("completion_tokens", 0)
+            return
+        # Streaming responses report usage on the message instead
+        for generations in response.generations:
+            for generation in generations:
+                metadata = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if metadata:
+                    self.prompt_tokens += metadata.get("input_tokens", 0)
+                    self.completion_tokens += metadata.get("output_tokens", 0)
+
+    def as_dict(self) -> Dict[str, int]:
+        return {
+            "llm_calls": self.llm_calls,
+            "tool_calls": self.tool_calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+        }
+
+
+# ---------------------------------------------------------------------------
+# Offline mode
+# ---------------------------------------------------------------------------
+
+OFFLINE_QUESTION_PAIRS = [
+    ("How many properties are there in Texas?", "What is the number of properties located in TX?"),
+    ("List the property types in the database.", "Which distinct property types exist?"),
+    ("How many contacts are linked to properties?", "Count the contacts that have a relationship to a property."),
+    ("What is the average cap rate of office properties?", "Give me the mean Cap_Rate for Office buildings."),
+    ("Which city has the most properties?", "Name the city with the highest property count."),
+]
+
+# (keywords, query) tried in order by the scripted model
+OFFLINE_QUERIES = [
+    (("texas", "tx"), "SELECT COUNT(*) AS properties FROM property WHERE State = 'TX'"),
+    (("type",), "SELECT DISTINCT PropertyType FROM property ORDER BY PropertyType"),
+    (("contact",), "SELECT COUNT(DISTINCT contact_id) AS contacts FROM relationship"),
+    (("cap",), "SELECT AVG(Cap_Rate) AS avg_cap_rate FROM property WHERE PropertyType = 'Office'"),
+    (("city",), "SELECT City, COUNT(*) AS properties FROM property GROUP BY City ORDER BY properties DESC LIMIT 1"),
+]
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Deterministic stand-in for ChatOpenAI used by offline runs.
+
+    As the agent it answers every question with one sql_db_query call and then
+    restates the tool result; it also plays question generator and judge.
+    """
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        prompt = "\n".join(str(m.content) for m in messages)
+        last = messages[-1]
+
+        if "generating pairs of similar questions" in prompt:
+            pairs = [{"question_1": a, "question_2": b} for a, b in OFFLINE_QUESTION_PAIRS]
+            message = AIMessage(content=json.dumps(pairs))
+        elif "How similar are these answers" in prompt:
+            answers = re.findall(r"<answer[12]>\s*(.*?)\s*</answer[12]>", prompt, re.DOTALL)
+            ratio = difflib.SequenceMatcher(None, *answers).ratio() if len(answers) == 2 else 0
+            message = AIMessage(content=f"Compared the two answers.\nScore: {max(1, round(ratio * 10))}")
+        elif isinstance(last, ToolMessage):
+            message = AIMessage(content=f"According to the database: {last.content}")
+        else:
+            question = str(last.content).lower()
+            query = next((q for keys, q in OFFLINE_QUERIES if any(k in question for k in keys)),
+                         "SELECT COUNT(*) AS properties FROM property")
+            message = AIMessage(content="", tool_calls=[{
+                "name": "sql_db_query",
+                "args": {"query": query},
+                "id": f"call_{uuid.uuid4().hex[:12]}",
+            }])
+
+        tokens_in = len(prompt) // 4
+        tokens_out = len(str(message.content)) // 4 + 8
+        message.usage_metadata = {
+            "input_tokens": tokens_in,
+            "output_tokens": tokens_out,
+            "total_tokens": tokens_in + tokens_out,
+        }
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def build_offline_database(path: str = OFFLINE_DB_PATH) -> str:
+    """Create a small SQLite fixture with the property/relationship/contact schema."""
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE property (
+            PropertyID TEXT PRIMARY KEY, Property_Name TEXT, Property_Address TEXT,
+            City TEXT, State TEXT, Zip TEXT, County_Name TEXT, PropertyType TEXT,
+            Last_Sale_Price REAL, Cap_Rate REAL, Percent_Leased REAL, Year_Built INTEGER
+        );
+        CREATE TABLE contact (contact_id TEXT PRIMARY KEY, name TEXT, phone TEXT, email TEXT);
+        CREATE TABLE relationship (PropertyID TEXT, contact_id TEXT);
+    """)
+    cities = [("Dallas", "TX", "Dallas"), ("Austin", "TX", "Travis"), ("Tulsa", "OK", "Tulsa"),
+              ("Denver", "CO", "Denver"), ("Dallas", "TX", "Dallas")]
+    types = ["Office", "Industrial", "Retail", "Multi-Family"]
+    properties = []
+    for i in range(40):
+        city, state, county = cities[i % len(cities)]
+        properties.append((
+            f"P{i:04d}", f"Property {i}", f"{100 + i} Main St", city, state, f"7{i % 10:04d}",
+            county, types[i % len(types)], 1_000_000 + i * 25_000, 0.05 + (i % 5) * 0.005,
+            0.6 + (i % 4) * 0.1, 1970 + i,
+        ))
+    conn.executemany("INSERT INTO property VALUES (?,?,?,?,?,?,?,?,?,?,?,?)", properties)
+    conn.executemany("INSERT INTO contact VALUES (?,?,?,?)", [
+        (f"C{i:03d}", f"Contact {i}", f"555-01{i:02d}", f"contact{i}@example.com") for i in range(15)
+    ])
+    conn.executemany("INSERT INTO relationship VALUES (?,?)", [
+        (f"P{i:04d}", f"C{(i * 7 + k) % 15:03d}") for i in range(40) for k in range(i % 3)
+    ])
+    conn.commit()
+    conn.close()
+    return path
+
+
+def _prepare_offline_environment():
+    # config.py insists on Fabric/OpenAI settings even though offline runs never use them
+    for name in ("TENANT_ID", "CLIENT_ID", "CLIENT_SECRET", "FABRIC_SERVER", "FABRIC_DATABASE", "OPENAI_API_KEY"):
+        os.environ.setdefault(name, "offline")
+
+
+def build_graph(offline: bool):
+    """Return (graph, llm factory) for the requested mode."""
+    if offline:
+        _prepare_offline_environment()
+    from workflow import DatabaseAnalysisGraph
+    import call_model
+
+    if not offline:
+        from langchain_openai import ChatOpenAI
+        return call_model.get_graph(), lambda model: ChatOpenAI(model=model, temperature=0)
+
+    from langchain_community.agent_toolkits.sql.toolkit import SQLDatabaseToolkit
+    from langchain_community.utilities.sql_database import SQLDatabase
+    from sqlalchemy import create_engine
+
+    db = SQLDatabase(create_engine(f"sqlite:///{build_offline_database()}"))
+    toolkit = SQLDatabaseToolkit(db=db, llm=ScriptedChatModel())
+    return DatabaseAnalysisGraph(toolkit=toolkit), lambda model: ScriptedChatModel()
+
+
+# ---------------------------------------------------------------------------
+# Evaluation
+# ---------------------------------------------------------------------------
+
+def load_settings(path: str = CONFIG_PATH) -> Dict[str, Any]:
+    with open(path) as f:
+        return yaml.safe_load(f)
+
+
+async def generate_question_pairs(settings: Dict[str, Any], llm, n: int) -> List[Dict[str, str]]:
+    """Ask the question generation model for `n` pairs of equivalent questions."""
+    prompt = settings["configurable"]["question_gen_prompt"].format(
+        chatbot_description=settings["chatbot_description"], n=n
+    )
+    response = await llm.ainvoke([HumanMessage(content=prompt + PAIRS_FORMAT_INSTRUCTIONS)])
+    text = str(response.content)
+    match = re.search(r"\[.*\]", text, re.DOTALL)
+    if not match:
+        raise ValueError(f"Question generator did not return a JSON array: {text[:200]}")
+    pairs = json.loads(match.group(0))
+    return [p for p in pairs if p.get("question_1") and p.get("question_2")][:n]
+
+
+async def judge_answers(settings: Dict[str, Any], llm, pair: Dict[str, str], answers: List[str]) -> Dict[str, Any]:
+    """Score how similar the two answers are (1-10) with the judge model."""
+    prompt = settings["configurable"]["judge_prompt"].format(
+        question_1=pair["question_1"], answer_1=answers[0],
+        question_2=pair["question_2"], answer_2=answers[1],
+    )
+    tracker = UsageTracker()
+    response = await llm.ainvoke(
+        [HumanMessage(content=prompt + JUDGE_FORMAT_INSTRUCTIONS)], config={"callbacks": [tracker]}
+    )
+    text = str(response.content)
+    scores = re.findall(r"Score:\s*(\d+)", text)
+    return {
+        "similarity": int(scores[-1]) if scores else None,
+        "reasoning": text,
+        "usage": tracker.as_dict(),
+    }
+
+
+async def run_question(graph, question: str, semaphore: asyncio.Semaphore) -> Dict[str, Any]:
+    """Run one question through the shared graph, recording latency and LLM usage."""
+    from call_model import acall_model
+
+    tracker = UsageTracker()
+    async with semaphore:
+        started = time.perf_counter()
+        try:
+            answer, error = await acall_model(question, graph=graph, callbacks=[tracker]), None
+        except asyncio.TimeoutError:
+            answer, error = None, "Timed out"
+        except Exception as e:
+            answer, error = None, str(e)
+        latency = time.perf_counter() - started
+
+    return {"question": question, "answer": answer, "error": error,
+            "latency_s": round(latency, 3), **tracker.as_dict()}
+
+
+class ResultLog:
+    """Appends one JSON object per line (JSON Lines) so partial runs are never lost."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = asyncio.Lock()
+
+    async def append(self, record: Dict[str, Any]):
+        line = json.dumps(record, default=str) + "\n"
+        async with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+
+async def evaluate(settings: Dict[str, Any], offline: bool = False, n: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Run the full consistency evaluation and return the per-pair records."""
+    configurable = settings["configurable"]
+    n = n or settings.get("n", 20)
+    graph, make_llm = build_graph(offline)
+    semaphore = asyncio.Semaphore(settings.get("max_concurrency", 5))
+    log = ResultLog(settings.get("database_log", "testing_results.jsonl"))
+    run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+    pairs = await generate_question_pairs(settings, make_llm(configurable["question_gen_model"]), n)
+    judge_llm = make_llm(configurable["judge_model"])
+    # As in langfuzz, max_similarity is the highest score still flagged for review
+    max_similarity = configurable.get("max_similarity")
+
+    async def evaluate_pair(index: int, pair: Dict[str, str]) -> Dict[str, Any]:
+        runs = await asyncio.gather(
+            run_question(graph, pair["question_1"], semaphore),
+            run_question(graph, pair["question_2"], semaphore),
+        )
+        if any(r["error"] for r in runs):
+            verdict = {"similarity": None, "reasoning": None, "usage": None}
+        else:
+            async with semaphore:
+                verdict = await judge_answers(settings, judge_llm, pair, [r["answer"] for r in runs])
+
+        similarity = verdict["similarity"]
+        record = {
+            "run_id": run_id,
+            "index": index,
+            "timestamp": datetime.now().isoformat(),
+            "offline": offline,
+            "question_1": pair["question_1"],
+            "question_2": pair["question_2"],
+            "runs": runs,
+            "similarity": similarity,
+            "consistent": similarity > max_similarity if similarity is not None and max_similarity else None,
+            "judge_reasoning": verdict["reasoning"],
+            "judge_usage": verdict["usage"],
+        }
+        await log.append(record)
+        print(f"[{index + 1}/{len(pairs)}] similarity={similarity} "
+              f"latency={runs[0]['latency_s']}s/{runs[1]['latency_s']}s")
+        return record
+
+    return await asyncio.gather(*(evaluate_pair(i, p) for i, p in enumerate(pairs)))
+
+
+def print_summary(records: List[Dict[str, Any]]):
+    runs = [r for record in records for r in record["runs"]]
+    latencies = sorted(r["latency_s"] for r in runs if not r["error"])
+    scores = [r["similarity"] for r in records if r["similarity"] is not None]
+    print(f"Pairs: {len(records)}  questions: {len(runs)}  errors: {sum(1 for r in runs if r['error'])}")
+    if latencies:
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        print(f"Latency: mean {statistics.mean(latencies):.2f}s  p95 {p95:.2f}s  max {latencies[-1]:.2f}s")
+    print(f"LLM calls: {sum(r['llm_calls'] for r in runs)}  tool calls: {sum(r['tool_calls'] for r in runs)}  "
+          f"tokens: {sum(r['prompt_tokens'] + r['completion_tokens'] for r in runs)}")
+    if scores:
+        print(f"Similarity: mean {statistics.mean(scores):.1f}  min {min(scores)}  "
+              f"inconsistent pairs: {sum(1 for r in records if r['consistent'] is False)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the agent consistency evaluation from config.yaml")
+    parser.add_argument("--offline", action="store_true", help="use a scripted fake LLM and a local SQLite fixture")
+    parser.add_argument("--n", type=int, default=None, help="number of question pairs (defaults to config.yaml)")
+    parser.add_argument("--config", default=CONFIG_PATH)
+    args = parser.parse_args()
+
+    records = asyncio.run(evaluate(load_settings(args.config), offline=args.offline, n=args.n))
+    print_summary(records)
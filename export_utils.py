@@ -1,8 +1,11 @@
 # export_utils.py
+import logging
 import pandas as pd
 from typing import Dict, List
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
 def format_excel_worksheet(df: pd.DataFrame, writer: pd.ExcelWriter) -> None:
     """Format Excel worksheet with proper styling and column widths"""
     worksheet = writer.sheets['Properties']
@@ -150,7 +153,7 @@ def prepare_export_dataframe(data: List[Dict]) -> pd.DataFrame:
                 else:
                     df[col] = pd.to_numeric(df[col], errors='coerce').astype(dtype)
             except Exception as e:
-                print(f"Error converting {col} to {dtype}: {str(e)}")
+                logger.warning("Error converting %s to %s: %s", col, dtype, e)
     
     return df
 
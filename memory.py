@@ -0,0 +1,434 @@
+# memory.py
+"""Conversation memory for the agent graph.
+
+Keeps long CopilotKit sessions bounded: old turns are trimmed to a token
+budget and folded into a running summary, the processed-message dedupe list
+is capped, and idle threads are evicted from the checkpointer. The
+checkpointer itself is pluggable (in-process or local SQLite).
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    RemoveMessage,
+    SystemMessage,
+)
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.memory import MemorySaver
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Tag on internal LLM calls (history summaries) whose tokens are not part of the answer
+INTERNAL_TAG = "memory:internal"
+
+SUMMARY_PROMPT = (
+    "You maintain the running summary of a conversation between a user and a SQL "
+    "analysis agent working on property and contact data. Merge the existing summary "
+    "with the new messages below. Keep questions asked, filters used, key figures and "
+    "conclusions; drop raw query results and tool chatter. Reply with the summary only."
+)
+
+
+# ---------------------------------------------------------------------------
+# Dedupe of processed messages
+# ---------------------------------------------------------------------------
+
+def message_key(message: BaseMessage) -> str:
+    """Short stable hash identifying a message (by id, falling back to content)."""
+    source = message.id or f"{message.type}:{message.content}"
+    return hashlib.sha1(str(source).encode("utf-8")).hexdigest()[:16]
+
+
+def remember(keys: Optional[Sequence[str]], key: str, limit: int = None) -> List[str]:
+    """Return `keys` with `key` appended, keeping only the newest `limit` entries.
+
+    Stored as a plain list so it serializes with any checkpointer.
+    """
+    limit = limit or config.MEMORY_DEDUPE_SIZE
+    keys = [k for k in (keys or []) if k != key]
+    keys.append(key)
+    return keys[-limit:]
+
+
+# ---------------------------------------------------------------------------
+# Token-budget trimming and summarization
+# ---------------------------------------------------------------------------
+
+def approximate_tokens(messages: Sequence[BaseMessage]) -> int:
+    """Cheap token estimate (~4 characters per token) without running a tokenizer."""
+    chars = 0
+    for message in messages:
+        content = message.content
+        chars += len(content) if isinstance(content, str) else len(json.dumps(content, default=str))
+        tool_calls = getattr(message, "tool_calls", None)
+        if tool_calls:
+            chars += len(json.dumps(tool_calls, default=str))
+        chars += 16  # role and framing overhead
+    return chars // 4
+
+
+def split_history(messages: Sequence[BaseMessage], max_tokens: int) -> Tuple[List[BaseMessage], List[BaseMessage]]:
+    """Split history into (dropped, kept) so `kept` fits in `max_tokens`.
+
+    Cuts only at human turn boundaries so a tool call is never separated from
+    its result. The latest turn is always kept even if it exceeds the budget.
+    """
+    boundaries = [i for i, m in enumerate(messages) if isinstance(m, HumanMessage)]
+    if not boundaries:
+        return [], list(messages)
+
+    cut = boundaries[-1]
+    for index in reversed(boundaries):
+        if approximate_tokens(messages[index:]) > max_tokens:
+            break
+        cut = index
+
+    return list(messages[:cut]), list(messages[cut:])
+
+
+def _transcript(messages: Sequence[BaseMessage]) -> str:
+    lines = []
+    for message in messages:
+        if isinstance(message, HumanMessage):
+            role = "User"
+        elif isinstance(message, AIMessage):
+            role = "Assistant"
+        else:
+            continue  # tool output and system prompts are not worth summarizing
+        if isinstance(message.content, str) and message.content.strip():
+            lines.append(f"{role}: {message.content.strip()}")
+    return "\n".join(lines)
+
+
+def _internal_config(config_: Optional[RunnableConfig]) -> RunnableConfig:
+    """`config_` for a bookkeeping LLM call, tagged so the node's stream skips it."""
+    config_ = dict(config_ or {})
+    config_["tags"] = [*(config_.get("tags") or []), INTERNAL_TAG]
+    config_["run_name"] = "summarize_history"
+    return config_
+
+
+async def summarize(llm, summary: str, dropped: Sequence[BaseMessage], config_: Optional[RunnableConfig] = None) -> str:
+    """Fold `dropped` messages into the running `summary` using `llm`.
+
+    `config_` should have message emission turned off (the caller passes the
+    node config through copilotkit_customize_config), so the summary is
+    never streamed to the chat as if it were the answer.
+    """
+    transcript = _transcript(dropped)
+    if not transcript:
+        return summary
+    prompt = f"Existing summary:\n{summary or '(none)'}\n\nNew messages:\n{transcript}"
+    try:
+        result = await llm.ainvoke(
+            [SystemMessage(content=SUMMARY_PROMPT), HumanMessage(content=prompt)], _internal_config(config_)
+        )
+    except Exception as e:
+        # Losing detail is better than failing the user's turn
+        logger.warning("Error summarizing conversation: %s", e)
+        return summary
+    return result.content
+
+
+async def compact_history(
+    state: Dict, llm, config_: Optional[RunnableConfig] = None
+) -> Tuple[List[BaseMessage], Dict, Optional[asyncio.Task]]:
+    """Prepare the agent input for this turn and the state updates that bound memory.
+
+    Returns the messages to send to the agent, a partial state update that
+    removes the dropped messages, and the task computing the refreshed
+    summary (None when nothing was dropped). The agent always gets the
+    previous summary plus the window that fits MEMORY_MAX_TOKENS, so no turn
+    exceeds the budget. The summary runs alongside the agent instead of in
+    front of it, which keeps it off the path to the first answer token. The
+    cost is a deliberate one-turn lag: the turns dropped now reach the agent
+    only through the refreshed summary, from the next turn on.
+    """
+    messages = state.get("messages", [])
+    summary = state.get("summary", "")
+    summarized = state.get("summarized_messages") or []
+
+    # CopilotKit re-sends the full frontend history, so messages that were
+    # already folded into the summary can reappear; drop them again silently.
+    already = set(summarized)
+    stale = [m for m in messages if m.id and message_key(m) in already]
+    messages = [m for m in messages if not (m.id and message_key(m) in already)]
+
+    dropped, kept = split_history(messages, config.MEMORY_MAX_TOKENS)
+
+    update: Dict = {}
+    pending = None
+    if dropped:
+        if config.MEMORY_SUMMARIZE:
+            pending = asyncio.ensure_future(summarize(llm, summary, dropped, config_))
+        for m in dropped:
+            if m.id:
+                summarized = remember(summarized, message_key(m))
+        update["summarized_messages"] = summarized
+
+    removals = [RemoveMessage(id=m.id) for m in stale + dropped if m.id]
+    if removals:
+        update["messages"] = removals
+
+    agent_messages = list(kept)
+    if summary:
+        agent_messages.insert(0, SystemMessage(content=f"Summary of the earlier conversation:\n{summary}"))
+
+    return agent_messages, update, pending
+
+
+# ---------------------------------------------------------------------------
+# Checkpointers
+# ---------------------------------------------------------------------------
+
+class BoundedMemorySaver(MemorySaver):
+    """In-process checkpointer that evicts idle threads (TTL) and caps the thread count (LRU)."""
+
+    def __init__(self, ttl_seconds: int = None, max_threads: int = None, **kwargs):
+        super().__init__(**kwargs)
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else config.THREAD_TTL_SECONDS
+        self.max_threads = max_threads if max_threads is not None else config.MAX_THREADS
+        self._last_seen: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _touch(self, config_):
+        thread_id = config_.get("configurable", {}).get("thread_id")
+        if thread_id is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._last_seen.pop(thread_id, None)
+            self._last_seen[thread_id] = now  # re-insert to keep LRU order
+
+            if self.ttl_seconds:
+                for stale in [t for t, seen in self._last_seen.items() if now - seen > self.ttl_seconds]:
+                    self._drop_thread(stale)
+
+            # Oldest first; the thread being touched is always last
+            while len(self._last_seen) > self.max_threads:
+                self._drop_thread(next(iter(self._last_seen)))
+
+    def _drop_thread(self, thread_id: str):
+        self._last_seen.pop(thread_id, None)
+        self.storage.pop(thread_id, None)
+        for store_name in ("writes", "blobs"):
+            store = getattr(self, store_name, None)
+            if store is None:
+                continue
+            for key in [k for k in store if k[0] == thread_id]:
+                del store[key]
+
+    # The async variants of MemorySaver delegate to these sync methods.
+    def get_tuple(self, config_):
+        self._touch(config_)
+        return super().get_tuple(config_)
+
+    def put(self, config_, checkpoint, metadata, new_versions):
+        self._touch(config_)
+        return super().put(config_, checkpoint, metadata, new_versions)
+
+
+THREAD_ACTIVITY_DDL = (
+    "CREATE TABLE IF NOT EXISTS thread_activity "
+    "(thread_id TEXT PRIMARY KEY, last_seen REAL NOT NULL)"
+)
+TOUCH_SQL = (
+    "INSERT INTO thread_activity (thread_id, last_seen) VALUES (?, ?) "
+    "ON CONFLICT(thread_id) DO UPDATE SET last_seen = excluded.last_seen"
+)
+
+
+class SqliteCheckpointer(BaseCheckpointSaver):
+    """Local SQLite checkpointer shared by all workers on a node.
+
+    The async API wraps langgraph's AsyncSqliteSaver with one connection per
+    event loop, opened lazily inside that loop: the graph is compiled at
+    import time and is run both from the server's loop and from call_model's
+    background loop, and an aiosqlite connection and its lock only work on the
+    loop that created them. The sync API (graph.invoke, graph.get_state) goes
+    through langgraph's SqliteSaver on a plain sqlite3 connection. The
+    database runs in WAL mode so several processes can read and write
+    concurrently, and threads idle for longer than the TTL, or beyond
+    `max_threads`, are deleted.
+    """
+
+    PRUNE_EVERY = 50  # puts between two eviction passes
+
+    def __init__(self, path: str = None, ttl_seconds: int = None, max_threads: int = None):
+        super().__init__()
+        self.path = path or config.CHECKPOINT_DB_PATH
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else config.THREAD_TTL_SECONDS
+        self.max_threads = max_threads if max_threads is not None else config.MAX_THREADS
+        # Event loop -> AsyncSqliteSaver (and its init lock)
+        self._savers: Dict[asyncio.AbstractEventLoop, object] = {}
+        self._init_locks: Dict[asyncio.AbstractEventLoop, asyncio.Lock] = {}
+        self._sync_saver = None
+        self._lock = threading.Lock()
+        self._puts = 0
+
+    async def _get_saver(self):
+        loop = asyncio.get_running_loop()
+        saver = self._savers.get(loop)
+        if saver is not None:
+            return saver
+        with self._lock:
+            for closed in [other for other in self._init_locks if other.is_closed()]:
+                self._init_locks.pop(closed)
+                self._savers.pop(closed, None)
+            init_lock = self._init_locks.setdefault(loop, asyncio.Lock())
+        async with init_lock:
+            saver = self._savers.get(loop)
+            if saver is None:
+                import aiosqlite
+                from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+                conn = aiosqlite.connect(self.path)
+                conn.daemon = True  # a loop can be closed without closing its connection
+                conn = await conn
+                await conn.execute("PRAGMA journal_mode=WAL")
+                await conn.execute("PRAGMA busy_timeout=5000")
+                await conn.execute(THREAD_ACTIVITY_DDL)
+                await conn.commit()
+                saver = AsyncSqliteSaver(conn, serde=self.serde)
+                await saver.setup()
+                self._savers[loop] = saver
+        return saver
+
+    def _get_sync_saver(self):
+        with self._lock:
+            if self._sync_saver is None:
+                from langgraph.checkpoint.sqlite import SqliteSaver
+
+                conn = sqlite3.connect(self.path, check_same_thread=False)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA busy_timeout=5000")
+                conn.execute(THREAD_ACTIVITY_DDL)
+                conn.commit()
+                saver = SqliteSaver(conn, serde=self.serde)
+                saver.setup()
+                self._sync_saver = saver
+        return self._sync_saver
+
+    @staticmethod
+    def _thread_id(config_) -> Optional[str]:
+        thread_id = config_.get("configurable", {}).get("thread_id")
+        return None if thread_id is None else str(thread_id)
+
+    async def _touch(self, saver, config_):
+        thread_id = self._thread_id(config_)
+        if thread_id is None:
+            return
+        async with saver.lock:
+            await saver.conn.execute(TOUCH_SQL, (thread_id, time.time()))
+            await saver.conn.commit()
+
+    def _touch_sync(self, saver, config_):
+        thread_id = self._thread_id(config_)
+        if thread_id is None:
+            return
+        with saver.lock, saver.conn:
+            saver.conn.execute(TOUCH_SQL, (thread_id, time.time()))
+
+    def prune(self) -> int:
+        """Delete threads idle past the TTL and the least recently used beyond `max_threads`."""
+        saver = self._get_sync_saver()
+        with saver.lock, saver.conn as conn:
+            stale = []
+            if self.ttl_seconds:
+                stale += [row[0] for row in conn.execute(
+                    "SELECT thread_id FROM thread_activity WHERE last_seen < ?",
+                    (time.time() - self.ttl_seconds,),
+                )]
+            stale += [row[0] for row in conn.execute(
+                "SELECT thread_id FROM thread_activity ORDER BY last_seen DESC LIMIT -1 OFFSET ?",
+                (self.max_threads,),
+            )]
+
+            for thread_id in set(stale):
+                for table in ("checkpoints", "writes", "thread_activity"):
+                    conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+        return len(set(stale))
+
+    async def aprune(self) -> int:
+        return await asyncio.to_thread(self.prune)
+
+    def _should_prune(self) -> bool:
+        with self._lock:
+            self._puts += 1
+            return self._puts % self.PRUNE_EVERY == 0
+
+    # -- sync API -------------------------------------------------------------
+
+    def get_tuple(self, config_):
+        saver = self._get_sync_saver()
+        self._touch_sync(saver, config_)
+        return saver.get_tuple(config_)
+
+    def list(self, config_, *, filter=None, before=None, limit=None):
+        return self._get_sync_saver().list(config_, filter=filter, before=before, limit=limit)
+
+    def put(self, config_, checkpoint, metadata, new_versions):
+        result = self._get_sync_saver().put(config_, checkpoint, metadata, new_versions)
+        if self._should_prune():
+            try:
+                self.prune()
+            except sqlite3.Error as e:
+                logger.warning("Error pruning checkpoints: %s", e)
+        return result
+
+    def put_writes(self, config_, writes, task_id):
+        return self._get_sync_saver().put_writes(config_, writes, task_id)
+
+    # -- async API ------------------------------------------------------------
+
+    async def aget_tuple(self, config_):
+        saver = await self._get_saver()
+        await self._touch(saver, config_)
+        return await saver.aget_tuple(config_)
+
+    async def alist(self, config_, *, filter=None, before=None, limit=None):
+        saver = await self._get_saver()
+        async for item in saver.alist(config_, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def aput(self, config_, checkpoint, metadata, new_versions):
+        saver = await self._get_saver()
+        result = await saver.aput(config_, checkpoint, metadata, new_versions)
+        if self._should_prune():
+            try:
+                await self.aprune()
+            except sqlite3.Error as e:
+                logger.warning("Error pruning checkpoints: %s", e)
+        return result
+
+    async def aput_writes(self, config_, writes, task_id):
+        saver = await self._get_saver()
+        return await saver.aput_writes(config_, writes, task_id)
+
+    def get_next_version(self, current, channel):
+        # Same version format as the sqlite savers, whichever API writes first
+        from langgraph.checkpoint.sqlite import SqliteSaver
+
+        return SqliteSaver.get_next_version(self, current, channel)
+
+
+def get_checkpointer():
+    """Create the checkpointer selected by CHECKPOINTER_BACKEND (memory | sqlite)."""
+    backend = config.CHECKPOINTER_BACKEND
+    if backend == "memory":
+        return BoundedMemorySaver()
+    if backend == "sqlite":
+        return SqliteCheckpointer()
+    raise ValueError(f"Unknown CHECKPOINTER_BACKEND: {backend}")
@@ -0,0 +1,315 @@
+# metrics.py
+"""Request timing, Prometheus metrics and structured logging.
+
+MetricsMiddleware times every request and, together with the `phase()`
+context manager used in the routes, splits it into connect / execute / fetch
+/ dataframe / serialize / stream phases. Agent runs report LLM calls, tool
+calls, tokens and node latency through AgentMetricsCallback and
+observe_agent_node, and the time to the first streamed answer token through
+observe_agent_ttft. Everything is exposed at /metrics in Prometheus format.
+
+With METRICS_ENABLED=false the middleware is not installed and `phase()`
+returns a shared no-op, so the instrumented code paths cost next to nothing.
+"""
+import contextvars
+import logging
+import os
+import random
+import sys
+import time
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, HTTPException, Response
+from langchain_core.callbacks import BaseCallbackHandler
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+)
+
+import config
+
+logger = logging.getLogger("metrics")
+sql_logger = logging.getLogger("sql")
+
+ENABLED = config.METRICS_ENABLED
+
+PHASE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Total request time", ["method", "route", "status"]
+)
+REQUEST_PHASE = Histogram(
+    "http_request_phase_seconds", "Time spent per request phase", ["route", "phase"], buckets=PHASE_BUCKETS
+)
+ROWS_RETURNED = Counter("http_rows_returned_total", "Database rows returned to clients", ["route"])
+BYTES_SENT = Counter("http_response_bytes_total", "Response body bytes sent", ["route"])
+
+AGENT_LLM_CALLS = Counter("agent_llm_calls_total", "LLM calls made by the agent", ["model"])
+AGENT_TOKENS = Counter("agent_llm_tokens_total", "LLM tokens used by the agent", ["model", "kind"])
+AGENT_TOOL_CALLS = Counter("agent_tool_calls_total", "Tool calls made by the agent", ["tool", "status"])
+AGENT_TOOL_DURATION = Histogram("agent_tool_duration_seconds", "Agent tool latency", ["tool"])
+AGENT_LLM_DURATION = Histogram("agent_llm_duration_seconds", "Agent LLM call latency", ["model"])
+AGENT_NODE_DURATION = Histogram("agent_node_duration_seconds", "Latency per graph node", ["node"])
+AGENT_TTFT = Histogram(
+    "agent_time_to_first_token_seconds", "Time from the start of an agent turn to its first streamed token",
+    buckets=(0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 10, 30, 60),
+)
+
+PREFETCH_LOOKUPS = Counter(
+    "prefetch_lookups_total", "Page requests checked against the prefetch buffer", ["result"]  # hit | inflight | miss
+)
+PREFETCH_PAGES = Counter(
+    "prefetch_pages_total", "Speculatively fetched pages", ["outcome"]  # issued | used | wasted | failed
+)
+SHARED_CACHE_LOOKUPS = Counter(
+    "shared_cache_lookups_total", "Lookups in the node-local shared cache", ["namespace", "result"]  # hit | miss | error
+)
+
+# Per-request accumulators, set by the middleware
+_timings: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar("timings", default=None)
+_rows: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar("rows", default=None)
+
+
+# ---------------------------------------------------------------------------
+# Phases
+# ---------------------------------------------------------------------------
+
+class _Phase:
+    __slots__ = ("name", "timings", "started")
+
+    def __init__(self, name: str, timings: Dict[str, float]):
+        self.name = name
+        self.timings = timings
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.started
+        self.timings[self.name] = self.timings.get(self.name, 0.0) + elapsed
+        return False
+
+
+class _NoPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_PHASE = _NoPhase()
+
+
+def phase(name: str):
+    """Time a block as phase `name` of the current request (no-op outside requests)."""
+    timings = _timings.get()
+    if timings is None:
+        return _NO_PHASE
+    return _Phase(name, timings)
+
+
+def add_rows(count: int):
+    """Count rows returned by the current request."""
+    rows = _rows.get()
+    if rows is not None:
+        rows[0] += count
+
+
+# ---------------------------------------------------------------------------
+# Middleware
+# ---------------------------------------------------------------------------
+
+class MetricsMiddleware:
+    """Pure ASGI middleware, so streamed bodies are timed until the last chunk."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            await self.app(scope, receive, send)
+            return
+
+        timings: Dict[str, float] = {}
+        rows = [0]
+        timings_token = _timings.set(timings)
+        rows_token = _rows.set(rows)
+        state = {"status": 500, "bytes": 0, "stream_started": None}
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                state["stream_started"] = time.perf_counter()
+            elif message["type"] == "http.response.body":
+                state["bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _timings.reset(timings_token)
+            _rows.reset(rows_token)
+            finished = time.perf_counter()
+            if state["stream_started"] is not None:
+                timings["stream"] = finished - state["stream_started"]
+            self._record(scope, state, timings, rows[0], finished - started)
+
+    def _record(self, scope, state, timings, rows, duration):
+        route = getattr(scope.get("route"), "path", None) or "unmatched"
+        REQUEST_DURATION.labels(scope["method"], route, str(state["status"])).observe(duration)
+        for name, seconds in timings.items():
+            REQUEST_PHASE.labels(route, name).observe(seconds)
+        if rows:
+            ROWS_RETURNED.labels(route).inc(rows)
+        BYTES_SENT.labels(route).inc(state["bytes"])
+
+        phases = " ".join(f"{name}_ms={seconds * 1000:.1f}" for name, seconds in timings.items())
+        logger.info(
+            "request method=%s route=%s status=%s duration_ms=%.1f rows=%d bytes=%d %s",
+            scope["method"], route, state["status"], duration * 1000, rows, state["bytes"], phases,
+        )
+
+
+# ---------------------------------------------------------------------------
+# Agent metrics
+# ---------------------------------------------------------------------------
+
+def _model_name(serialized: Optional[Dict[str, Any]], kwargs: Dict[str, Any]) -> str:
+    metadata = kwargs.get("metadata") or {}
+    if metadata.get("ls_model_name"):
+        return metadata["ls_model_name"]
+    params = kwargs.get("invocation_params") or {}
+    return params.get("model") or params.get("model_name") or (serialized or {}).get("name") or "unknown"
+
+
+class AgentMetricsCallback(BaseCallbackHandler):
+    """Feeds agent LLM/tool activity into the Prometheus counters."""
+
+    def __init__(self):
+        self._started: Dict[Any, tuple] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        model = _model_name(serialized, kwargs)
+        AGENT_LLM_CALLS.labels(model).inc()
+        self._started[run_id] = (model, time.perf_counter())
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        model, started = self._started.pop(run_id, ("unknown", None))
+        if started is not None:
+            AGENT_LLM_DURATION.labels(model).observe(time.perf_counter() - started)
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt, completion = usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+        if not usage:
+            for generations in response.generations:
+                for generation in generations:
+                    metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                    prompt += metadata.get("input_tokens", 0)
+                    completion += metadata.get("output_tokens", 0)
+        if prompt:
+            AGENT_TOKENS.labels(model, "prompt").inc(prompt)
+        if completion:
+            AGENT_TOKENS.labels(model, "completion").inc(completion)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._started.pop(run_id, None)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self._started[run_id] = ((serialized or {}).get("name", "unknown"), time.perf_counter())
+
+    def _tool_done(self, run_id, status):
+        tool, started = self._started.pop(run_id, ("unknown", None))
+        AGENT_TOOL_CALLS.labels(tool, status).inc()
+        if started is not None:
+            AGENT_TOOL_DURATION.labels(tool).observe(time.perf_counter() - started)
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._tool_done(run_id, "ok")
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._tool_done(run_id, "error")
+
+
+def agent_callbacks() -> list:
+    """Callbacks to attach to agent runs (empty when metrics are disabled)."""
+    return [AgentMetricsCallback()] if ENABLED else []
+
+
+def observe_agent_node(node: str, seconds: float):
+    if ENABLED:
+        AGENT_NODE_DURATION.labels(node).observe(seconds)
+
+
+def observe_agent_ttft(seconds: float):
+    if ENABLED:
+        AGENT_TTFT.observe(seconds)
+    logger.info("agent first_token_ms=%.1f", seconds * 1000)
+
+
+# ---------------------------------------------------------------------------
+# Logging
+# ---------------------------------------------------------------------------
+
+def configure_logging():
+    """key=value log lines on stdout, replacing the old debug prints."""
+    root = logging.getLogger()
+    if getattr(root, "_configured_by_metrics", False):
+        return
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("ts=%(asctime)s level=%(levelname)s logger=%(name)s %(message)s"))
+    root.addHandler(handler)
+    root.setLevel(config.LOG_LEVEL)
+    root._configured_by_metrics = True
+
+
+def log_sql(label: str, query: str, params=None):
+    """Log a statement for a sample of requests (SQL_LOG_SAMPLE_RATE).
+
+    Parameters are user-supplied filter and search values (addresses, owner
+    names), so only their count and types are logged unless SQL_LOG_PARAMS
+    is set for debugging.
+    """
+    rate = config.SQL_LOG_SAMPLE_RATE
+    if rate <= 0 or (rate < 1 and random.random() >= rate):
+        return
+    if not sql_logger.isEnabledFor(logging.INFO):
+        return
+    params = list(params or [])
+    if config.SQL_LOG_PARAMS:
+        detail = f"sample={params[:5]!r}"
+    else:
+        detail = "types=" + ",".join(type(param).__name__ for param in params[:5])
+    sql_logger.info(
+        "%s sql=%r params=%d %s",
+        label, " ".join(query.split())[:1000], len(params), detail,
+    )
+
+
+# ---------------------------------------------------------------------------
+# Endpoint
+# ---------------------------------------------------------------------------
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    if not ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+
+    registry = REGISTRY
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        # Several uvicorn workers: aggregate the per-process files
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
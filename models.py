@@ -1,19 +1,80 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from datetime import date
+from pydantic import BaseModel, Field, model_validator
+from typing import Optional, List, Literal, Union
+
+
+class NumericRange(BaseModel):
+    """Inclusive range; either bound may be left open."""
+    min: Optional[float] = None
+    max: Optional[float] = None
+
+    @model_validator(mode="after")
+    def check_bounds(self):
+        if self.min is not None and self.max is not None and self.min > self.max:
+            raise ValueError("min must not be greater than max")
+        return self
+
+
+class DateRange(BaseModel):
+    """Inclusive date range; either bound may be left open."""
+    min: Optional[date] = None
+    max: Optional[date] = None
+
+    @model_validator(mode="after")
+    def check_bounds(self):
+        if self.min is not None and self.max is not None and self.min > self.max:
+            raise ValueError("min must not be greater than max")
+        return self
+
 
 class PropertyFilter(BaseModel):
+    # Single values, as sent by the existing grid; merged into the lists below
     state: Optional[str] = None
     city: Optional[str] = None
     county: Optional[str] = None
     zip_codes: Optional[List[str]] = None  # Changed to handle multiple zipcodes
     property_type: Optional[str] = None
-    page: int = 1
-    page_size: int = 10
+
+    # Multi-value filters (any of)
+    states: Optional[List[str]] = None
+    cities: Optional[List[str]] = None
+    counties: Optional[List[str]] = None
+    property_types: Optional[List[str]] = None
+    building_classes: Optional[List[str]] = None
+    secondary_types: Optional[List[str]] = None
+    markets: Optional[List[str]] = None
+    submarkets: Optional[List[str]] = None
+    constr_statuses: Optional[List[str]] = None
+    construction_materials: Optional[List[str]] = None
+    market_segments: Optional[List[str]] = None
+    operation_types: Optional[List[str]] = None
+    flood_risk_areas: Optional[List[str]] = None
+    zonings: Optional[List[str]] = None
+
+    # Ranges
+    last_sale_price: Optional[NumericRange] = None
+    cap_rate: Optional[NumericRange] = None
+    percent_leased: Optional[NumericRange] = None
+    year_built: Optional[NumericRange] = None
+    land_area_ac: Optional[NumericRange] = None
+    land_area_sf: Optional[NumericRange] = None
+    last_sale_date: Optional[DateRange] = None
+
+    page: int = Field(1, ge=1)
+    page_size: int = Field(10, ge=1, le=100)
     sort_by: Optional[str] = None
-    sort_direction: Optional[str] = None
+    sort_direction: Optional[Literal["asc", "desc"]] = None
 
 
 class ExportRequest(BaseModel):
-    format: str
+    format: Literal["csv", "excel"]
     selected_ids: Optional[List[str]] = None
-    filters: Optional[PropertyFilter] = None
\ No newline at end of file
+    filters: Optional[PropertyFilter] = None
+
+
+class PropertyIdsRequest(BaseModel):
+    property_ids: List[Union[int, str]]
+
+
+class ContactIdsRequest(BaseModel):
+    contact_ids: List[Union[int, str]]
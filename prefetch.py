@@ -0,0 +1,156 @@
+# prefetch.py
+"""Speculative next-page prefetch for /api/properties.
+
+Users page through the property grid sequentially, so after page N is
+served for a filter signature, pages N+1..N+PREFETCH_DEPTH are loaded on a
+small thread pool and kept in a bounded buffer. A request for a buffered
+page is answered without touching the warehouse; a request for a page that
+is still being prefetched waits for that query instead of issuing its own.
+
+Keys include the dataset version, so pages from an older version are never
+served; they age out through the TTL. Pages evicted or expired without
+being served are counted as wasted, which together with the hit rate is
+what PREFETCH_DEPTH should be tuned on.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import config
+from metrics import ENABLED, PREFETCH_LOOKUPS, PREFETCH_PAGES
+
+logger = logging.getLogger(__name__)
+
+
+class PageKey(NamedTuple):
+    signature: str  # filters, sort and page size
+    version: int  # dataset version the page was read at
+    page: int
+
+
+class _Entry:
+    __slots__ = ("rows", "total", "stored_at", "used")
+
+    def __init__(self, rows: List[dict], total: int):
+        self.rows = rows
+        self.total = total
+        self.stored_at = time.monotonic()
+        self.used = False
+
+
+def signature(where: str, params: Iterable, order_by: str, page_size: int) -> str:
+    """Stable key for everything that determines a page's content except its number."""
+    payload = json.dumps([where, list(params), order_by, page_size], default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+class PrefetchBuffer:
+    """Bounded LRU of prefetched pages with a TTL and in-flight deduplication."""
+
+    def __init__(self, max_pages: int, ttl: float, workers: int):
+        self.max_pages = max_pages
+        self.ttl = ttl
+        self._entries: "OrderedDict[PageKey, _Entry]" = OrderedDict()
+        self._inflight: Dict[PageKey, Future] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self._counts = dict.fromkeys(("hit", "inflight", "miss", "issued", "used", "wasted", "failed"), 0)
+
+    def _count(self, name: str, metric=None, amount: int = 1):
+        self._counts[name] += amount
+        if ENABLED and metric is not None:
+            metric.labels(name).inc(amount)
+
+    def _drop(self, key: PageKey):
+        entry = self._entries.pop(key)
+        if not entry.used:
+            self._count("wasted", PREFETCH_PAGES)
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.ttl
+        for key in [key for key, entry in self._entries.items() if entry.stored_at < cutoff]:
+            self._drop(key)
+
+    def _store(self, key: PageKey, rows: List[dict], total: int):
+        with self._lock:
+            self._inflight.pop(key, None)
+            self._entries[key] = _Entry(rows, total)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_pages:
+                self._drop(next(iter(self._entries)))
+
+    def _claim(self, key: PageKey):
+        """Mark a buffered page as served; return (rows, total) or None if expired."""
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry.stored_at > self.ttl:
+            return None
+        if not entry.used:
+            entry.used = True
+            self._count("used", PREFETCH_PAGES)
+        self._entries.move_to_end(key)
+        return entry.rows, entry.total
+
+    async def get(self, key: PageKey) -> Optional[Tuple[List[dict], int]]:
+        """(rows, total) for a prefetched page, waiting for it if it is in flight."""
+        with self._lock:
+            found = self._claim(key)
+            future = self._inflight.get(key) if found is None else None
+            self._count("hit" if found else "inflight" if future else "miss", PREFETCH_LOOKUPS)
+        if found is not None or future is None:
+            return found
+        try:
+            await asyncio.wrap_future(future)
+        except Exception:
+            return None
+        with self._lock:
+            return self._claim(key)
+
+    def schedule(self, signature: str, version: int, pages: Iterable[int], total: int,
+                 load: Callable[[int], List[dict]]):
+        """Load `pages` in the background with `load(page)` unless already buffered or in flight."""
+        with self._lock:
+            self._expire()
+            for page in pages:
+                key = PageKey(signature, version, page)
+                if key in self._entries or key in self._inflight:
+                    continue
+                self._inflight[key] = self._executor.submit(self._load, key, total, load)
+                self._count("issued", PREFETCH_PAGES)
+
+    def _load(self, key: PageKey, total: int, load: Callable[[int], List[dict]]):
+        try:
+            self._store(key, load(key.page), total)
+        except Exception as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+                self._count("failed", PREFETCH_PAGES)
+            logger.warning("prefetch of page %d failed: %s", key.page, e)
+            raise
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            counts = dict(self._counts)
+            buffered, inflight = len(self._entries), len(self._inflight)
+        lookups = counts["hit"] + counts["inflight"] + counts["miss"]
+        return {
+            **counts,
+            "buffered": buffered,
+            "in_flight": inflight,
+            "depth": config.PREFETCH_DEPTH,
+            "hit_rate": round((counts["hit"] + counts["inflight"]) / lookups, 4) if lookups else None,
+            "waste_rate": round(counts["wasted"] / counts["issued"], 4) if counts["issued"] else None,
+        }
+
+
+buffer = PrefetchBuffer(config.PREFETCH_MAX_PAGES, config.PREFETCH_TTL_SECONDS, config.PREFETCH_WORKERS)
+
+
+def next_pages(page: int, total_pages: int) -> range:
+    """Pages to prefetch after serving `page` (none when PREFETCH_DEPTH is 0)."""
+    return range(page + 1, min(page + config.PREFETCH_DEPTH, total_pages) + 1)
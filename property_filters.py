@@ -0,0 +1,176 @@
+# property_filters.py
+"""Compile a PropertyFilter into a parameterized WHERE clause.
+
+Every predicate compares a bare column against parameters (`col IN (?, ?)`,
+`col >= ?`, `col < ?`), never a function of the column, so the warehouse can
+use indexes / segment elimination on it. Values are deduplicated and sorted
+so equivalent filters produce identical SQL and parameters, which keeps the
+prefetch and count cache keys stable.
+
+GET endpoints build the same PropertyFilter from the query string with
+`query_filter`: list filters accept repeated or comma-separated values
+(`states=TX,OK`) and ranges use `<name>_min` / `<name>_max`
+(`cap_rate_min=0.05&cap_rate_max=0.07`).
+"""
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from pydantic import ValidationError
+
+from models import PropertyFilter
+
+# Filter field -> column; the single-value field of the old API is merged in
+CATEGORICAL_COLUMNS = {
+    "states": ("p.State", "state"),
+    "cities": ("p.City", "city"),
+    "counties": ("p.County_Name", "county"),
+    "zip_codes": ("p.Zip", None),
+    "property_types": ("p.PropertyType", "property_type"),
+    "building_classes": ("p.Building_Class", None),
+    "secondary_types": ("p.Secondary_Type", None),
+    "markets": ("p.Market_Name", None),
+    "submarkets": ("p.Submarket_Name", None),
+    "constr_statuses": ("p.Constr_Status", None),
+    "construction_materials": ("p.Construction_Material", None),
+    "market_segments": ("p.Market_Segment", None),
+    "operation_types": ("p.Operation_Type", None),
+    "flood_risk_areas": ("p.Flood_Risk_Area", None),
+    "zonings": ("p.Zoning", None),
+}
+
+RANGE_COLUMNS = {
+    "last_sale_price": "p.Last_Sale_Price",
+    "cap_rate": "p.Cap_Rate",
+    "percent_leased": "p.Percent_Leased",
+    "year_built": "p.Year_Built",
+    "land_area_ac": "p.Land_Area__AC_",
+    "land_area_sf": "p.Land_Area__SF_",
+    "last_sale_date": "p.Last_Sale_Date",
+}
+
+# Labels for the export info sheet (the first five match the old export)
+LABELS = {
+    "states": "State",
+    "cities": "City",
+    "counties": "County",
+    "zip_codes": "ZIP Codes",
+    "property_types": "Property Type",
+}
+
+# Columns the grid may sort on: the property columns of PROPERTY_SELECT plus the contact name
+SORT_COLUMNS = {
+    name.lower(): name for name in (
+        "PropertyID", "Property_Address", "Property_Name", "PropertyType", "Building_Class",
+        "Secondary_Type", "Market_Name", "Submarket_Name", "City", "State", "Zip", "County_Name",
+        "Last_Sale_Date", "Last_Sale_Price", "Percent_Leased", "Year_Built", "Anchor_Tenants",
+        "Architect_Name", "Avg_Asking/SF", "Avg_Effective/SF", "Building_Operating_Expenses",
+        "Cap_Rate", "Ceiling_Ht", "Constr_Status", "Construction_Material", "Developer_Name",
+        "Flood_Risk_Area", "Land_Area__AC_", "Land_Area__SF_", "Latitude", "Longitude",
+        "Market_Segment", "Max_Building_Contiguous_Space", "Number_Of_Stories", "Operation_Type",
+        "Property_Location", "Taxes_Total", "Total_Buildings", "Zoning",
+    )
+}
+
+# Keeps every statement well below SQL Server's ~2100 parameter limit
+MAX_VALUES = 500
+
+
+def _values(spec: PropertyFilter, field: str, single: Optional[str]) -> List[str]:
+    values = list(getattr(spec, field) or [])
+    if single and getattr(spec, single):
+        values.append(getattr(spec, single))
+    return sorted({v.strip() for v in values if v and v.strip()})
+
+
+def compile_filter(spec: PropertyFilter) -> Tuple[str, list]:
+    """WHERE clause (" WHERE 1=1 AND ...") and parameters for `spec`.
+
+    Raises ValueError for filters the warehouse should not be asked to run.
+    """
+    where = " WHERE 1=1"
+    params: list = []
+
+    for field, (column, single) in CATEGORICAL_COLUMNS.items():
+        values = _values(spec, field, single)
+        if not values:
+            continue
+        if len(values) > MAX_VALUES:
+            raise ValueError(f"At most {MAX_VALUES} values are allowed for {field}")
+        if len(values) == 1:
+            where += f" AND {column} = ?"
+        else:
+            where += f" AND {column} IN ({','.join('?' * len(values))})"
+        params.extend(values)
+
+    for field, column in RANGE_COLUMNS.items():
+        bounds = getattr(spec, field)
+        if bounds is None:
+            continue
+        if bounds.min is not None:
+            where += f" AND {column} >= ?"
+            params.append(bounds.min.isoformat() if field == "last_sale_date" else bounds.min)
+        if bounds.max is not None:
+            if field == "last_sale_date":
+                # Half-open upper bound includes the whole day for datetime columns too
+                where += f" AND {column} < ?"
+                params.append((bounds.max + timedelta(days=1)).isoformat())
+            else:
+                where += f" AND {column} <= ?"
+                params.append(bounds.max)
+
+    return where, params
+
+
+def compile_sort(sort_by: Optional[str], sort_direction: Optional[str]) -> str:
+    """ORDER BY for a whitelisted column (accepts "Cap_Rate", "p.Cap_Rate" or "[Cap_Rate]")."""
+    if not sort_by:
+        return " ORDER BY p.PropertyID"
+    name = sort_by.strip()
+    if name.lower().startswith("p."):
+        name = name[2:]
+    name = name.strip("[]").lower()
+    direction = "DESC" if (sort_direction or "").lower() == "desc" else "ASC"
+    if name == "contact_name":
+        return f" ORDER BY c.name {direction}, p.PropertyID"
+    if name not in SORT_COLUMNS:
+        raise ValueError(f"Cannot sort by {sort_by!r}")
+    # PropertyID as a tie-breaker keeps OFFSET paging stable
+    return f" ORDER BY p.[{SORT_COLUMNS[name]}] {direction}, p.PropertyID"
+
+
+def describe_filter(spec: PropertyFilter) -> Dict[str, str]:
+    """Human-readable summary of `spec` for the export info sheet."""
+    described = {}
+    for field, (_, single) in CATEGORICAL_COLUMNS.items():
+        values = _values(spec, field, single)
+        if values:
+            described[LABELS.get(field, field.replace("_", " ").title())] = ", ".join(values)
+    for field in RANGE_COLUMNS:
+        bounds = getattr(spec, field)
+        if bounds is not None and (bounds.min is not None or bounds.max is not None):
+            low = "" if bounds.min is None else str(bounds.min)
+            high = "" if bounds.max is None else str(bounds.max)
+            described[field.replace("_", " ").title()] = f"{low} - {high}".strip()
+    return described
+
+
+def query_filter(request: Request) -> PropertyFilter:
+    """FastAPI dependency: the PropertyFilter described by the query string."""
+    query = request.query_params
+    data: dict = {}
+    for single in ("state", "city", "county", "property_type"):
+        if query.get(single):
+            data[single] = query[single]
+    for field in CATEGORICAL_COLUMNS:
+        values = [v for raw in query.getlist(field) for v in raw.split(",")]
+        if values:
+            data[field] = values
+    for field in RANGE_COLUMNS:
+        bounds = {bound: query[f"{field}_{bound}"] for bound in ("min", "max") if query.get(f"{field}_{bound}")}
+        if bounds:
+            data[field] = bounds
+    try:
+        return PropertyFilter(**data)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
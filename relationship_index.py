@@ -0,0 +1,367 @@
+# relationship_index.py
+"""In-memory index of the property <-> contact relationship graph.
+
+`relationship` is loaded into compact CSR adjacency arrays:
+
+    property_ids[i]                      sorted PropertyIDs that have contacts
+    property_contacts[property_indptr[i]:property_indptr[i + 1]]
+                                         positions of their contacts in the store
+    contact_ids[j]                       sorted contact_ids (the contact store)
+    contact_properties[contact_indptr[j]:contact_indptr[j + 1]]
+                                         positions of contact j's properties
+
+IDs keep the warehouse's own type: int64 when every key is an integer,
+otherwise fixed-width text. Requested IDs are converted to that type before
+the search, and ones that cannot be (text against integer keys) are not found.
+
+Contact records live column-wise in the same store: one UTF-8 buffer plus
+an offsets array per text column. A lookup is a binary search plus a slice,
+so resolving thousands of IDs takes milliseconds and no warehouse query.
+
+The arrays are written once per node and dataset version as .npy files
+(next to the shared cache) and memory-mapped by every worker, so the node
+builds the index once and the pages are shared between processes. The
+directory is keyed by the version and the dataset fingerprint, since
+versions restart at 1 when the changelog is reset or moved. When
+dataset_version reports a new version the index is rebuilt in the
+background and swapped in with a single reference assignment.
+"""
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, Iterable, List, Optional, Union
+
+import numpy as np
+
+import config
+import dataset_version
+from database import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+FETCH_BATCH = 100_000
+CONTACT_COLUMNS = ("name", "phone", "email")
+ARRAYS = (
+    "property_ids", "property_indptr", "property_contacts",
+    "contact_ids", "contact_indptr", "contact_properties",
+) + tuple(f"{column}_{part}" for column in CONTACT_COLUMNS for part in ("data", "offsets", "null"))
+
+
+Id = Union[int, str]
+
+
+def _keys(values: list) -> np.ndarray:
+    """IDs as an int64 array when they are all integers, otherwise as text."""
+    if not values:
+        return np.zeros(0, dtype=np.int64)
+    keys = np.array(values)  # mixed ints and text come out as text
+    if keys.dtype.kind == "i":
+        return keys.astype(np.int64)
+    if keys.dtype.kind == "U":
+        return keys
+    return np.array([str(value) for value in values], dtype=str)
+
+
+def _concat(chunks: List[np.ndarray]) -> np.ndarray:
+    if len({chunk.dtype.kind for chunk in chunks}) > 1:
+        chunks = [chunk.astype(str) for chunk in chunks]
+    return np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int64)
+
+
+def _as_keys(ids, dtype: np.dtype):
+    """`ids` converted to the index's key type, plus a mask of those that converted."""
+    ids = ids if isinstance(ids, np.ndarray) else _keys(list(ids))
+    valid = np.ones(len(ids), dtype=bool)
+    if dtype.kind != "i":
+        return (ids if ids.dtype.kind == "U" else ids.astype(str)), valid
+    if ids.dtype.kind == "i":
+        return ids, valid
+    try:
+        return ids.astype(np.int64), valid
+    except (ValueError, OverflowError):
+        keys = np.zeros(len(ids), dtype=np.int64)
+        for n, value in enumerate(ids.tolist()):
+            try:
+                keys[n] = int(value)
+            except (ValueError, OverflowError):
+                valid[n] = False
+        return keys, valid
+
+
+def _find(sorted_ids: np.ndarray, ids):
+    """Positions of `ids` in `sorted_ids` and a mask of which were found."""
+    keys, valid = _as_keys(ids, sorted_ids.dtype)
+    positions = np.searchsorted(sorted_ids, keys)
+    clipped = np.minimum(positions, max(len(sorted_ids) - 1, 0))
+    if not len(sorted_ids):
+        return clipped, np.zeros(len(keys), dtype=bool)
+    return clipped, valid & (positions < len(sorted_ids)) & (sorted_ids[clipped] == keys)
+
+
+class RelationshipIndex:
+    def __init__(self, arrays: Dict[str, np.ndarray], version: int, key: str = ""):
+        self.arrays = arrays
+        self.version = version
+        self.key = key
+        for name, array in arrays.items():
+            setattr(self, name, array)
+        # Text is sliced straight out of the mapped buffers
+        self._text = {column: memoryview(arrays[f"{column}_data"]) for column in CONTACT_COLUMNS}
+
+    @classmethod
+    def load(cls, path: str, version: int, key: str = "") -> "RelationshipIndex":
+        return cls({name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in ARRAYS}, version, key)
+
+    def _records(self, positions: np.ndarray) -> List[dict]:
+        """Contact records for store positions, decoded column by column."""
+        columns = [self.contact_ids[positions].tolist()]
+        for column in CONTACT_COLUMNS:
+            offsets, text = self.arrays[f"{column}_offsets"], self._text[column]
+            columns.append([
+                None if null else str(text[start:end], "utf-8")
+                for start, end, null in zip(
+                    offsets[positions].tolist(), offsets[positions + 1].tolist(),
+                    self.arrays[f"{column}_null"][positions].tolist(),
+                )
+            ])
+        return [dict(zip(("contact_id",) + CONTACT_COLUMNS, values)) for values in zip(*columns)]
+
+    @staticmethod
+    def _neighbours(indptr: np.ndarray, targets: np.ndarray, positions: np.ndarray):
+        """All CSR rows for `positions` as one flat array plus the length of each row."""
+        starts = indptr[positions]
+        counts = indptr[positions + 1] - starts
+        flat = np.repeat(starts - (np.cumsum(counts) - counts), counts) + np.arange(int(counts.sum()))
+        return targets[flat], counts.tolist()
+
+    def contacts_for(self, property_ids: Iterable[Id]) -> Dict[Id, List[dict]]:
+        """Contacts of each property (empty for unknown properties or ones without contacts)."""
+        ids = list(property_ids)
+        positions, found = _find(self.property_ids, ids)
+        contacts, counts = self._neighbours(self.property_indptr, self.property_contacts, positions[found])
+        # Contacts shared by several properties are decoded once
+        unique, inverse = np.unique(contacts, return_inverse=True)
+        records, inverse = self._records(unique), inverse.tolist()
+
+        result = {property_id: [] for property_id in ids}
+        offset = 0
+        for property_id, count in zip((ids[i] for i in np.flatnonzero(found)), counts):
+            result[property_id] = [records[i] for i in inverse[offset:offset + count]]
+            offset += count
+        return result
+
+    def properties_for(self, contact_ids: Iterable[Id]) -> Dict[Id, List[Id]]:
+        """PropertyIDs of each contact (empty for unknown contacts)."""
+        ids = list(contact_ids)
+        positions, found = _find(self.contact_ids, ids)
+        properties, counts = self._neighbours(self.contact_indptr, self.contact_properties, positions[found])
+        properties = self.property_ids[properties].tolist()
+
+        result = {contact_id: [] for contact_id in ids}
+        offset = 0
+        for contact_id, count in zip((ids[i] for i in np.flatnonzero(found)), counts):
+            result[contact_id] = properties[offset:offset + count]
+            offset += count
+        return result
+
+    def contacts(self, contact_ids: Iterable[Id]) -> Dict[Id, Optional[dict]]:
+        """Contact records by id (None for unknown ids)."""
+        ids = list(contact_ids)
+        positions, found = _find(self.contact_ids, ids)
+        result = dict.fromkeys(ids)
+        result.update(zip((ids[i] for i in np.flatnonzero(found)), self._records(positions[found])))
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "properties": int(len(self.property_ids)),
+            "contacts": int(len(self.contact_ids)),
+            "relationships": int(len(self.property_contacts)),
+            "bytes": int(sum(array.nbytes for array in self.arrays.values())),
+        }
+
+
+# ---------------------------------------------------------------------------
+# Building
+# ---------------------------------------------------------------------------
+
+def _encode(values: List[Optional[str]]):
+    """One batch of a text column as (UTF-8 bytes, byte lengths, null mask)."""
+    encoded = [value.encode() if value is not None else b"" for value in values]
+    return (
+        np.frombuffer(b"".join(encoded), dtype=np.uint8),
+        np.fromiter((len(value) for value in encoded), dtype=np.int64, count=len(encoded)),
+        np.array([value is None for value in values], dtype=bool),
+    )
+
+
+def _text_column(batches: list, order: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+    """Join encoded batches into data/offsets/null arrays, rows permuted by `order` if given."""
+    data = np.concatenate([batch[0] for batch in batches]) if batches else np.zeros(0, dtype=np.uint8)
+    lengths = np.concatenate([batch[1] for batch in batches]) if batches else np.zeros(0, dtype=np.int64)
+    null = np.concatenate([batch[2] for batch in batches]) if batches else np.zeros(0, dtype=bool)
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    if order is not None:
+        buffer = data.tobytes()
+        data = np.frombuffer(b"".join(
+            buffer[start:end] for start, end in zip(offsets[:-1][order].tolist(), offsets[1:][order].tolist())
+        ), dtype=np.uint8)
+        lengths, null = lengths[order], null[order]
+        np.cumsum(lengths, out=offsets[1:])
+    return {"data": data, "offsets": offsets, "null": null}
+
+
+def build(path: str):
+    """Read relationship and contact from the warehouse and write the arrays to `path`.
+
+    Rows are streamed in FETCH_BATCH batches straight into numpy chunks, so
+    no Python object per row outlives its batch.
+    """
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        # Usually already in index order; a text collation that sorts differently is fixed up below
+        cursor.execute("SELECT contact_id, name, phone, email FROM [dbo].[contact] ORDER BY contact_id")
+        id_chunks, text_batches = [], {column: [] for column in CONTACT_COLUMNS}
+        while True:
+            batch = cursor.fetchmany(FETCH_BATCH)
+            if not batch:
+                break
+            id_chunks.append(_keys([row[0] for row in batch]))
+            for index, column in enumerate(CONTACT_COLUMNS, start=1):
+                text_batches[column].append(_encode([row[index] for row in batch]))
+
+        cursor.execute("SELECT PropertyID, contact_id FROM [dbo].[relationship]")
+        property_chunks, contact_chunks = [], []
+        while True:
+            batch = cursor.fetchmany(FETCH_BATCH)
+            if not batch:
+                break
+            property_chunks.append(_keys([row[0] for row in batch]))
+            contact_chunks.append(_keys([row[1] for row in batch]))
+        cursor.close()
+    finally:
+        conn.close()
+
+    contact_ids = _concat(id_chunks)
+    order = None
+    if len(contact_ids) and not np.all(contact_ids[1:] >= contact_ids[:-1]):
+        order = np.argsort(contact_ids, kind="stable")
+        contact_ids = contact_ids[order]
+    arrays = {"contact_ids": contact_ids}
+    for column in CONTACT_COLUMNS:
+        for part, array in _text_column(text_batches.pop(column), order).items():
+            arrays[f"{column}_{part}"] = array
+
+    # Links to contacts missing from the contact table are dropped, as the LEFT JOIN would
+    positions, found = _find(arrays["contact_ids"], _concat(contact_chunks))
+    property_ids, property_positions = np.unique(_concat(property_chunks)[found], return_inverse=True)
+    pairs = np.unique(
+        np.stack([property_positions.astype(np.int64), positions[found].astype(np.int64)], axis=1), axis=0
+    ).reshape(-1, 2)  # sorted by property
+
+    per_property = np.bincount(pairs[:, 0], minlength=len(property_ids))
+    arrays["property_ids"] = property_ids
+    arrays["property_indptr"] = np.concatenate([[0], np.cumsum(per_property)]).astype(np.int64)
+    arrays["property_contacts"] = pairs[:, 1].astype(np.int32)
+
+    by_contact = pairs[np.lexsort((pairs[:, 0], pairs[:, 1]))]
+    per_contact = np.bincount(by_contact[:, 1], minlength=len(arrays["contact_ids"]))
+    arrays["contact_indptr"] = np.concatenate([[0], np.cumsum(per_contact)]).astype(np.int64)
+    arrays["contact_properties"] = by_contact[:, 0].astype(np.int32)
+
+    os.makedirs(path, exist_ok=True)
+    for name in ARRAYS:
+        np.save(os.path.join(path, f"{name}.npy"), arrays[name])
+
+
+def index_key(version: dataset_version.DatasetVersion) -> str:
+    """Directory name for the index of `version`'s data."""
+    return f"v{version.version}-{zlib.crc32(version.fingerprint.encode()):08x}"
+
+
+def ensure_built(key: str) -> str:
+    """Directory holding the arrays for `key`, building them if no worker has yet."""
+    root = config.RELATIONSHIP_INDEX_DIR
+    path = os.path.join(root, key)
+    if os.path.isdir(path):
+        return path
+
+    os.makedirs(root, exist_ok=True)
+    # A SQLite write lock doubles as a portable cross-process mutex: one worker builds, the others wait
+    lock = sqlite3.connect(os.path.join(root, "build.lock"), timeout=3600, isolation_level=None)
+    try:
+        lock.execute("BEGIN IMMEDIATE")
+        if not os.path.isdir(path):
+            started = time.perf_counter()
+            staging = f"{path}.tmp{os.getpid()}"
+            shutil.rmtree(staging, ignore_errors=True)
+            build(staging)
+            os.rename(staging, path)
+            logger.info("relationship_index: built %s in %.2fs", key, time.perf_counter() - started)
+            _remove_old_versions(root, keep=2)
+        lock.execute("COMMIT")
+    finally:
+        lock.close()
+    return path
+
+
+def _remove_old_versions(root: str, keep: int):
+    built = sorted(
+        (entry for entry in os.scandir(root)
+         if entry.is_dir() and entry.name.startswith("v") and ".tmp" not in entry.name),
+        key=lambda entry: entry.stat().st_mtime, reverse=True,
+    )
+    for entry in built[keep:]:
+        # Workers still mapping an old version keep their pages until they swap
+        shutil.rmtree(entry.path, ignore_errors=True)
+
+
+# ---------------------------------------------------------------------------
+# Current index
+# ---------------------------------------------------------------------------
+
+RETRY_SECONDS = 60
+
+_state = {"index": None, "loading": False, "failed_at": 0.0}
+_state_lock = threading.Lock()
+
+
+def _load_in_background(version: dataset_version.DatasetVersion):
+    key = index_key(version)
+    try:
+        index = RelationshipIndex.load(ensure_built(key), version.version, key)
+        _state["index"] = index  # atomic swap; readers keep whatever reference they already hold
+        logger.info("relationship_index: loaded %s", index.stats())
+    except Exception as e:
+        _state["failed_at"] = time.monotonic()
+        logger.warning("relationship_index: load of %s failed: %s", key, e)
+    finally:
+        with _state_lock:
+            _state["loading"] = False
+
+
+def current() -> Optional[RelationshipIndex]:
+    """The loaded index (None until the first load has finished).
+
+    Starts a background (re)load when the dataset version has moved on, and
+    keeps serving the previous index until the new one is ready.
+    """
+    index = _state["index"]
+    version = dataset_version.current()
+    if version is None or (index is not None and index.key == index_key(version)):
+        return index
+    with _state_lock:
+        if _state["loading"] or time.monotonic() - _state["failed_at"] < RETRY_SECONDS:
+            return index
+        _state["loading"] = True
+    threading.Thread(
+        target=_load_in_background, args=(version,), name="relationship-index", daemon=True
+    ).start()
+    return index
@@ -1,214 +1,428 @@
-from fastapi import APIRouter, Query, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, Query, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from typing import Optional, List
-from models import PropertyFilter, ExportRequest
+from models import PropertyFilter, ExportRequest, PropertyIdsRequest, ContactIdsRequest
 from database import get_db_connection
 from export_utils import format_excel_worksheet, prepare_export_dataframe
 import json
 from datetime import datetime
+from functools import partial
 from io import BytesIO
 import pandas as pd
 from models import PropertyFilter, ExportRequest
 from export_utils import format_excel_worksheet, prepare_export_dataframe, add_export_info_sheet
+from metrics import add_rows, log_sql, phase
+from property_filters import compile_filter, compile_sort, describe_filter, query_filter
+import config
+import dataset_version
+import prefetch
+import relationship_index
+import shared_cache
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api")
 
+
+# Property rows as returned by /properties and /properties/changes (one row per contact)
+PROPERTY_SELECT = """
+    SELECT
+        p.PropertyID,
+        p.Property_Address,
+        p.Property_Name,
+        p.PropertyType,
+        p.Building_Class,
+        p.Secondary_Type,
+        p.Market_Name,
+        p.Submarket_Name,
+        p.City,
+        p.State,
+        p.Zip,
+        p.County_Name,
+        p.Last_Sale_Date,
+        p.Last_Sale_Price,
+        p.Percent_Leased,
+        p.Year_Built,
+        p.Anchor_Tenants,
+        p.Architect_Name,
+        p.[Avg_Asking/SF],
+        p.[Avg_Effective/SF],
+        p.Building_Operating_Expenses,
+        p.Cap_Rate,
+        p.Ceiling_Ht,
+        p.Constr_Status,
+        p.Construction_Material,
+        p.Developer_Name,
+        p.Flood_Risk_Area,
+        p.Land_Area__AC_,
+        p.Land_Area__SF_,
+        p.Latitude,
+        p.Longitude,
+        p.Market_Segment,
+        p.Max_Building_Contiguous_Space,
+        p.Number_Of_Stories,
+        p.Operation_Type,
+        p.Property_Location,
+        p.Taxes_Total,
+        p.Total_Buildings,
+        p.Zoning,
+        c.name as contact_name,
+        c.phone,
+        c.email
+    FROM [dbo].[property] p
+    LEFT JOIN [dbo].[relationship] r ON p.PropertyID = r.PropertyID
+    LEFT JOIN [dbo].[contact] c ON r.contact_id = c.contact_id
+"""
+
+# SQL Server allows ~2100 parameters per statement
+MAX_IN_PARAMS = 1000
+
+
+def json_response(payload, headers: Optional[dict] = None) -> JSONResponse:
+    """Serialize inside the request so the time shows up as the serialize phase."""
+    with phase("serialize"):
+        return JSONResponse(jsonable_encoder(payload), headers=headers)
+
+
+def conditional_headers(request: Request):
+    """Validators for the current dataset version.
+
+    Returns (headers, not_modified). Headers are empty until the first
+    version probe has finished, in which case the request is served normally.
+    """
+    version = dataset_version.current()
+    if version is None:
+        return {}, False
+    etag = dataset_version.make_etag(version, f"{request.url.path}?{request.url.query}")
+    headers = {"ETag": etag, "Last-Modified": version.http_date, "Cache-Control": "no-cache"}
+    return headers, dataset_version.is_not_modified(request.headers, etag, version)
+
+
+def compile_query(spec: PropertyFilter, sort_by: Optional[str], sort_direction: Optional[str]):
+    """(where, params, order_by) for a filter spec; invalid filters or sorts are a 400."""
+    try:
+        where, params = compile_filter(spec)
+        return where, params, compile_sort(sort_by, sort_direction)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def fetch_property_rows(cursor, where: str, params: list, order_by: str, offset: int, limit: int) -> List[dict]:
+    query = PROPERTY_SELECT + where + order_by + f" OFFSET {offset} ROWS FETCH NEXT {limit} ROWS ONLY"
+    log_sql("properties", query, params)
+
+    with phase("execute"):
+        cursor.execute(query, params)
+    with phase("fetch"):
+        columns = [column[0] for column in cursor.description]
+        results = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    add_rows(len(results))
+    return results
+
+
+def count_properties(cursor, where: str, params: list) -> int:
+    """Distinct properties matching the filters; shared by all workers until the data changes."""
+    def count() -> bytes:
+        with phase("execute"):
+            cursor.execute("SELECT COUNT(DISTINCT p.PropertyID) FROM [dbo].[property] p" + where, params)
+        with phase("fetch"):
+            return str(cursor.fetchone()[0]).encode()
+
+    key = json.dumps([where, params], default=str)
+    return int(bytes(shared_cache.cache.get_or_set("counts", key, count, ttl=config.SHARED_CACHE_DATA_TTL_SECONDS)))
+
+
+def load_property_page(where: str, params: list, order_by: str, page_size: int, page: int) -> List[dict]:
+    """One page on its own connection; used by the prefetch workers."""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        try:
+            return fetch_property_rows(cursor, where, params, order_by, (page - 1) * page_size, page_size)
+        finally:
+            cursor.close()
+    finally:
+        conn.close()
+
+
+def parse_page_ranges(pages: str) -> List[int]:
+    """ "1-3,7" -> [1, 2, 3, 7] """
+    result = set()
+    for part in pages.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        first, _, last = part.partition('-')
+        try:
+            first, last = int(first), int(last or first)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid page range: {part!r}")
+        if first < 1 or last < first:
+            raise HTTPException(status_code=400, detail=f"Invalid page range: {part!r}")
+        if last - first >= config.BATCH_MAX_PAGES:
+            raise HTTPException(status_code=400, detail=f"At most {config.BATCH_MAX_PAGES} pages per request")
+        result.update(range(first, last + 1))
+    if not result:
+        raise HTTPException(status_code=400, detail="No pages requested")
+    if len(result) > config.BATCH_MAX_PAGES:
+        raise HTTPException(status_code=400, detail=f"At most {config.BATCH_MAX_PAGES} pages per request")
+    return sorted(result)
+
+
+async def property_page(spec: PropertyFilter, page: int, page_size: int, sort_by: Optional[str],
+                        sort_direction: Optional[str], headers: Optional[dict] = None) -> JSONResponse:
+    where, params, order_by = compile_query(spec, sort_by, sort_direction)
+    version = dataset_version.current()
+    version = version.version if version else 0
+    page_signature = prefetch.signature(where, params, order_by, page_size)
+
+    try:
+        cached = await prefetch.buffer.get(prefetch.PageKey(page_signature, version, page))
+        if cached is not None:
+            results, total_count = cached
+            add_rows(len(results))
+        else:
+            with phase("connect"):
+                conn = get_db_connection()
+            cursor = conn.cursor()
+            results = fetch_property_rows(cursor, where, params, order_by, (page - 1) * page_size, page_size)
+            # Get total count for pagination
+            total_count = count_properties(cursor, where, params)
+
+        total_pages = (total_count + page_size - 1) // page_size
+        prefetch.buffer.schedule(
+            page_signature, version, prefetch.next_pages(page, total_pages), total_count,
+            partial(load_property_page, where, params, order_by, page_size),
+        )
+
+        return json_response({
+            "data": results,
+            "total": total_count,
+            "page": page,
+            "page_size": page_size,
+            "total_pages": total_pages
+        }, headers)
+        
+    except Exception as e:
+        logger.error("Error executing query: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'conn' in locals():
+            conn.close()
+
+
 @router.get("/properties")
 async def get_properties(
-    state: Optional[str] = None,
-    city: Optional[str] = None,
-    county: Optional[str] = None,
-    zip_codes: Optional[str] = None,
-    property_type: Optional[str] = None,
+    request: Request,
+    spec: PropertyFilter = Depends(query_filter),
     page: int = Query(1, ge=1),
     page_size: int = Query(10, ge=1, le=100),
     sort_by: Optional[str] = None,
     sort_direction: Optional[str] = Query(None, regex="^(asc|desc)$")
 ):
+    """One page of properties.
+
+    Filters come from the query string (see property_filters.query_filter):
+    state, city, county, zip_codes and property_type as before, any list
+    filter of PropertyFilter (`property_types=Office,Industrial`) and ranges
+    (`cap_rate_min=0.05&cap_rate_max=0.07`).
+    """
+    headers, not_modified = conditional_headers(request)
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+    return await property_page(spec, page, page_size, sort_by, sort_direction, headers)
+
+
+@router.post("/properties/search")
+async def search_properties(spec: PropertyFilter):
+    """Same as GET /properties with the filter spec (including paging) as a JSON body."""
+    return await property_page(spec, spec.page, spec.page_size, spec.sort_by, spec.sort_direction)
+
+
+@router.get("/properties/batch")
+async def get_property_pages(
+    request: Request,
+    pages: str = Query(..., description="Pages and ranges, e.g. 1-3,7"),
+    spec: PropertyFilter = Depends(query_filter),
+    page_size: int = Query(10, ge=1, le=100),
+    sort_by: Optional[str] = None,
+    sort_direction: Optional[str] = Query(None, regex="^(asc|desc)$")
+):
+    """Several pages in one request for virtualized grids.
+
+    Each run of consecutive pages is read with a single OFFSET/FETCH query
+    and sliced, so 1-5 costs one round trip instead of five.
+    """
+    headers, not_modified = conditional_headers(request)
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+
+    page_numbers = parse_page_ranges(pages)
+    where, params, order_by = compile_query(spec, sort_by, sort_direction)
+
+    spans = []
+    for number in page_numbers:
+        if spans and spans[-1][1] == number - 1:
+            spans[-1][1] = number
+        else:
+            spans.append([number, number])
+
     try:
-        conn = get_db_connection()
+        with phase("connect"):
+            conn = get_db_connection()
         cursor = conn.cursor()
-        
-        query = """
-            SELECT 
-                p.PropertyID,
-                p.Property_Address,
-                p.Property_Name,
-                p.PropertyType,
-                p.Building_Class,
-                p.Secondary_Type,
-                p.Market_Name,
-                p.Submarket_Name,
-                p.City,
-                p.State,
-                p.Zip,
-                p.County_Name,
-                p.Last_Sale_Date,
-                p.Last_Sale_Price,
-                p.Percent_Leased,
-                p.Year_Built,
-                p.Anchor_Tenants,
-                p.Architect_Name,
-                p.[Avg_Asking/SF],
-                p.[Avg_Effective/SF],
-                p.Building_Operating_Expenses,
-                p.Cap_Rate,
-                p.Ceiling_Ht,
-                p.Constr_Status,
-                p.Construction_Material,
-                p.Developer_Name,
-                p.Flood_Risk_Area,
-                p.Land_Area__AC_,
-                p.Land_Area__SF_,
-                p.Latitude,
-                p.Longitude,
-                p.Market_Segment,
-                p.Max_Building_Contiguous_Space,
-                p.Number_Of_Stories,
-                p.Operation_Type,
-                p.Property_Location,
-                p.Taxes_Total,
-                p.Total_Buildings,
-                p.Zoning,
-                c.name as contact_name,
-                c.phone,
-                c.email
-            FROM [dbo].[property] p
-            LEFT JOIN [dbo].[relationship] r ON p.PropertyID = r.PropertyID
-            LEFT JOIN [dbo].[contact] c ON r.contact_id = c.contact_id
-            WHERE 1=1
-        """
-        params = []
-        
-        if state:
-            query += " AND p.State = ?"
-            params.append(state)
-            
-        if city:
-            query += " AND p.City = ?"
-            params.append(city)
-            
-        if county:
-            query += " AND p.County_Name = ?"
-            params.append(county)
-            
-        if zip_codes:
-            zip_list = [z.strip() for z in zip_codes.split(',')]
-            placeholders = ','.join('?' * len(zip_list))
-            query += f" AND p.Zip IN ({placeholders})"
-            params.extend(zip_list)
-            
-        if property_type:
-            query += " AND p.PropertyType = ?"
-            params.append(property_type)
-            
-        # Add sorting
-        if sort_by:
-            query += f" ORDER BY {sort_by} {sort_direction or 'ASC'}"
-        else:
-            query += " ORDER BY p.PropertyID"
-            
-        # Add pagination
-        offset = (page - 1) * page_size
-        query += f" OFFSET {offset} ROWS FETCH NEXT {page_size} ROWS ONLY"
-        
-        print(f"Executing query: {query}")  # Debug print
-        print(f"With parameters: {params}")  # Debug print
-        
-        cursor.execute(query, params)
-        columns = [column[0] for column in cursor.description]
-        results = [dict(zip(columns, row)) for row in cursor.fetchall()]
-        
-        # Get total count for pagination
-        count_query = """
-            SELECT COUNT(DISTINCT p.PropertyID)
-            FROM [dbo].[property] p
-            WHERE 1=1
-        """
-        # Add the same WHERE conditions
-        if state:
-            count_query += " AND p.State = ?"
-        if city:
-            count_query += " AND p.City = ?"
-        if county:
-            count_query += " AND p.County_Name = ?"
-        if zip_codes:
-            count_query += f" AND p.Zip IN ({placeholders})"
-        if property_type:
-            count_query += " AND p.PropertyType = ?"
-            
-        cursor.execute(count_query, params)
-        total_count = cursor.fetchone()[0]
-        
-        return {
-            "data": results,
+
+        result_pages = []
+        for first, last in spans:
+            rows = fetch_property_rows(
+                cursor, where, params, order_by, (first - 1) * page_size, (last - first + 1) * page_size
+            )
+            for number in range(first, last + 1):
+                start = (number - first) * page_size
+                result_pages.append({"page": number, "data": rows[start:start + page_size]})
+
+        total_count = count_properties(cursor, where, params)
+        total_pages = (total_count + page_size - 1) // page_size
+
+        # Virtualized grids scroll on from the last range as well
+        version = dataset_version.current()
+        prefetch.buffer.schedule(
+            prefetch.signature(where, params, order_by, page_size), version.version if version else 0,
+            prefetch.next_pages(page_numbers[-1], total_pages), total_count,
+            partial(load_property_page, where, params, order_by, page_size),
+        )
+
+        return json_response({
+            "pages": result_pages,
             "total": total_count,
-            "page": page,
             "page_size": page_size,
-            "total_pages": (total_count + page_size - 1) // page_size
-        }
-        
+            "total_pages": total_pages
+        }, headers)
+
     except Exception as e:
-        print(f"Error executing query: {str(e)}")  # Debug print
+        logger.error("Error executing batch query: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'conn' in locals():
+            conn.close()
+
+
+@router.get("/properties/prefetch/stats")
+async def get_prefetch_stats():
+    """Prefetch hit rate and wasted pages for this worker, for tuning PREFETCH_DEPTH."""
+    return prefetch.buffer.stats()
+
+def load_filter_options() -> bytes:
+    """Serialized filter options; built once per node and kept in the shared cache."""
+    with phase("connect"):
+        conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        def distinct_values(column):
+            with phase("execute"):
+                cursor.execute(f"SELECT DISTINCT {column} FROM [dbo].[property] WHERE {column} IS NOT NULL")
+            with phase("fetch"):
+                values = [row[0] for row in cursor.fetchall()]
+            add_rows(len(values))
+            return values
+
+        return json_response({
+            "property_types": distinct_values("PropertyType"),
+            "states": distinct_values("State"),
+            "cities": distinct_values("City"),
+            "counties": distinct_values("County_Name"),
+            "zipcodes": distinct_values("Zip")
+        }).body
     finally:
         cursor.close()
         conn.close()
 
+
 @router.get("/filters")
-async def get_filter_options():
+async def get_filter_options(request: Request):
+    headers, not_modified = conditional_headers(request)
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Get unique property types
-        cursor.execute("SELECT DISTINCT PropertyType FROM [dbo].[property] WHERE PropertyType IS NOT NULL")
-        property_types = [row[0] for row in cursor.fetchall()]
-        
-        # Get unique states
-        cursor.execute("SELECT DISTINCT State FROM [dbo].[property] WHERE State IS NOT NULL")
-        states = [row[0] for row in cursor.fetchall()]
-        
-        # Get unique cities
-        cursor.execute("SELECT DISTINCT City FROM [dbo].[property] WHERE City IS NOT NULL")
-        cities = [row[0] for row in cursor.fetchall()]
-        
-        # Get unique counties
-        cursor.execute("SELECT DISTINCT County_Name FROM [dbo].[property] WHERE County_Name IS NOT NULL")
-        counties = [row[0] for row in cursor.fetchall()]
-        
-        # Get unique zipcodes
-        cursor.execute("SELECT DISTINCT Zip FROM [dbo].[property] WHERE Zip IS NOT NULL")
-        zipcodes = [row[0] for row in cursor.fetchall()]
-        
-        return {
-            "property_types": property_types,
-            "states": states,
-            "cities": cities,
-            "counties": counties,
-            "zipcodes": zipcodes
-        }
+        body = shared_cache.cache.get_or_set(
+            "filters", "options", load_filter_options, ttl=config.SHARED_CACHE_DATA_TTL_SECONDS
+        )
+        return Response(body, media_type="application/json", headers=headers)
         
     except Exception as e:
-        print(f"Error fetching filters: {str(e)}")  # Debug print
+        logger.error("Error fetching filters: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        cursor.close()
-        conn.close()
 
 
-@router.get("/properties/export")
-async def export_properties(
-    format: str = Query(..., regex="^(csv|excel)$"),
-    selected_ids: Optional[str] = None,
-    state: Optional[str] = None,
-    city: Optional[str] = None,
-    county: Optional[str] = None,
-    zip_codes: Optional[str] = None,
-    property_type: Optional[str] = None,
+@router.get("/properties/changes")
+async def get_property_changes(
+    request: Request,
+    since: int = Query(..., ge=0),
+    include_rows: bool = True,
 ):
+    """Property IDs inserted/updated/deleted since dataset version `since`.
+
+    Rows for inserted and updated properties are included in the same shape
+    as /properties. 410 means the history no longer reaches back to `since`
+    and the client has to reload in full.
+    """
+    headers, not_modified = conditional_headers(request)
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+
     try:
-        conn = get_db_connection()
+        feed = dataset_version.changes_since(since)
+    except dataset_version.VersionGone as e:
+        raise HTTPException(status_code=410, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    changed_ids = feed["inserted"] + feed["updated"]
+    feed["rows"] = []
+    if not include_rows or not changed_ids:
+        return json_response(feed, headers)
+
+    try:
+        with phase("connect"):
+            conn = get_db_connection()
+        cursor = conn.cursor()
+
+        for start in range(0, len(changed_ids), MAX_IN_PARAMS):
+            chunk = changed_ids[start:start + MAX_IN_PARAMS]
+            placeholders = ','.join('?' * len(chunk))
+            query = PROPERTY_SELECT + f" WHERE p.PropertyID IN ({placeholders}) ORDER BY p.PropertyID"
+            log_sql("changes", query, chunk)
+            with phase("execute"):
+                cursor.execute(query, chunk)
+            with phase("fetch"):
+                columns = [column[0] for column in cursor.description]
+                feed["rows"].extend(dict(zip(columns, row)) for row in cursor.fetchall())
+        add_rows(len(feed["rows"]))
+
+        return json_response(feed, headers)
+
+    except Exception as e:
+        logger.error("Error fetching property changes: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'conn' in locals():
+            conn.close()
+
+
+async def build_export(format: str, spec: PropertyFilter, id_list: Optional[list]) -> StreamingResponse:
+    """CSV / Excel export of the properties matching `spec` (and `id_list`, if given)."""
+    try:
+        with phase("connect"):
+            conn = get_db_connection()
         cursor = conn.cursor()
         
         # Build the base query with all needed fields
@@ -259,81 +473,49 @@ async def export_properties(
             FROM [dbo].[property] p
             LEFT JOIN [dbo].[relationship] r ON p.PropertyID = r.PropertyID
             LEFT JOIN [dbo].[contact] c ON r.contact_id = c.contact_id
-            WHERE 1=1
         """
         
-        params = []
-        filters = {}
-        
-        # Add filters
-        if selected_ids:
-            try:
-                id_list = json.loads(selected_ids)
-                if id_list:
-                    placeholders = ','.join('?' * len(id_list))
-                    query += f" AND p.PropertyID IN ({placeholders})"
-                    params.extend(id_list)
-                    filters['Selected Properties'] = f"{len(id_list)} properties"
-            except json.JSONDecodeError:
-                raise HTTPException(status_code=400, detail="Invalid selected_ids format")
-            
-        if state:
-            query += " AND p.State = ?"
-            params.append(state)
-            filters['State'] = state
-            
-        if city:
-            query += " AND p.City = ?"
-            params.append(city)
-            filters['City'] = city
-            
-        if county:
-            query += " AND p.County_Name = ?"
-            params.append(county)
-            filters['County'] = county
-            
-        if zip_codes:
-            zip_list = [z.strip() for z in zip_codes.split(',')]
-            placeholders = ','.join('?' * len(zip_list))
-            query += f" AND p.Zip IN ({placeholders})"
-            params.extend(zip_list)
-            filters['ZIP Codes'] = zip_codes
-            
-        if property_type:
-            query += " AND p.PropertyType = ?"
-            params.append(property_type)
-            filters['Property Type'] = property_type
-            
-        # Debug print
-        print(f"Executing export query: {query}")
-        print(f"With parameters: {params}")
+        where, params = compile_filter(spec)
+        query += where
+        filters = describe_filter(spec)
+
+        if id_list:
+            placeholders = ','.join('?' * len(id_list))
+            query += f" AND p.PropertyID IN ({placeholders})"
+            params.extend(id_list)
+            filters['Selected Properties'] = f"{len(id_list)} properties"
+
+        log_sql("export", query, params)
         
-        cursor.execute(query, params)
-        columns = [column[0] for column in cursor.description]
-        results = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        with phase("execute"):
+            cursor.execute(query, params)
+        with phase("fetch"):
+            columns = [column[0] for column in cursor.description]
+            results = [dict(zip(columns, row)) for row in cursor.fetchall()]
         
         if not results:
             raise HTTPException(status_code=404, detail="No data found matching the criteria")
         
-        print(f"Found {len(results)} records to export")
+        add_rows(len(results))
         
         # Prepare DataFrame
-        df = prepare_export_dataframe(results)
+        with phase("dataframe"):
+            df = prepare_export_dataframe(results)
         
         # Generate timestamp for filename
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         
         if format == 'csv':
             output = BytesIO()
-            df.to_csv(output, index=False, encoding='utf-8-sig')
+            with phase("serialize"):
+                df.to_csv(output, index=False, encoding='utf-8-sig')
             output.seek(0)
             filename = f'properties_export_{timestamp}.csv'
             media_type = 'text/csv'
-            print(f"Created CSV export with {len(df)} rows")
             
         else:  # excel
             output = BytesIO()
-            with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+            with phase("serialize"), pd.ExcelWriter(output, engine='xlsxwriter') as writer:
                 # Write main data sheet
                 df.to_excel(writer, sheet_name='Properties', index=False)
                 format_excel_worksheet(df, writer)
@@ -344,7 +526,8 @@ async def export_properties(
             output.seek(0)
             filename = f'properties_export_{timestamp}.xlsx'
             media_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-            print(f"Created Excel export with {len(df)} rows")
+        
+        logger.info("Created %s export with %d rows", format, len(df))
         
         return StreamingResponse(
             output,
@@ -356,10 +539,12 @@ async def export_properties(
         )
         
     except HTTPException as e:
-        print(f"HTTP Exception in export: {str(e)}")
+        logger.warning("HTTP Exception in export: %s", e.detail)
         raise e
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        print(f"Unexpected error in export: {str(e)}")
+        logger.error("Unexpected error in export: %s", e)
         raise HTTPException(status_code=500, detail=f"Export failed: {str(e)}")
     finally:
         if 'cursor' in locals():
@@ -367,6 +552,85 @@ async def export_properties(
         if 'conn' in locals():
             conn.close()
 
+
+@router.get("/properties/export")
+async def export_properties(
+    format: str = Query(..., regex="^(csv|excel)$"),
+    selected_ids: Optional[str] = None,
+    spec: PropertyFilter = Depends(query_filter),
+):
+    id_list = None
+    if selected_ids:
+        try:
+            id_list = json.loads(selected_ids)
+        except json.JSONDecodeError:
+            raise HTTPException(status_code=400, detail="Invalid selected_ids format")
+    return await build_export(format, spec, id_list)
+
+
+@router.post("/properties/export")
+async def export_properties_post(export: ExportRequest):
+    """Export with the filter spec as a JSON body (for filters too long for a URL)."""
+    return await build_export(export.format, export.filters or PropertyFilter(), export.selected_ids)
+
+def loaded_relationship_index() -> relationship_index.RelationshipIndex:
+    index = relationship_index.current()
+    if index is None:
+        raise HTTPException(status_code=503, detail="Relationship index is loading", headers={"Retry-After": "5"})
+    return index
+
+
+def check_batch_size(ids: list):
+    if len(ids) > config.RELATIONSHIP_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {config.RELATIONSHIP_BATCH_MAX} ids per request")
+
+
+@router.post("/relationships/contacts")
+async def get_contacts_for_properties(body: PropertyIdsRequest):
+    """Contacts of each property, from the in-memory relationship index."""
+    check_batch_size(body.property_ids)
+    index = loaded_relationship_index()
+    with phase("lookup"):
+        contacts = index.contacts_for(body.property_ids)
+    add_rows(sum(len(found) for found in contacts.values()))
+    return json_response({"version": index.version, "contacts": contacts})
+
+
+@router.post("/relationships/properties")
+async def get_properties_for_contacts(body: ContactIdsRequest):
+    """PropertyIDs of each contact, from the in-memory relationship index."""
+    check_batch_size(body.contact_ids)
+    index = loaded_relationship_index()
+    with phase("lookup"):
+        properties = index.properties_for(body.contact_ids)
+    add_rows(sum(len(found) for found in properties.values()))
+    return json_response({"version": index.version, "properties": properties})
+
+
+@router.post("/contacts/lookup")
+async def lookup_contacts(body: ContactIdsRequest):
+    """Contact records by id (null for unknown ids)."""
+    check_batch_size(body.contact_ids)
+    index = loaded_relationship_index()
+    with phase("lookup"):
+        contacts = index.contacts(body.contact_ids)
+    add_rows(sum(1 for contact in contacts.values() if contact))
+    return json_response({"version": index.version, "contacts": contacts})
+
+
+@router.get("/contacts/{contact_id}/properties")
+async def get_contact_properties(contact_id: str):
+    index = loaded_relationship_index()
+    contact = index.contacts([contact_id])[contact_id]
+    if contact is None:
+        raise HTTPException(status_code=404, detail=f"Contact {contact_id} not found")
+    return json_response({
+        "version": index.version,
+        "contact": contact,
+        "property_ids": index.properties_for([contact_id])[contact_id],
+    })
+
+
 #test endpoint
 @router.get("/test-connection")
 async def test_connection():
@@ -7,10 +7,19 @@ from copilotkit.integrations.fastapi import add_fastapi_endpoint
 from copilotkit import CopilotKitSDK, Action as CopilotAction, LangGraphAgent
 from copilotkit.langchain import copilotkit_messages_to_langchain
 import routes
+import metrics
+import dataset_version
+import logging
 
+metrics.configure_logging()
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Property Data API")
 
+# Per-request timing and Prometheus metrics; skipped entirely when disabled
+if metrics.ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -27,7 +36,7 @@ class Query(BaseModel):
 try:
     graph_instance = DatabaseAnalysisGraph()
 except Exception as e:
-    print(f"Error initializing graph: {str(e)}")
+    logger.error("Error initializing graph: %s", e)
     graph_instance = None
 
 # Initialize the CopilotKit SDK with your LangGraph agent
@@ -49,6 +58,12 @@ add_fastapi_endpoint(app, sdk, "/copilotkit_remote")
 
 # Include the API routes
 app.include_router(routes.router)
+app.include_router(metrics.router)
+
+@app.on_event("startup")
+async def start_dataset_version_probe():
+    # The first probe runs in the background; ETags are sent once it has finished
+    dataset_version.current()
 
 @app.get("/health")
 async def health_check():
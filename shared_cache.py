@@ -0,0 +1,370 @@
+# shared_cache.py
+"""Node-local cache shared by every uvicorn worker.
+
+Entries live in a SQLite file in WAL mode, so all processes on the node read
+and write the same cache: a value is computed once per node instead of once
+per worker, and per-worker memory does not grow with the cache.
+
+- Keys are grouped into namespaces, each with a version number. Bumping a
+  namespace makes every existing key in it unreachable in one write, which
+  is how all workers are invalidated at once (e.g. on a dataset change).
+  Values are stored under the version read *before* they were computed, so
+  a value built from pre-bump data can never be read after the bump.
+- On a miss, get_or_set takes a per-key fill lease (a row in `fills`) before
+  building. Other workers and threads that miss the same key poll for the
+  value instead of building it too, and only build it themselves once the
+  lease expires, e.g. because its holder died.
+- The total size is bounded by SHARED_CACHE_MAX_BYTES with LRU eviction.
+  Access times are only rewritten when older than SHARED_CACHE_TOUCH_SECONDS
+  to keep reads from turning into writes.
+- Values larger than SHARED_CACHE_BLOB_BYTES are written to their own file
+  and read back through mmap, returning a memoryview without copying the
+  payload into the worker's heap.
+- The cache never fails or stalls a request: reads and writes on the request
+  path use a short busy timeout, access-time touches are skipped when the
+  file is busy, and any sqlite3 error is treated as a miss.
+"""
+import logging
+import mmap
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, Optional, Union
+
+import config
+from metrics import ENABLED, SHARED_CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+# Busy timeouts (seconds): request-path operations give up quickly, invalidation waits
+REQUEST_TIMEOUT = 0.2
+BUMP_TIMEOUT = 30
+# A fill lease older than this is presumed abandoned; waiters poll at FILL_POLL_SECONDS
+FILL_LEASE_SECONDS = 30
+FILL_POLL_SECONDS = 0.05
+
+Value = Union[bytes, memoryview]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS namespaces (name TEXT PRIMARY KEY, version INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS entries (
+    namespace TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB,
+    blob_file TEXT,
+    size INTEGER NOT NULL,
+    expires_at REAL,
+    accessed_at REAL NOT NULL,
+    PRIMARY KEY (namespace, version, key)
+);
+CREATE INDEX IF NOT EXISTS ix_entries_accessed ON entries (accessed_at);
+CREATE TABLE IF NOT EXISTS fills (
+    namespace TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (namespace, version, key)
+);
+"""
+
+
+class SharedCache:
+    def __init__(self, directory: str, max_bytes: int, blob_bytes: int, touch_seconds: float):
+        self.directory = directory
+        self.blob_dir = os.path.join(directory, "blobs")
+        self.max_bytes = max_bytes
+        self.blob_bytes = blob_bytes
+        self.touch_seconds = touch_seconds
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(self.blob_dir, exist_ok=True)
+            conn = sqlite3.connect(
+                os.path.join(self.directory, "cache.sqlite"), timeout=REQUEST_TIMEOUT, isolation_level=None
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def _one(self, query: str, params: tuple = ()) -> Optional[tuple]:
+        # fetchall() finishes the statement; a half-read SELECT would keep this
+        # connection's read snapshot open and hide other workers' writes
+        rows = self._conn().execute(query, params).fetchall()
+        return rows[0] if rows else None
+
+    # -- namespaces ---------------------------------------------------------
+
+    def version(self, namespace: str) -> int:
+        row = self._one("SELECT version FROM namespaces WHERE name = ?", (namespace,))
+        return row[0] if row else 0
+
+    def bump(self, namespace: str) -> int:
+        """Invalidate every key in `namespace` for all workers; return the new version."""
+        conn = self._conn()
+        conn.execute(f"PRAGMA busy_timeout = {BUMP_TIMEOUT * 1000}")
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT INTO namespaces (name, version) VALUES (?, 1) "
+                    "ON CONFLICT(name) DO UPDATE SET version = version + 1",
+                    (namespace,),
+                )
+                version = self._one("SELECT version FROM namespaces WHERE name = ?", (namespace,))[0]
+                blobs = self._delete(conn, "namespace = ? AND version < ?", (namespace, version))
+                conn.execute("DELETE FROM fills WHERE namespace = ? AND version < ?", (namespace, version))
+                conn.execute("COMMIT")
+            except Exception:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.execute(f"PRAGMA busy_timeout = {int(REQUEST_TIMEOUT * 1000)}")
+        self._unlink(blobs)
+        return version
+
+    # -- values -------------------------------------------------------------
+
+    def get(self, namespace: str, key: str, version: Optional[int] = None) -> Optional[Value]:
+        """Cached value, or None on a miss, an expired entry or a busy/broken cache file."""
+        value, result = self._lookup(namespace, key, version)
+        self._count(namespace, result)
+        return value
+
+    def set(self, namespace: str, key: str, value: bytes, ttl: Optional[float] = None,
+            version: Optional[int] = None):
+        conn = self._conn()
+        version = self.version(namespace) if version is None else version
+        size = len(value)
+        blob_file = None
+        if size > self.blob_bytes:
+            blob_file = self._write_blob(value)
+            value = None
+        now = time.time()
+
+        committed = False
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            blobs = self._delete(conn, "namespace = ? AND version = ? AND key = ?", (namespace, version, key))
+            conn.execute(
+                "INSERT INTO entries (namespace, version, key, value, blob_file, size, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (namespace, version, key, value, blob_file, size, now + ttl if ttl else None, now),
+            )
+            blobs += self._evict(conn, now)
+            conn.execute("COMMIT")
+            committed = True
+        except Exception:
+            # A failed statement may already have rolled the transaction back
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            if blob_file and not committed:
+                self._unlink([blob_file])
+        self._unlink(blobs)
+
+    def get_or_set(self, namespace: str, key: str, build: Callable[[], bytes], ttl: Optional[float] = None) -> Value:
+        """Cached value for `key`, computing and storing it with `build()` on a miss.
+
+        Only the holder of the key's fill lease builds; everyone else who
+        misses waits for its value (see the module docstring). Errors from the
+        cache file only turn into a miss (and a skipped store); errors from
+        `build()` propagate.
+        """
+        try:
+            version = self.version(namespace)
+        except (sqlite3.Error, OSError) as e:
+            logger.warning("shared_cache: version of %s unavailable: %s", namespace, e)
+            self._count(namespace, "error")
+            return build()
+        value = self.get(namespace, key, version)
+        if value is not None:
+            return value
+
+        owner = uuid.uuid4().hex
+        deadline = time.monotonic() + FILL_LEASE_SECONDS
+        claimed = self._claim_fill(namespace, version, key, owner)
+        while claimed is False and time.monotonic() < deadline:
+            time.sleep(FILL_POLL_SECONDS)
+            value, _ = self._lookup(namespace, key, version)
+            if value is not None:
+                return value
+            claimed = self._claim_fill(namespace, version, key, owner)
+        try:
+            value = build()
+            try:
+                self.set(namespace, key, value, ttl, version)
+            except (sqlite3.Error, OSError) as e:
+                # The cache is an optimization; a busy or broken file must not fail the request
+                logger.warning("shared_cache: set %s/%s failed: %s", namespace, key, e)
+        finally:
+            if claimed:
+                self._release_fill(namespace, version, key, owner)
+        return value
+
+    # -- internals ----------------------------------------------------------
+
+    def _lookup(self, namespace: str, key: str, version: Optional[int]):
+        """(value, result) where result is the lookup metric label: hit, miss or error."""
+        try:
+            version = self.version(namespace) if version is None else version
+            row = self._one(
+                "SELECT value, blob_file, expires_at, accessed_at FROM entries "
+                "WHERE namespace = ? AND version = ? AND key = ?",
+                (namespace, version, key),
+            )
+        except (sqlite3.Error, OSError) as e:
+            logger.warning("shared_cache: get %s/%s failed: %s", namespace, key, e)
+            return None, "error"
+        now = time.time()
+        if row is None or (row[2] is not None and row[2] < now):
+            return None, "miss"
+
+        value = row[0] if row[1] is None else self._map(row[1])
+        if value is None:  # blob file evicted between the lookup and the read
+            return None, "miss"
+        if now - row[3] > self.touch_seconds:
+            self._touch(namespace, version, key, now)
+        return value, "hit"
+
+    def _claim_fill(self, namespace: str, version: int, key: str, owner: str) -> Optional[bool]:
+        """Take the key's fill lease: True if taken, False if a live holder has it.
+
+        None means the cache file was too busy to tell; the caller then builds
+        without coordination rather than waiting on the file.
+        """
+        now = time.time()
+        try:
+            conn = self._conn()
+            conn.execute(
+                "INSERT INTO fills (namespace, version, key, owner, expires_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (namespace, version, key) DO UPDATE "
+                "SET owner = excluded.owner, expires_at = excluded.expires_at WHERE fills.expires_at < ?",
+                (namespace, version, key, owner, now + FILL_LEASE_SECONDS, now),
+            )
+            return conn.execute("SELECT changes()").fetchone()[0] > 0
+        except sqlite3.Error as e:
+            logger.warning("shared_cache: fill lease for %s/%s unavailable: %s", namespace, key, e)
+            return None
+
+    def _release_fill(self, namespace: str, version: int, key: str, owner: str):
+        try:
+            self._conn().execute(
+                "DELETE FROM fills WHERE namespace = ? AND version = ? AND key = ? AND owner = ?",
+                (namespace, version, key, owner),
+            )
+        except sqlite3.Error as e:
+            # Left in place, the lease simply expires
+            logger.warning("shared_cache: releasing fill lease for %s/%s failed: %s", namespace, key, e)
+
+    def _touch(self, namespace: str, version: int, key: str, now: float):
+        """Refresh the LRU access time, skipped outright when another worker is writing."""
+        conn = self._conn()
+        conn.execute("PRAGMA busy_timeout = 0")
+        try:
+            conn.execute(
+                "UPDATE entries SET accessed_at = ? WHERE namespace = ? AND version = ? AND key = ?",
+                (now, namespace, version, key),
+            )
+        except sqlite3.OperationalError:
+            pass  # busy; a later read touches it
+        finally:
+            conn.execute(f"PRAGMA busy_timeout = {int(REQUEST_TIMEOUT * 1000)}")
+
+    def _count(self, namespace: str, result: str):
+        if ENABLED:
+            SHARED_CACHE_LOOKUPS.labels(namespace, result).inc()
+
+    def _delete(self, conn: sqlite3.Connection, where: str, params: tuple) -> list:
+        """Delete matching entries; return their blob files for unlinking after commit."""
+        blobs = [row[0] for row in conn.execute(
+            f"SELECT blob_file FROM entries WHERE {where} AND blob_file IS NOT NULL", params
+        )]
+        conn.execute(f"DELETE FROM entries WHERE {where}", params)
+        return blobs
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> list:
+        blobs = self._delete(conn, "expires_at IS NOT NULL AND expires_at < ?", (now,))
+        total = self._one("SELECT COALESCE(SUM(size), 0) FROM entries")[0]
+        if total <= self.max_bytes:
+            return blobs
+        for namespace, version, key, blob_file, size in conn.execute(
+            "SELECT namespace, version, key, blob_file, size FROM entries ORDER BY accessed_at"
+        ).fetchall():
+            conn.execute(
+                "DELETE FROM entries WHERE namespace = ? AND version = ? AND key = ?", (namespace, version, key)
+            )
+            if blob_file:
+                blobs.append(blob_file)
+            total -= size
+            if total <= self.max_bytes:
+                break
+        return blobs
+
+    def _write_blob(self, value: bytes) -> str:
+        name = f"{uuid.uuid4().hex}.bin"
+        path = os.path.join(self.blob_dir, name)
+        with open(path + ".tmp", "wb") as f:
+            f.write(value)
+        os.replace(path + ".tmp", path)
+        return name
+
+    def _map(self, name: str) -> Optional[memoryview]:
+        """Zero-copy view of a blob file; stays valid even if the file is evicted meanwhile."""
+        try:
+            with open(os.path.join(self.blob_dir, name), "rb") as f:
+                return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _unlink(self, names: list):
+        for name in names:
+            try:
+                os.remove(os.path.join(self.blob_dir, name))
+            except FileNotFoundError:
+                pass
+
+
+class _NoCache:
+    """Stand-in when SHARED_CACHE_ENABLED=false: every lookup misses."""
+
+    def version(self, namespace: str) -> int:
+        return 0
+
+    def bump(self, namespace: str) -> int:
+        return 0
+
+    def get(self, namespace: str, key: str, version: Optional[int] = None) -> Optional[Value]:
+        return None
+
+    def set(self, namespace: str, key: str, value: bytes, ttl: Optional[float] = None,
+            version: Optional[int] = None):
+        pass
+
+    def get_or_set(self, namespace: str, key: str, build: Callable[[], bytes], ttl: Optional[float] = None) -> Value:
+        return build()
+
+
+cache = (
+    SharedCache(
+        config.SHARED_CACHE_DIR,
+        config.SHARED_CACHE_MAX_BYTES,
+        config.SHARED_CACHE_BLOB_BYTES,
+        config.SHARED_CACHE_TOUCH_SECONDS,
+    )
+    if config.SHARED_CACHE_ENABLED
+    else _NoCache()
+)
+
+# Namespaces holding values derived from the property data; bumped on every new dataset version.
+# Their entries also expire after SHARED_CACHE_DATA_TTL_SECONDS in case version probes keep failing.
+DATA_NAMESPACES = ("filters", "counts")
@@ -0,0 +1,383 @@
+# sql_guard.py
+"""Cost-aware guardrails around the agent's sql_db_query tool.
+
+Every statement the agent generates is checked before it reaches Fabric:
+only single read-only SELECT/WITH statements are allowed, a TOP row cap is
+injected where it keeps the query's meaning (other statements are limited
+at fetch time, see inject_row_cap), statements whose estimated plan cost is
+above a threshold are rejected, and execution is bounded by a timeout that
+cancels the query.
+The agent receives a short, truncated summary instead of the full result.
+"""
+import asyncio
+import logging
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Type
+
+from langchain_community.utilities.sql_database import SQLDatabase
+from langchain_core.tools import BaseTool, ToolException
+from pydantic import BaseModel, Field
+
+import config
+
+logger = logging.getLogger(__name__)
+
+FORBIDDEN_KEYWORDS = (
+    "INSERT", "UPDATE", "DELETE", "MERGE", "DROP", "ALTER", "CREATE", "TRUNCATE",
+    "EXEC", "EXECUTE", "GRANT", "REVOKE", "DENY", "BACKUP", "RESTORE", "SHUTDOWN",
+    "KILL", "DBCC", "OPENROWSET", "OPENQUERY", "OPENDATASOURCE", "BULK", "INTO",
+    "USE", "DECLARE", "SET", "WAITFOR", "RECONFIGURE",
+)
+_FORBIDDEN_RE = re.compile(r"\b(" + "|".join(FORBIDDEN_KEYWORDS) + r")\b", re.IGNORECASE)
+_COST_RE = re.compile(r'StatementSubTreeCost="([0-9.Ee+-]+)"')
+
+
+class SQLGuardError(ToolException):
+    """Raised when a statement is rejected; the message is returned to the agent."""
+
+
+# ---------------------------------------------------------------------------
+# Parsing
+# ---------------------------------------------------------------------------
+
+def mask_sql(query: str) -> str:
+    """Blank out comments, string literals and quoted identifiers, keeping offsets.
+
+    Keyword checks and clause detection run on the masked text so that a
+    value like 'Drop Zone' or a column named [Update_Date] cannot trip them.
+    """
+    out = list(query)
+    i, n = 0, len(query)
+    while i < n:
+        two = query[i:i + 2]
+        if two == "--":
+            end = query.find("\n", i)
+            end = n if end == -1 else end
+        elif two == "/*":
+            end = query.find("*/", i + 2)
+            end = n if end == -1 else end + 2
+        elif query[i] in "'[\"":
+            close = {"'": "'", "[": "]", '"': '"'}[query[i]]
+            end = i + 1
+            while end < n:
+                if query[end] == close:
+                    # '' and ]] are escaped quotes
+                    if end + 1 < n and query[end + 1] == close:
+                        end += 2
+                        continue
+                    break
+                end += 1
+            end = min(end + 1, n)
+        else:
+            i += 1
+            continue
+        for j in range(i, end):
+            if out[j] != "\n":
+                out[j] = " "
+        i = end
+    return "".join(out)
+
+
+def _top_level_tokens(masked: str) -> List[Tuple[int, str]]:
+    """(offset, upper-cased word) for every word at parenthesis depth 0."""
+    tokens = []
+    depth = 0
+    for match in re.finditer(r"\(|\)|[A-Za-z_][A-Za-z0-9_]*", masked):
+        text = match.group(0)
+        if text == "(":
+            depth += 1
+        elif text == ")":
+            depth = max(0, depth - 1)
+        elif depth == 0:
+            tokens.append((match.start(), text.upper()))
+    return tokens
+
+
+def check_read_only(query: str) -> str:
+    """Validate that `query` is one read-only statement; return it without a trailing ';'."""
+    stripped = query.strip()
+    masked = mask_sql(stripped)
+
+    # Allow a single trailing semicolon, nothing else
+    body = masked.rstrip()
+    if body.endswith(";"):
+        stripped = stripped[:len(body) - 1].rstrip()
+        masked = masked[:len(body) - 1].rstrip()
+    if ";" in masked:
+        raise SQLGuardError("Only a single SQL statement is allowed per query.")
+
+    words = masked.split()
+    if not words or words[0].upper() not in ("SELECT", "WITH"):
+        raise SQLGuardError("Only read-only SELECT statements are allowed.")
+
+    forbidden = _FORBIDDEN_RE.search(masked)
+    if forbidden:
+        raise SQLGuardError(
+            f"Statement rejected: '{forbidden.group(1).upper()}' is not allowed; "
+            "the query tool is read-only."
+        )
+    return stripped
+
+
+def inject_row_cap(query: str, max_rows: int) -> str:
+    """Add or tighten TOP on the outermost SELECT so at most `max_rows` rows come back.
+
+    Some statements are returned unchanged and are only limited when the rows
+    are fetched (run_guarded_query reads at most max_rows + 1). The plan cost
+    check still applies to them. They are:
+
+    - set operations (UNION [ALL], EXCEPT, INTERSECT). Wrapping them in
+      SELECT TOP (n) * FROM (...) fails when a column has no name, and a
+      trailing ORDER BY is not allowed inside a derived table.
+    - OFFSET/FETCH paging.
+    - TOP n PERCENT and TOP n WITH TIES, where a fixed TOP would change the
+      meaning of the query.
+    - TOP with anything but a numeric literal, e.g. TOP (@n); any TOP right
+      after SELECT [ALL | DISTINCT] counts as an existing cap, and only
+      literals above `max_rows` are lowered.
+    """
+    masked = mask_sql(query)
+    tokens = _top_level_tokens(masked)
+    words = [word for _, word in tokens]
+    if {"UNION", "EXCEPT", "INTERSECT", "OFFSET", "FETCH"} & set(words):
+        return query
+
+    select_index = words.index("SELECT") if "SELECT" in words else None
+    if select_index is None:
+        return query
+
+    # Position right after SELECT [ALL | DISTINCT]
+    insert_token = select_index
+    if select_index + 1 < len(tokens) and words[select_index + 1] in ("ALL", "DISTINCT"):
+        insert_token = select_index + 1
+    offset, word = tokens[insert_token]
+    insert_at = offset + len(word)
+
+    rest = masked[insert_at:]
+    if re.match(r"\s+TOP\b", rest, re.IGNORECASE):
+        literal = re.match(
+            r"\s+TOP\s*(?:\(\s*(\d+)\s*\)|(\d+)\b)(\s*PERCENT\b)?(\s*WITH\s+TIES\b)?", rest, re.IGNORECASE
+        )
+        if literal is None or literal.group(3) or literal.group(4):
+            return query
+        if int(literal.group(1) or literal.group(2)) <= max_rows:
+            return query
+        return f"{query[:insert_at]} TOP ({max_rows}){query[insert_at + literal.end():]}"
+
+    return f"{query[:insert_at]} TOP ({max_rows}){query[insert_at:]}"
+
+
+# ---------------------------------------------------------------------------
+# Execution
+# ---------------------------------------------------------------------------
+
+def estimate_cost(connection, cursor, query: str) -> Optional[float]:
+    """Estimated plan cost from SHOWPLAN_XML, or None when it cannot be obtained.
+
+    If SHOWPLAN cannot be switched off again, `connection` (a pooled
+    connection) is invalidated and the error raised: left in the pool it
+    would answer every later query with a plan instead of rows.
+    """
+    row = None
+    try:
+        cursor.execute("SET SHOWPLAN_XML ON")
+        cursor.execute(query)
+        row = cursor.fetchone()
+    except Exception as e:
+        logger.warning("sql_guard: cost estimate unavailable: %s", e)
+    try:
+        cursor.execute("SET SHOWPLAN_XML OFF")
+    except Exception:
+        connection.invalidate()
+        raise
+    if not row or not row[0]:
+        return None
+    costs = [float(c) for c in _COST_RE.findall(str(row[0]))]
+    return max(costs) if costs else None
+
+
+class _QueryHandle:
+    """Lets another thread cancel the statement a worker thread is running."""
+
+    def __init__(self):
+        self.cancel_fn = None
+        self.cancelled = False
+        self.lock = threading.Lock()
+
+    def set(self, cancel_fn):
+        with self.lock:
+            self.cancel_fn = cancel_fn
+
+    def cancel(self):
+        with self.lock:
+            self.cancelled = True
+            if self.cancel_fn is not None:
+                try:
+                    self.cancel_fn()
+                except Exception as e:
+                    logger.warning("sql_guard: cancel failed: %s", e)
+
+
+def run_guarded_query(
+    db: SQLDatabase,
+    query: str,
+    handle: Optional[_QueryHandle] = None,
+) -> Dict[str, Any]:
+    """Validate, cap and execute `query`; return columns, rows and execution stats."""
+    max_rows = config.SQL_GUARD_MAX_ROWS
+    timeout = config.SQL_GUARD_TIMEOUT_SECONDS
+    is_mssql = db.dialect == "mssql"
+
+    statement = check_read_only(query)
+    if is_mssql:
+        # One extra row tells us whether the result was truncated
+        statement = inject_row_cap(statement, max_rows + 1)
+
+    started = time.perf_counter()
+    raw = db._engine.raw_connection()
+    dbapi_conn = raw.dbapi_connection
+    try:
+        cursor = raw.cursor()
+        if hasattr(dbapi_conn, "timeout"):
+            dbapi_conn.timeout = timeout  # pyodbc per-statement query timeout
+        if handle is not None:
+            handle.set(getattr(cursor, "cancel", None) or getattr(dbapi_conn, "interrupt", None))
+
+        cost = None
+        if is_mssql and config.SQL_GUARD_MAX_COST:
+            cost = estimate_cost(raw, cursor, statement)
+            if cost is not None and cost > config.SQL_GUARD_MAX_COST:
+                logger.warning("sql_guard: rejected cost=%.1f limit=%.1f sql=%s",
+                               cost, config.SQL_GUARD_MAX_COST, statement[:500])
+                raise SQLGuardError(
+                    f"Query rejected: estimated cost {cost:.1f} exceeds the limit of "
+                    f"{config.SQL_GUARD_MAX_COST:g}. Add filters, aggregate, or select fewer columns."
+                )
+
+        cursor.execute(statement)
+        columns = [column[0] for column in cursor.description] if cursor.description else []
+        rows = cursor.fetchmany(max_rows + 1) if columns else []
+        truncated = len(rows) > max_rows
+        rows = rows[:max_rows]
+        cursor.close()
+    except SQLGuardError:
+        raise
+    except Exception as e:
+        if handle is not None and handle.cancelled:
+            raise SQLGuardError(f"Query cancelled after exceeding the {timeout}s time limit.")
+        raise SQLGuardError(f"Error: {e}")
+    finally:
+        if hasattr(dbapi_conn, "timeout"):
+            dbapi_conn.timeout = 0
+        raw.close()
+
+    elapsed = time.perf_counter() - started
+    logger.info("sql_guard: rows=%d truncated=%s cost=%s elapsed=%.2fs sql=%s",
+                len(rows), truncated, cost, elapsed, statement[:500])
+    return {
+        "statement": statement,
+        "columns": columns,
+        "rows": rows,
+        "truncated": truncated,
+        "cost": cost,
+        "elapsed": elapsed,
+    }
+
+
+def summarize_result(result: Dict[str, Any]) -> str:
+    """Compact text rendering of a result for the agent, bounded in rows and characters."""
+    columns, rows = result["columns"], result["rows"]
+    if not columns:
+        return "Query executed; no result set returned."
+    if not rows:
+        return f"Columns: {', '.join(columns)}\nNo rows returned."
+
+    max_cell = config.SQL_GUARD_MAX_CELL_CHARS
+    shown = rows[:config.SQL_GUARD_SUMMARY_ROWS]
+
+    def cell(value):
+        text = repr(value)
+        return text if len(text) <= max_cell else text[:max_cell] + "…"
+
+    lines = [f"Columns: {', '.join(columns)}"]
+    lines += ["(" + ", ".join(cell(v) for v in row) + ")" for row in shown]
+
+    if result["truncated"]:
+        lines.append(
+            f"[Showing {len(shown)} rows; the result has more than {config.SQL_GUARD_MAX_ROWS} rows "
+            "and was cut off. Use aggregates, filters or TOP to narrow it down.]"
+        )
+    elif len(shown) < len(rows):
+        lines.append(f"[Showing {len(shown)} of {len(rows)} rows.]")
+    else:
+        lines.append(f"[{len(rows)} row{'s' if len(rows) != 1 else ''}]")
+
+    text = "\n".join(lines)
+    limit = config.SQL_GUARD_MAX_RESULT_CHARS
+    if len(text) > limit:
+        text = text[:limit] + "\n[Output truncated.]"
+    return text
+
+
+# ---------------------------------------------------------------------------
+# Tool
+# ---------------------------------------------------------------------------
+
+class _QueryInput(BaseModel):
+    query: str = Field(..., description="A detailed and correct SQL query.")
+
+
+class GuardedQuerySQLDatabaseTool(BaseTool):
+    """Drop-in replacement for the toolkit's sql_db_query with cost guardrails."""
+
+    name: str = "sql_db_query"
+    description: str = (
+        "Input to this tool is a detailed and correct SQL query, output is a summary of "
+        "the result from the database. Only read-only SELECT statements are allowed and "
+        "results are capped. If the query is not correct or too expensive, an error "
+        "message will be returned; rewrite the query and try again."
+    )
+    args_schema: Type[BaseModel] = _QueryInput
+    response_format: str = "content_and_artifact"
+    handle_tool_error: bool = True
+    db: SQLDatabase = Field(exclude=True)
+
+    def _artifact(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "row_count": len(result["rows"]),
+            "truncated": result["truncated"],
+            "cost": result["cost"],
+            "elapsed": result["elapsed"],
+        }
+
+    def _run(self, query: str, run_manager=None) -> Tuple[str, Dict[str, Any]]:
+        result = run_guarded_query(self.db, query)
+        return summarize_result(result), self._artifact(result)
+
+    async def _arun(self, query: str, run_manager=None) -> Tuple[str, Dict[str, Any]]:
+        handle = _QueryHandle()
+        timeout = config.SQL_GUARD_TIMEOUT_SECONDS
+        task = asyncio.ensure_future(asyncio.to_thread(run_guarded_query, self.db, query, handle))
+        try:
+            # Small grace period so the server-side timeout normally fires first
+            result = await asyncio.wait_for(asyncio.shield(task), timeout + 5)
+        except asyncio.TimeoutError:
+            handle.cancel()
+            logger.warning("sql_guard: cancelled after %ss sql=%s", timeout, query[:500])
+            raise SQLGuardError(f"Query cancelled after exceeding the {timeout}s time limit.")
+        except asyncio.CancelledError:
+            # The caller gave up (agent timeout, batch cleanup, client disconnect); the
+            # shielded thread would otherwise keep the query running and its connection busy
+            handle.cancel()
+            raise
+        return summarize_result(result), self._artifact(result)
+
+
+def guard_sql_tools(tools: Sequence[BaseTool], db: SQLDatabase) -> List[BaseTool]:
+    """Replace sql_db_query in `tools` with the guarded version."""
+    return [
+        GuardedQuerySQLDatabaseTool(db=db) if tool.name == "sql_db_query" else tool
+        for tool in tools
+    ]
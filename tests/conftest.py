@@ -0,0 +1,50 @@
+# tests/conftest.py
+"""Shared fixtures. The suite runs against the local SQLite stand-in.
+
+The environment is set before any application module is imported: config
+validates it at import time, and the node-local state (shared cache,
+dataset changelog, relationship index) must not land in the working tree.
+"""
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATE_DIR = tempfile.mkdtemp(prefix="tests-")
+atexit.register(shutil.rmtree, STATE_DIR, ignore_errors=True)
+
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+os.environ["DB_BACKEND"] = "sqlite"
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ["METRICS_ENABLED"] = "false"
+os.environ["SHARED_CACHE_DIR"] = os.path.join(STATE_DIR, "shared_cache")
+os.environ["DATASET_CHANGELOG_PATH"] = os.path.join(STATE_DIR, "dataset_changelog.sqlite")
+os.environ["RELATIONSHIP_INDEX_DIR"] = os.path.join(STATE_DIR, "relationship_index")
+
+import config  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def local_db(tmp_path_factory):
+    """Path of a small datagen database, used as LOCAL_DB_PATH for the session."""
+    from datagen import generate
+
+    path = str(tmp_path_factory.mktemp("data") / "properties.sqlite")
+    generate(path, 500)
+    previous, config.LOCAL_DB_PATH = config.LOCAL_DB_PATH, path
+    yield path
+    config.LOCAL_DB_PATH = previous
+
+
+@pytest.fixture
+def local_connection(local_db):
+    from database import get_local_connection
+
+    with get_local_connection() as conn:
+        yield conn
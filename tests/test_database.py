@@ -0,0 +1,42 @@
+import pytest
+
+from database import tsql_to_sqlite
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("SELECT * FROM t ORDER BY a OFFSET ? ROWS FETCH NEXT ? ROWS ONLY", "SELECT * FROM t ORDER BY a LIMIT ?, ?"),
+    ("SELECT * FROM t ORDER BY a OFFSET 20 ROWS FETCH NEXT 10 ROWS ONLY", "SELECT * FROM t ORDER BY a LIMIT 20, 10"),
+    ("SELECT TOP 5 * FROM t", "SELECT * FROM t LIMIT 5"),
+    ("SELECT DISTINCT TOP (3) City FROM t", "SELECT DISTINCT City FROM t LIMIT 3"),
+    ("SELECT COUNT_BIG(*) FROM t", "SELECT COUNT(*) FROM t"),
+    ("SELECT * FROM [dbo].[property] WHERE State = ?", "SELECT * FROM [dbo].[property] WHERE State = ?"),
+])
+def test_tsql_to_sqlite(query, expected):
+    assert tsql_to_sqlite(query).split() == expected.split()
+
+
+def test_translated_queries_run_on_the_local_database(local_connection):
+    cursor = local_connection.cursor()
+    cursor.execute("SELECT COUNT_BIG(*) FROM [dbo].[property]")
+    assert cursor.fetchone()[0] == 500
+
+    cursor.execute(
+        "SELECT PropertyID FROM [dbo].[property] ORDER BY PropertyID OFFSET ? ROWS FETCH NEXT ? ROWS ONLY", (10, 5)
+    )
+    assert [row[0] for row in cursor.fetchall()] == [11, 12, 13, 14, 15]
+
+    cursor.execute("SELECT TOP 3 PropertyID FROM [dbo].[property] ORDER BY PropertyID DESC")
+    assert [row[0] for row in cursor.fetchall()] == [500, 499, 498]
+
+
+def test_checksum_functions_are_registered(local_connection):
+    cursor = local_connection.cursor()
+    cursor.execute("SELECT BINARY_CHECKSUM(1, 'a'), BINARY_CHECKSUM(1, 'a'), BINARY_CHECKSUM(1, 'b')")
+    first, same, other = cursor.fetchone()
+    assert first == same != other
+
+    query = "SELECT CHECKSUM_AGG(BINARY_CHECKSUM(PropertyID, City)) FROM [dbo].[property]"
+    cursor.execute(query)
+    before = cursor.fetchone()[0]
+    cursor.execute(query + " WHERE PropertyID > 1")
+    assert cursor.fetchone()[0] != before
@@ -0,0 +1,52 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from dataset_version import DatasetVersion, is_not_modified, make_etag
+
+VERSION = DatasetVersion(3, datetime(2024, 5, 1, 12, 0, tzinfo=timezone.utc), "fingerprint")
+
+
+def test_make_etag_is_weak_and_scoped():
+    etag = make_etag(VERSION, "/api/filters")
+    assert etag.startswith('W/"3-')
+    assert etag == make_etag(VERSION, "/api/filters")
+    assert etag != make_etag(VERSION, "/api/filters?state=TX")
+    assert etag != make_etag(VERSION._replace(version=4), "/api/filters")
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("{etag}", True),
+    ("{strong}", True),
+    ('W/"other", {etag}', True),
+    ("*", True),
+    ('W/"2-00000000"', False),
+])
+def test_if_none_match(header, expected):
+    etag = make_etag(VERSION, "/api/filters")
+    value = header.format(etag=etag, strong=etag[2:])
+    assert is_not_modified({"if-none-match": value}, etag, VERSION) is expected
+
+
+def test_if_none_match_takes_precedence_over_if_modified_since():
+    etag = make_etag(VERSION, "/api/filters")
+    headers = {"if-none-match": '"stale"', "if-modified-since": VERSION.http_date}
+    assert not is_not_modified(headers, etag, VERSION)
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("Wed, 01 May 2024 12:00:00 GMT", True),
+    ("Thu, 02 May 2024 00:00:00 GMT", True),
+    ("Wed, 01 May 2024 11:59:59 GMT", False),
+    ("not a date", False),
+])
+def test_if_modified_since(header, expected):
+    assert is_not_modified({"if-modified-since": header}, "", VERSION) is expected
+
+
+def test_no_conditional_headers():
+    assert not is_not_modified({}, make_etag(VERSION, "/api/filters"), VERSION)
+
+
+def test_http_date_roundtrips_through_if_modified_since():
+    assert is_not_modified({"if-modified-since": VERSION.http_date}, "", VERSION)
@@ -0,0 +1,100 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from prefetch import PageKey, PrefetchBuffer, next_pages, signature
+
+
+@pytest.fixture
+def buffer():
+    buffer = PrefetchBuffer(max_pages=2, ttl=60, workers=2)
+    yield buffer
+    buffer._executor.shutdown(wait=True)
+
+
+def _wait_for_inflight(buffer: PrefetchBuffer):
+    deadline = time.monotonic() + 5
+    while buffer.stats()["in_flight"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_signature_depends_on_everything_but_the_page():
+    base = signature(" WHERE 1=1 AND p.State = ?", ["TX"], " ORDER BY p.PropertyID", 50)
+    assert base == signature(" WHERE 1=1 AND p.State = ?", ("TX",), " ORDER BY p.PropertyID", 50)
+    assert base != signature(" WHERE 1=1 AND p.State = ?", ["OK"], " ORDER BY p.PropertyID", 50)
+    assert base != signature(" WHERE 1=1 AND p.State = ?", ["TX"], " ORDER BY p.PropertyID", 100)
+
+
+def test_next_pages(monkeypatch):
+    monkeypatch.setattr("config.PREFETCH_DEPTH", 2)
+    assert list(next_pages(1, 10)) == [2, 3]
+    assert list(next_pages(9, 10)) == [10]
+    assert list(next_pages(10, 10)) == []
+    monkeypatch.setattr("config.PREFETCH_DEPTH", 0)
+    assert list(next_pages(1, 10)) == []
+
+
+def test_prefetched_page_is_served_once_loaded(buffer):
+    buffer.schedule("sig", 1, [2], 10, lambda page: [{"page": page}])
+    _wait_for_inflight(buffer)
+    assert asyncio.run(buffer.get(PageKey("sig", 1, 2))) == ([{"page": 2}], 10)
+    # Another dataset version never sees the page
+    assert asyncio.run(buffer.get(PageKey("sig", 2, 2))) is None
+    stats = buffer.stats()
+    assert (stats["issued"], stats["hit"], stats["miss"], stats["used"]) == (1, 1, 1, 1)
+
+
+def test_get_waits_for_a_page_in_flight(buffer):
+    release = threading.Event()
+
+    def load(page):
+        release.wait(5)
+        return [{"page": page}]
+
+    buffer.schedule("sig", 1, [2], 10, load)
+
+    async def lookup():
+        pending = asyncio.ensure_future(buffer.get(PageKey("sig", 1, 2)))
+        await asyncio.sleep(0.05)
+        release.set()
+        return await pending
+
+    assert asyncio.run(lookup()) == ([{"page": 2}], 10)
+    assert buffer.stats()["inflight"] == 1
+
+
+def test_schedule_skips_buffered_and_in_flight_pages(buffer):
+    calls = []
+    buffer.schedule("sig", 1, [2, 3], 10, lambda page: calls.append(page) or [])
+    buffer.schedule("sig", 1, [2, 3], 10, lambda page: calls.append(page) or [])
+    _wait_for_inflight(buffer)
+    assert sorted(calls) == [2, 3]
+    assert buffer.stats()["issued"] == 2
+
+
+def test_eviction_and_expiry_count_unused_pages_as_wasted(buffer):
+    buffer._store(PageKey("sig", 1, 2), [], 10)
+    buffer._store(PageKey("sig", 1, 3), [], 10)
+    assert buffer._claim(PageKey("sig", 1, 2)) == ([], 10)
+    buffer._store(PageKey("sig", 1, 4), [], 10)  # evicts page 3, the least recently used
+    assert buffer.stats()["wasted"] == 1
+    assert buffer._claim(PageKey("sig", 1, 3)) is None
+
+    buffer.ttl = 0
+    time.sleep(0.01)
+    with buffer._lock:
+        buffer._expire()
+    stats = buffer.stats()
+    assert (stats["buffered"], stats["wasted"]) == (0, 2)  # page 2 was served, page 4 was not
+
+
+def test_failed_loads_are_not_buffered(buffer):
+    def load(page):
+        raise RuntimeError("warehouse unavailable")
+
+    buffer.schedule("sig", 1, [2], 10, load)
+    _wait_for_inflight(buffer)
+    assert asyncio.run(buffer.get(PageKey("sig", 1, 2))) is None
+    assert buffer.stats()["failed"] == 1
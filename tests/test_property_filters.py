@@ -0,0 +1,99 @@
+from datetime import date
+from urllib.parse import urlencode
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from models import DateRange, NumericRange, PropertyFilter
+from property_filters import MAX_VALUES, compile_filter, compile_sort, query_filter
+
+
+def _request(params) -> Request:
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": [],
+                    "query_string": urlencode(params, doseq=True).encode()})
+
+
+def test_compile_filter_without_filters():
+    assert compile_filter(PropertyFilter()) == (" WHERE 1=1", [])
+
+
+def test_compile_filter_merges_deduplicates_and_sorts_values():
+    where, params = compile_filter(PropertyFilter(state="TX", states=["OK", " TX", "", "OK"]))
+    assert where == " WHERE 1=1 AND p.State IN (?,?)"
+    assert params == ["OK", "TX"]
+
+
+def test_compile_filter_is_stable_for_equivalent_filters():
+    first = compile_filter(PropertyFilter(cities=["Austin", "Dallas"]))
+    assert compile_filter(PropertyFilter(cities=["Dallas", "Austin", "Dallas"])) == first
+
+
+def test_compile_filter_single_value_uses_equality():
+    assert compile_filter(PropertyFilter(zip_codes=["78701"])) == (" WHERE 1=1 AND p.Zip = ?", ["78701"])
+
+
+def test_compile_filter_ranges():
+    where, params = compile_filter(PropertyFilter(
+        cap_rate=NumericRange(min=0.05, max=0.07),
+        year_built=NumericRange(max=2000),
+        last_sale_date=DateRange(min=date(2020, 1, 1), max=date(2020, 12, 31)),
+    ))
+    assert where == (
+        " WHERE 1=1 AND p.Cap_Rate >= ? AND p.Cap_Rate <= ? AND p.Year_Built <= ?"
+        " AND p.Last_Sale_Date >= ? AND p.Last_Sale_Date < ?"
+    )
+    assert params == [0.05, 0.07, 2000, "2020-01-01", "2021-01-01"]
+
+
+def test_compile_filter_rejects_too_many_values():
+    with pytest.raises(ValueError, match="zip_codes"):
+        compile_filter(PropertyFilter(zip_codes=[str(n) for n in range(MAX_VALUES + 1)]))
+
+
+def test_compile_filter_runs_on_the_local_database(local_connection):
+    cursor = local_connection.cursor()
+    cursor.execute("SELECT State, PropertyType, Year_Built FROM [dbo].[property]")
+    rows = cursor.fetchall()
+    states = sorted({row[0] for row in rows})[:2]
+    expected = sum(1 for state, _, year in rows if state in states and year is not None and year >= 1990)
+
+    where, params = compile_filter(PropertyFilter(states=states, year_built=NumericRange(min=1990)))
+    cursor.execute(f"SELECT COUNT_BIG(*) FROM [dbo].[property] p{where}", params)
+    assert cursor.fetchone()[0] == expected
+
+
+@pytest.mark.parametrize("sort_by, direction, expected", [
+    (None, None, " ORDER BY p.PropertyID"),
+    ("Cap_Rate", "desc", " ORDER BY p.[Cap_Rate] DESC, p.PropertyID"),
+    ("p.[cap_rate]", None, " ORDER BY p.[Cap_Rate] ASC, p.PropertyID"),
+    ("contact_name", "asc", " ORDER BY c.name ASC, p.PropertyID"),
+])
+def test_compile_sort(sort_by, direction, expected):
+    assert compile_sort(sort_by, direction) == expected
+
+
+def test_compile_sort_rejects_unknown_columns():
+    with pytest.raises(ValueError):
+        compile_sort("1; DROP TABLE property", None)
+
+
+def test_query_filter_reads_lists_singles_and_ranges():
+    spec = query_filter(_request([
+        ("states", "TX,OK"), ("states", "NM"), ("city", "Austin"),
+        ("cap_rate_min", "0.05"), ("last_sale_date_max", "2020-12-31"),
+    ]))
+    assert spec.states == ["TX", "OK", "NM"]
+    assert spec.city == "Austin"
+    assert spec.cap_rate == NumericRange(min=0.05)
+    assert spec.last_sale_date == DateRange(max=date(2020, 12, 31))
+    assert compile_filter(spec) == compile_filter(PropertyFilter(
+        states=["NM", "OK", "TX"], cities=["Austin"],
+        cap_rate=NumericRange(min=0.05), last_sale_date=DateRange(max=date(2020, 12, 31)),
+    ))
+
+
+def test_query_filter_rejects_invalid_ranges():
+    with pytest.raises(HTTPException) as raised:
+        query_filter(_request({"cap_rate_min": "0.07", "cap_rate_max": "0.05"}))
+    assert raised.value.status_code == 422
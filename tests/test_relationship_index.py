@@ -0,0 +1,38 @@
+import numpy as np
+
+from relationship_index import _find
+
+
+def test_find_integer_ids():
+    sorted_ids = np.array([2, 5, 9], dtype=np.int64)
+    positions, found = _find(sorted_ids, [9, 2, 3, 10])
+    assert found.tolist() == [True, True, False, False]
+    assert positions[found].tolist() == [2, 0]
+
+
+def test_find_text_ids():
+    sorted_ids = np.array(["a1", "b2", "c3"])
+    positions, found = _find(sorted_ids, ["c3", "zz", "a1"])
+    assert found.tolist() == [True, False, True]
+    assert positions[found].tolist() == [2, 0]
+
+
+def test_find_converts_ids_to_the_index_type():
+    positions, found = _find(np.array([2, 5, 9], dtype=np.int64), ["5", "abc", "9"])
+    assert found.tolist() == [True, False, True]
+    assert positions[found].tolist() == [1, 2]
+
+    positions, found = _find(np.array(["2", "5"]), [5, 7])
+    assert found.tolist() == [True, False]
+    assert positions[found].tolist() == [1]
+
+
+def test_find_in_an_empty_index():
+    positions, found = _find(np.zeros(0, dtype=np.int64), [1, 2])
+    assert found.tolist() == [False, False]
+    assert len(positions) == 2
+
+
+def test_find_no_ids():
+    positions, found = _find(np.array([1, 2], dtype=np.int64), [])
+    assert len(positions) == len(found) == 0
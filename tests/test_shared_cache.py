@@ -0,0 +1,91 @@
+import os
+import time
+
+import pytest
+
+from shared_cache import SharedCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return SharedCache(str(tmp_path), max_bytes=1000, blob_bytes=100, touch_seconds=0)
+
+
+def _blobs(cache: SharedCache):
+    return sorted(os.listdir(cache.blob_dir))
+
+
+def test_get_set_roundtrip(cache):
+    assert cache.get("filters", "k") is None
+    cache.set("filters", "k", b"value")
+    assert cache.get("filters", "k") == b"value"
+
+
+def test_large_values_are_mapped_from_blob_files(cache):
+    cache.set("filters", "k", b"x" * 200)
+    value = cache.get("filters", "k")
+    assert isinstance(value, memoryview)
+    assert bytes(value) == b"x" * 200
+    assert len(_blobs(cache)) == 1
+
+    cache.set("filters", "k", b"small")  # replacing the entry removes its blob
+    assert _blobs(cache) == []
+
+
+def test_bump_invalidates_the_namespace_only(cache):
+    assert cache.version("filters") == 0
+    cache.set("filters", "k", b"x" * 200)
+    cache.set("counts", "k", b"kept")
+    assert cache.bump("filters") == 1
+    assert cache.version("filters") == 1
+    assert cache.get("filters", "k") is None
+    assert cache.get("counts", "k") == b"kept"
+    assert _blobs(cache) == []
+
+
+def test_values_stored_under_an_old_version_are_unreachable(cache):
+    version = cache.version("filters")
+    cache.bump("filters")
+    cache.set("filters", "k", b"stale", version=version)
+    assert cache.get("filters", "k") is None
+
+
+def test_expired_entries_miss(cache):
+    cache.set("filters", "k", b"value", ttl=0.01)
+    time.sleep(0.02)
+    assert cache.get("filters", "k") is None
+
+
+def test_evicts_least_recently_used_entries(cache):
+    for key in ("a", "b", "c"):
+        cache.set("filters", key, b"x" * 90)
+        time.sleep(0.01)
+    cache.get("filters", "a")  # touched, so "b" is now the oldest
+    time.sleep(0.01)
+    cache.set("filters", "big", b"x" * 800)
+    assert cache.get("filters", "b") is None
+    assert cache.get("filters", "a") is not None
+    assert cache.get("filters", "big") is not None
+
+
+def test_get_or_set_builds_once(cache):
+    calls = []
+
+    def build():
+        calls.append(1)
+        return b"built"
+
+    assert cache.get_or_set("counts", "k", build) == b"built"
+    assert cache.get_or_set("counts", "k", build) == b"built"
+    assert len(calls) == 1
+    assert cache._one("SELECT COUNT(*) FROM fills")[0] == 0
+
+
+def test_get_or_set_releases_the_lease_when_build_fails(cache):
+    def build():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_set("counts", "k", build)
+    assert cache._one("SELECT COUNT(*) FROM fills")[0] == 0
+    assert cache.get_or_set("counts", "k", lambda: b"retry") == b"retry"
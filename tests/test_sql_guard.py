@@ -0,0 +1,65 @@
+import pytest
+
+from sql_guard import SQLGuardError, check_read_only, inject_row_cap, mask_sql
+
+
+def test_mask_sql_blanks_literals_comments_and_identifiers_keeping_offsets():
+    query = "SELECT [Drop Table], 'it''s' -- DELETE\nFROM t /* UPDATE */ WHERE a = \"x\""
+    masked = mask_sql(query)
+    assert len(masked) == len(query)
+    assert masked.index("FROM") == query.index("FROM")
+    for word in ("Drop", "it", "DELETE", "UPDATE", "x"):
+        assert word not in masked
+    assert "\n" in masked
+
+
+def test_mask_sql_unterminated_literal_runs_to_the_end():
+    assert mask_sql("SELECT 'abc").rstrip() == "SELECT"
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("SELECT 1", "SELECT 1"),
+    ("  select * from t;  ", "select * from t"),
+    ("WITH x AS (SELECT 1 AS a) SELECT a FROM x", "WITH x AS (SELECT 1 AS a) SELECT a FROM x"),
+    ("SELECT * FROM t WHERE name = 'Drop Zone; Update'", "SELECT * FROM t WHERE name = 'Drop Zone; Update'"),
+    ("SELECT [Update_Date] FROM t", "SELECT [Update_Date] FROM t"),
+])
+def test_check_read_only_accepts_single_selects(query, expected):
+    assert check_read_only(query) == expected
+
+
+@pytest.mark.parametrize("query, message", [
+    ("SELECT 1; SELECT 2", "single SQL statement"),
+    ("DELETE FROM t", "read-only SELECT"),
+    ("", "read-only SELECT"),
+    ("SELECT * INTO t2 FROM t", "'INTO'"),
+    ("WITH x AS (SELECT 1 AS a) DELETE FROM x", "'DELETE'"),
+    ("SELECT 1 EXEC sp_who", "'EXEC'"),
+])
+def test_check_read_only_rejects(query, message):
+    with pytest.raises(SQLGuardError, match=message):
+        check_read_only(query)
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("SELECT * FROM t", "SELECT TOP (200) * FROM t"),
+    ("SELECT DISTINCT City FROM t", "SELECT DISTINCT TOP (200) City FROM t"),
+    ("SELECT TOP 10 * FROM t", "SELECT TOP 10 * FROM t"),
+    ("SELECT TOP 500 * FROM t", "SELECT TOP (200) * FROM t"),
+    ("SELECT TOP (500) * FROM t", "SELECT TOP (200) * FROM t"),
+    ("SELECT TOP (@n) * FROM t", "SELECT TOP (@n) * FROM t"),
+    ("SELECT TOP 50 PERCENT * FROM t", "SELECT TOP 50 PERCENT * FROM t"),
+    ("SELECT TOP 500 WITH TIES * FROM t ORDER BY a", "SELECT TOP 500 WITH TIES * FROM t ORDER BY a"),
+    ("SELECT [TOP] FROM t", "SELECT TOP (200) [TOP] FROM t"),
+    ("WITH x AS (SELECT a FROM t) SELECT a FROM x", "WITH x AS (SELECT a FROM t) SELECT TOP (200) a FROM x"),
+])
+def test_inject_row_cap(query, expected):
+    assert inject_row_cap(query, 200) == expected
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT a FROM t UNION ALL SELECT a FROM u",
+    "SELECT a FROM t ORDER BY a OFFSET 0 ROWS FETCH NEXT 10 ROWS ONLY",
+])
+def test_inject_row_cap_leaves_set_operations_and_paging_alone(query):
+    assert inject_row_cap(query, 200) == query
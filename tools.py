@@ -16,9 +16,32 @@ from sqlalchemy import create_engine
 
 import pyodbc
 import config
+import shared_cache
+from sql_guard import guard_sql_tools
+
+
+class CachedSQLDatabase(SQLDatabase):
+    """SQLDatabase whose table info (DDL + sample rows) comes from the node's shared cache.
+
+    Built with lazy_table_reflection so a worker only reflects tables on a
+    cache miss instead of the whole schema at startup.
+    """
+
+    def get_table_info(self, table_names: Optional[List[str]] = None) -> str:
+        key = f"{config.DB_BACKEND}:{','.join(sorted(table_names)) if table_names else '*'}"
+        def build() -> bytes:
+            return super(CachedSQLDatabase, self).get_table_info(table_names).encode()
+
+        return bytes(
+            shared_cache.cache.get_or_set("schema", key, build, ttl=config.SCHEMA_CACHE_TTL_SECONDS)
+        ).decode()
 
 
 def get_db_connection():
+    if config.DB_BACKEND == 'sqlite':
+        # Local stand-in database (see benchmarks/datagen.py)
+        return CachedSQLDatabase(create_engine(f"sqlite:///{config.LOCAL_DB_PATH}"), lazy_table_reflection=True)
+
     # Create service principal ID using config variables
     service_principal_id = f"{config.CLIENT_ID}@{config.TENANT_ID}"
 
@@ -35,11 +58,16 @@ def get_db_connection():
         "ApplicationIntent=ReadWrite"
     )
 
-    # Create SQLAlchemy engine
-    engine = create_engine(conn_str)
+    # Create SQLAlchemy engine; its pool is shared by every concurrent agent run
+    engine = create_engine(
+        conn_str,
+        pool_size=config.AGENT_DB_POOL_SIZE,
+        max_overflow=config.AGENT_DB_MAX_OVERFLOW,
+        pool_pre_ping=True,
+    )
     
     # Create SQLDatabase instance
-    return SQLDatabase(engine)
+    return CachedSQLDatabase(engine, lazy_table_reflection=True)
 
 def get_sql_toolkit():
     """Get SQL toolkit with all necessary tools."""
@@ -48,4 +76,8 @@ def get_sql_toolkit():
         raise ConnectionError("Failed to establish database connection")
         
     llm = ChatOpenAI(temperature=0, model="gpt-4")
-    return SQLDatabaseToolkit(db=db, llm=llm)
\ No newline at end of file
+    return SQLDatabaseToolkit(db=db, llm=llm)
+
+def get_agent_tools(toolkit: SQLDatabaseToolkit) -> List[BaseTool]:
+    """Toolkit tools for the agent, with sql_db_query wrapped in the cost guardrails."""
+    return guard_sql_tools(toolkit.get_tools(), toolkit.db)
\ No newline at end of file
@@ -1,89 +1,187 @@
 # workflow.py
-from typing import Annotated, Dict, List
-from typing_extensions import TypedDict
-from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage, AIMessage
-from langgraph.graph import StateGraph, Graph, END
-from langgraph.graph.message import AnyMessage, add_messages
-from langchain_openai import ChatOpenAI
-#from tools import DatabaseTools, get_db_connection
-from copilotkit.langchain import copilotkit_emit_message, copilotkit_emit_state, copilotkit_customize_config
-import config
-from langgraph.checkpoint.memory import MemorySaver
+import ast
+import logging
+import time
+import uuid
+from typing import Annotated, List, Optional
 
-from typing import Annotated, List
 from typing_extensions import TypedDict
-from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage
+from langchain_core.messages import BaseMessage, HumanMessage
 from langgraph.graph import StateGraph, END
+from langgraph.graph.message import add_messages
 from langgraph.prebuilt import create_react_agent
-from langchain import hub
-from tools import get_sql_toolkit
-from copilotkit.langchain import copilotkit_emit_message
-import operator
+from copilotkit.langchain import copilotkit_emit_message, copilotkit_emit_state, copilotkit_customize_config
+
+from tools import get_sql_toolkit, get_agent_tools
+from memory import INTERNAL_TAG, compact_history, get_checkpointer, message_key, remember
+from metrics import agent_callbacks, observe_agent_node, observe_agent_ttft
 
-import asyncio
+logger = logging.getLogger(__name__)
 
 class AgentState(TypedDict):
     """State object for the agent."""
-    messages: Annotated[List[BaseMessage], operator.add]
-    processed_messages: set  # Add this to track processed messages
+    messages: Annotated[List[BaseMessage], add_messages]
+    processed_messages: List[str]  # Bounded list of hashed ids of answered messages
+    summarized_messages: List[str]  # Hashed ids already folded into the summary
+    summary: str  # Running summary of turns trimmed from the history
+
+TOOL_STATUS_LABELS = {
+    "sql_db_query": "Running SQL",
+    "sql_db_query_checker": "Checking SQL",
+    "sql_db_schema": "Reading table schema",
+    "sql_db_list_tables": "Listing tables",
+}
+
+
+def _count_result_rows(output) -> Optional[int]:
+    """Row count reported by sql_db_query, parsed from its output if needed."""
+    artifact = getattr(output, "artifact", None)
+    if isinstance(artifact, dict) and "row_count" in artifact:
+        return artifact["row_count"]
+    content = getattr(output, "content", output)
+    if not isinstance(content, str) or not content.strip():
+        return 0 if content == "" else None
+    try:
+        rows = ast.literal_eval(content)
+    except (ValueError, SyntaxError):
+        return None
+    return len(rows) if isinstance(rows, (list, tuple)) else None
+
+
+async def _stream_agent(agent, state, config, message_id, started):
+    """Run the ReAct agent with astream_events, forwarding progress as it happens.
+
+    The agent runs with CopilotKit message emission enabled, so its LLM tokens
+    reach the chat through CopilotKit's message stream as they are generated;
+    tool calls are not rendered as messages. Tool start/finish events are
+    reported as status updates. The time from `started` (the start of the
+    node) to the first answer token is recorded as the agent's TTFT.
+    Returns the agent's final state and whether any answer tokens streamed.
+    """
+    root_run_id = None
+    final_output = None
+    streamed = False
+    config = copilotkit_customize_config(config, emit_messages=True, emit_tool_calls=False)
+
+    async def emit(fields):
+        await copilotkit_emit_state(config, {
+            "currentNode": "agent",
+            "status": "inProgress",
+            "messageId": message_id,
+            **fields
+        })
+
+    async for event in agent.astream_events(state, config, version="v2"):
+        kind = event["event"]
+
+        if root_run_id is None:
+            root_run_id = event["run_id"]
+
+        if kind == "on_chat_model_stream":
+            if streamed or INTERNAL_TAG in event.get("tags", []):
+                continue
+            token = event["data"]["chunk"].content
+            if isinstance(token, str) and token:
+                streamed = True
+                observe_agent_ttft(time.perf_counter() - started)
+
+        elif kind == "on_tool_start":
+            name = event["name"]
+            await emit({
+                "tool": name,
+                "toolStatus": "running",
+                "progress": f"{TOOL_STATUS_LABELS.get(name, name)}\u2026"
+            })
+
+        elif kind == "on_tool_end":
+            name = event["name"]
+            update = {"tool": name, "toolStatus": "done"}
+            if name == "sql_db_query":
+                rows = _count_result_rows(event["data"].get("output"))
+                if rows is not None:
+                    update["rowCount"] = rows
+                    update["progress"] = f"Query returned {rows} row{'s' if rows != 1 else ''}"
+            await emit(update)
+
+        elif kind == "on_chain_end" and event["run_id"] == root_run_id:
+            final_output = event["data"].get("output")
+
+    return final_output, streamed
+
 
 class DatabaseAnalysisGraph:
-    def __init__(self):
-        self.toolkit = get_sql_toolkit()
+    def __init__(self, toolkit=None):
+        # A prebuilt toolkit can be passed in, e.g. one backed by a local test database
+        self.toolkit = toolkit or get_sql_toolkit()
         self.graph = self._build_graph()
 
     def _build_graph(self):
         """Create the LangGraph workflow using ReAct agent."""
-        prompt_template = hub.pull("langchain-ai/sql-agent-system-prompt")
-        system_message = prompt_template.format(dialect="T-SQL", top_k=5)
-        
         agent = create_react_agent(
             self.toolkit.llm,
-            self.toolkit.get_tools()
+            get_agent_tools(self.toolkit)
         )
+        callbacks = agent_callbacks()
+        if callbacks:
+            agent = agent.with_config(callbacks=callbacks)
 
-        memory = MemorySaver()
+        memory = get_checkpointer()
         workflow = StateGraph(AgentState)
+        llm = self.toolkit.llm
         
         async def agent_node(state, config):
-            # Initialize processed_messages if it doesn't exist
-            if 'processed_messages' not in state:
-                state['processed_messages'] = set()
-                
-            message_id = state["messages"][-1].content if state["messages"] else None
+            processed = state.get('processed_messages') or []
+            message_id = message_key(state["messages"][-1]) if state["messages"] else None
             
             # Check if we've already processed this message
-            if message_id and message_id in state['processed_messages']:
-                return state
-                
+            if message_id and message_id in processed:
+                return {}
+
+            node_started = time.perf_counter()
+            pending_summary = None
+
+            # Progress updates only carry status fields; the message history is
+            # synced by CopilotKit itself and is not re-sent on every update.
             await copilotkit_emit_state(config, {
-                "messages": state["messages"],
                 "currentNode": "agent",
                 "status": "inProgress",
                 "messageId": message_id
             })
 
             try:
-                response = await agent.ainvoke(state, config)
+                # Only a token-bounded window of the history (plus the summary of
+                # older turns) goes to the agent; dropped turns leave the state.
+                # Their summary is computed alongside the agent, is never emitted
+                # to the chat and is used from the next turn on.
+                agent_messages, update, pending_summary = await compact_history(
+                    state, llm, copilotkit_customize_config(config, emit_messages=False, emit_tool_calls=False)
+                )
+                response, streamed = await _stream_agent(
+                    agent, {"messages": agent_messages}, config, message_id, node_started
+                )
+                if pending_summary is not None:
+                    update['summary'] = await pending_summary
                 
-                if "messages" in response and response["messages"]:
+                if response and "messages" in response and response["messages"]:
                     message_content = response["messages"][-1].content
                     if message_id:
-                        state['processed_messages'].add(message_id)
+                        update['processed_messages'] = remember(processed, message_id)
                         
-                    await copilotkit_emit_message(config, message_content)
-                    await copilotkit_emit_state(config, {
-                        "messages": response["messages"],
-                        "currentNode": "agent",
-                        "status": "inProgress",
-                        "messageId": message_id
-                    })
+                    if not streamed:
+                        # Nothing reached the chat token by token (e.g. a non-streaming model)
+                        await copilotkit_emit_message(config, message_content)
+
+                    # The agent echoes its input; keep only what it produced
+                    new_messages = response["messages"][len(agent_messages):]
+                    update['messages'] = update.get('messages', []) + new_messages
                     
-                return response
+                return update
 
             finally:
+                if pending_summary is not None and not pending_summary.done():
+                    pending_summary.cancel()
+                observe_agent_node("agent", time.perf_counter() - node_started)
                 await copilotkit_emit_state(config, {
-                    "messages": state["messages"],
                     "currentNode": "agent",
                     "status": "complete",
                     "messageId": message_id
@@ -95,14 +193,26 @@ class DatabaseAnalysisGraph:
 
         return workflow.compile(checkpointer=memory)
 
-    async def run(self, query: str):
-        """Process a natural language query through the graph."""
+    async def run(self, query: str, thread_id: Optional[str] = None, callbacks: Optional[list] = None):
+        """Process a natural language query through the graph.
+
+        Each call gets its own thread unless `thread_id` is given to continue
+        an earlier conversation. `callbacks` are attached to the whole run.
+        """
         initial_state = {
-            "messages": [HumanMessage(content=query)],
-            "processed_messages": set()  # Initialize the set
+            "messages": [HumanMessage(content=query)]
         }
+        run_config = {"configurable": {"thread_id": thread_id or str(uuid.uuid4())}}
+        if callbacks:
+            run_config["callbacks"] = callbacks
         
-        return await self.graph.ainvoke(initial_state)
+        return await self.graph.ainvoke(initial_state, run_config)
 
-# Create graph instance
-graph = DatabaseAnalysisGraph().graph
\ No newline at end of file
+def __getattr__(name):
+    # The graph exported for langgraph.json is built on first access, so that
+    # importing this module does not open a Fabric connection by itself.
+    if name == "graph":
+        global graph
+        graph = DatabaseAnalysisGraph().graph
+        return graph
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file